@@ -14,1307 +14,114 @@ Configuration via environment variables:
     LIGHTER_API_KEY - Your API private key
     LIGHTER_ACCOUNT_INDEX - Your account index
     LIGHTER_API_KEY_INDEX - API key index (default: 3)
+    LIGHTER_EXTRA_API_KEYS - Extra "index:private_key" pairs to shard transactions over
+    KEY_SCHEDULING - "least-loaded" or "sticky" (per market) key choice (default: least-loaded)
+    LIGHTER_ACCOUNT_INDEXES - Accounts a request may select via account_index (default: any)
+    LIGHTER_SUBACCOUNT_KEYS - "account:key_index:private_key" keys for other accounts
+    CLIENT_POOL_SIZE - Max accounts with a live client per worker (default: 16)
     LIGHTER_ENVIRONMENT - 'mainnet' or 'testnet' (default: mainnet)
+    LIGHTER_BASE_URL - Override the Lighter API URL, e.g. a local mock (default: per environment)
     FLASK_PORT - Server port (default: 3001)
     API_SECRET - Optional secret for authentication
-    NONCE_RETRY_ATTEMPTS - Max retry attempts for nonce errors (default: 3)
+    NONCE_RETRY_ATTEMPTS - Max sends per transaction, retries included (default: 3)
+    NONCE_RETRY_DELAY_MS - Base of the exponential retry backoff (default: 50)
+    RETRY_MAX_DELAY_MS - Cap of the retry backoff (default: 2000)
+    RETRY_BUDGET_RATIO - Retries earned per first attempt (default: 0.2)
+    RETRY_BUDGET_BURST - Max retries saved up in the budget (default: 20)
+    BREAKER_FAILURES - Consecutive upstream failures that open the circuit (default: 5)
+    BREAKER_COOLDOWN_S - How long the circuit stays open (default: 5)
+    NONCE_ERROR_CODES - Exchange error codes treated as nonce errors (default: 21104)
+    TX_BATCH_MAX_SIZE - Max transactions per sendTxBatch call (default: 50)
+    SUBMIT_QUEUE - Send transactions through per-key priority queues with one writer
+        each (default: true)
+    SUBMIT_QUEUE_SIZE - Submissions waiting per API key before new ones are refused (default: 1000)
+    SUBMIT_COALESCE_MAX - Max transactions the writer combines into one send (default: 50)
+    ORDERS_BATCH_MAX_ITEMS - Max orders accepted by /api/orders/batch (default: 200)
+    IDEMPOTENCY_TTL_S - How long a completed request is replayed for its key (default: 600)
+    IDEMPOTENCY_MAX_KEYS - Max idempotency keys remembered (default: 10000)
+    IDEMPOTENCY_WAIT_S - Max wait for an in-flight duplicate before 409 (default: 30)
+    IDEMPOTENCY_LEASE_S - How long a claim of a worker that died holds its key (default: 120)
+    JOB_WORKERS - Threads running async jobs (default: 4)
+    JOB_TTL_S - How long finished jobs stay queryable (default: 3600)
+    JOB_MAX_KEPT - Max finished jobs kept (default: 1000)
+    JOB_CALLBACK_TIMEOUT_S - Timeout of a job's callback POST (default: 10)
+    SHARED_STATE_PATH - SQLite file the workers share jobs and idempotency keys through
+        (default: in the temp dir)
+    NONCE_SEQUENCER_SOCKET - Unix socket of a shared nonce sequencer (default: per-worker)
+    NONCE_LEASE_TIMEOUT_S - Sequencer lease timeout before a key is resynced (default: 30)
+    AUTH_TOKEN_TTL_S - Lifetime of internally used auth tokens (default: 600)
+    AUTH_TOKEN_RENEW_MARGIN_S - Renew cached tokens this long before expiry (default: 120)
+    HTTP_POOL_SIZE - Max pooled connections to Lighter (default: 32)
+    HTTP_DNS_CACHE_TTL - DNS cache TTL in seconds (default: 300)
+    HTTP_KEEPALIVE_TIMEOUT - Idle keep-alive timeout in seconds (default: 60)
+    MARKET_PREFETCH - Load market metadata at worker boot (default: true)
+    WARMUP - Initialize client, markets, nonces, connections and auth token at boot (default: true)
+    WARMUP_CONNECTIONS - Keep-alive connections opened during warm-up (default: 4)
+    WARMUP_RETRY_MAX_S - Max backoff between retries of failed warm-up steps (default: 30)
+    MARKET_REFRESH_INTERVAL_S - Market metadata refresh interval (default: 300)
+    MARKET_MISS_TTL_S - How long an unknown market_index is cached (default: 60)
+    ORDER_BOOK_STREAM - Keep local L2 books from the WebSocket stream (default: true)
+    ORDER_BOOK_MARKETS - Comma-separated market indexes subscribed at boot (default: none)
+    ORDER_BOOK_MAX_STALENESS_MS - Max book age before falling back to REST (default: 2000)
+    ACCOUNT_STREAM - Serve account/positions from the account WebSocket channels (default: true)
+    ORDER_STORE - Serve our live orders from memory, fed by account_all_orders (default: true)
+    ORDER_RECONCILE_INTERVAL_S - REST reconcile interval of the order store (default: 60)
+    COMPRESSION - gzip/br JSON responses per Accept-Encoding (default: true)
+    COMPRESS_MIN_BYTES - Smallest response body worth compressing (default: 1024)
+    COMPRESS_LEVEL - gzip level / brotli quality (default: 5)
+    SSE_QUEUE_SIZE - Events buffered per /api/stream consumer before dropping (default: 1000)
+    SSE_REPLAY_SIZE - Recent events kept for Last-Event-ID resume (default: 1000)
+    SSE_MAX_CONSUMERS - Max open /api/stream consumers per worker; under gunicorn also
+        capped at a quarter of its --threads (default: 32)
+    SSE_KEEPALIVE_S - Keep-alive comment interval on idle streams (default: 15)
+    SERVER_TIMING - Add a Server-Timing stage breakdown to every response (default: true)
+    PROFILE_SAMPLE_RATE - Fraction of requests traced through cProfile (default: 0)
+    PROFILE_TOP_N - Slowest sampled traces kept per worker (default: 20)
+    METRICS_DIR - Where gunicorn workers share their metrics samples (default: in the temp dir)
+    METRICS_FLUSH_S - How often each worker shares its samples (default: 1)
 
 Author: Maxwell Melo <maxwell.melo0@gmail.com>
 """
 
-import os
-import time
+import sys
 import asyncio
 import logging
-from flask import Flask, request, jsonify
-from functools import wraps
-from typing import Callable, Any, Tuple, Optional
 
-# Fix event loop issues with Gunicorn workers
-import nest_asyncio
-
-nest_asyncio.apply()
+from lighter_backend.config import (
+    FLASK_PORT,
+    LIGHTER_ACCOUNT_INDEX,
+    LIGHTER_API_KEY,
+    LIGHTER_ENVIRONMENT,
+    NONCE_LEASE_TIMEOUT_S,
+    NONCE_SEQUENCER_SOCKET,
+)
+from lighter_backend.events import stream_slots
+from lighter_backend.nonces import serve_nonce_sequencer
+from lighter_backend.routes import app
+from lighter_backend.warmup import worker_warmup
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
-logger = logging.getLogger(__name__)
-
-
-# =============================================================================
-# NONCE ERROR HANDLING
-# =============================================================================
-
-NONCE_ERROR_PATTERNS = [
-    "invalid nonce",
-    "nonce",
-    "21104",
-]
-
-NONCE_RETRY_ATTEMPTS = int(os.getenv("NONCE_RETRY_ATTEMPTS", "3"))
-NONCE_RETRY_DELAY_MS = int(os.getenv("NONCE_RETRY_DELAY_MS", "500"))
-
-
-def is_nonce_error(error: Any) -> bool:
-    """Check if an error is related to nonce issues."""
-    if error is None:
-        return False
-    error_str = str(error).lower()
-    return any(pattern in error_str for pattern in NONCE_ERROR_PATTERNS)
-
-
-def refresh_client_nonce():
-    """Force refresh the nonce from the server."""
-    global _client
-    if _client is not None:
-        try:
-            _client.nonce_manager.hard_refresh_nonce(LIGHTER_API_KEY_INDEX)
-            logger.info(f"Nonce refreshed for API key {LIGHTER_API_KEY_INDEX}")
-        except Exception as e:
-            logger.warning(f"Failed to refresh nonce: {e}")
-
-
-def reset_client():
-    """Reset the client to force re-initialization with fresh nonce."""
-    global _client
-    _client = None
-    logger.info("Client reset - will re-initialize on next request")
-
-
-async def execute_with_nonce_retry(
-    operation: Callable, *args, **kwargs
-) -> Tuple[Any, Any, Any]:
-    """
-    Execute a trading operation with automatic retry on nonce errors.
-
-    Args:
-        operation: Async function to execute (e.g., client.create_order)
-        *args, **kwargs: Arguments to pass to the operation
-
-    Returns:
-        Tuple of (tx, response, error) from the operation
-    """
-    last_error = None
-
-    for attempt in range(NONCE_RETRY_ATTEMPTS):
-        try:
-            tx, response, err = await operation(*args, **kwargs)
-
-            if err and is_nonce_error(err):
-                last_error = err
-                logger.warning(
-                    f"Nonce error on attempt {attempt + 1}/{NONCE_RETRY_ATTEMPTS}: {err}"
-                )
-
-                # Try to refresh nonce first
-                if attempt < NONCE_RETRY_ATTEMPTS - 1:
-                    refresh_client_nonce()
-                    # Wait before retry
-                    await asyncio.sleep(NONCE_RETRY_DELAY_MS / 1000)
-                    continue
-                else:
-                    # Last attempt failed, reset client entirely
-                    reset_client()
-                    return (
-                        tx,
-                        response,
-                        f"Nonce error after {NONCE_RETRY_ATTEMPTS} attempts: {err}",
-                    )
-
-            # Success or non-nonce error
-            return tx, response, err
-
-        except Exception as e:
-            last_error = e
-            if is_nonce_error(e):
-                logger.warning(
-                    f"Nonce exception on attempt {attempt + 1}/{NONCE_RETRY_ATTEMPTS}: {e}"
-                )
-                if attempt < NONCE_RETRY_ATTEMPTS - 1:
-                    refresh_client_nonce()
-                    await asyncio.sleep(NONCE_RETRY_DELAY_MS / 1000)
-                    continue
-                else:
-                    reset_client()
-            raise
-
-    return (
-        None,
-        None,
-        f"Operation failed after {NONCE_RETRY_ATTEMPTS} attempts: {last_error}",
-    )
-
-
-app = Flask(__name__)
-
-# Configuration
-LIGHTER_API_KEY = os.getenv("LIGHTER_API_KEY", "")
-LIGHTER_ACCOUNT_INDEX = int(os.getenv("LIGHTER_ACCOUNT_INDEX", "0"))
-LIGHTER_API_KEY_INDEX = int(os.getenv("LIGHTER_API_KEY_INDEX", "3"))
-LIGHTER_ENVIRONMENT = os.getenv("LIGHTER_ENVIRONMENT", "mainnet")
-FLASK_PORT = int(os.getenv("FLASK_PORT", "3001"))
-API_SECRET = os.getenv("API_SECRET", "")
-
-BASE_URL = (
-    "https://mainnet.zklighter.elliot.ai"
-    if LIGHTER_ENVIRONMENT == "mainnet"
-    else "https://testnet.zklighter.elliot.ai"
-)
-
-# Lighter client (initialized on demand)
-_client = None
-_order_api = None
-_account_api = None
-
-
-def get_client():
-    """Get Lighter SignerClient, initializing if necessary."""
-    global _client
-    if _client is None:
-        try:
-            import lighter
-            from lighter import nonce_manager
-
-            _client = lighter.SignerClient(
-                url=BASE_URL,
-                api_private_keys={LIGHTER_API_KEY_INDEX: LIGHTER_API_KEY},
-                account_index=LIGHTER_ACCOUNT_INDEX,
-                # Use API mode to always fetch fresh nonce from server
-                nonce_management_type=nonce_manager.NonceManagerType.API,
-            )
-            err = _client.check_client()
-            if err:
-                raise Exception(f"Client verification error: {err}")
-            logger.info("Lighter SignerClient initialized successfully")
-        except ImportError:
-            raise Exception("lighter not installed. Run: pip install zklighter")
-    return _client
-
-
-def get_order_api():
-    """Get Lighter OrderApi for read operations."""
-    global _order_api
-    if _order_api is None:
-        import lighter
-
-        api_client = lighter.ApiClient(
-            configuration=lighter.Configuration(host=BASE_URL)
-        )
-        _order_api = lighter.OrderApi(api_client)
-    return _order_api
-
-
-def get_account_api():
-    """Get Lighter AccountApi for read operations."""
-    global _account_api
-    if _account_api is None:
-        import lighter
-
-        api_client = lighter.ApiClient(
-            configuration=lighter.Configuration(host=BASE_URL)
-        )
-        _account_api = lighter.AccountApi(api_client)
-    return _account_api
-
-
-def create_auth_token():
-    """Get a fresh auth token for authenticated API calls."""
-    client = get_client()
-    token, err = client.create_auth_token_with_expiry(deadline=600)
-    if err:
-        raise Exception(f"Failed to create auth token: {err}")
-    return token
-
-
-# Market decimals cache
-_market_decimals = {}
-
-
-async def get_market_decimals(market_index: int) -> tuple:
-    """Get size and price decimals for a market."""
-    global _market_decimals
-    if market_index not in _market_decimals:
-        import aiohttp
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{BASE_URL}/api/v1/orderBooks") as resp:
-                data = await resp.json()
-                for ob in data.get("order_books", []):
-                    mid = ob.get("market_id")
-                    size_dec = ob.get("supported_size_decimals", 4)
-                    price_dec = ob.get("supported_price_decimals", 2)
-                    _market_decimals[mid] = (size_dec, price_dec)
-
-    return _market_decimals.get(market_index, (4, 2))
-
-
-def convert_size_to_base_amount(size: float, size_decimals: int) -> int:
-    """Convert human-readable size to base amount (integer)."""
-    return int(size * (10**size_decimals))
-
-
-def convert_price_to_int(price: float, price_decimals: int) -> int:
-    """Convert human-readable price to integer."""
-    return int(price * (10**price_decimals))
-
-
-def async_route(f):
-    """Decorator for async routes."""
-
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
-
-    return wrapper
-
-
-def require_auth(f):
-    """Decorator to require API_SECRET authentication."""
-
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        if API_SECRET:
-            auth_header = request.headers.get("X-API-Secret", "")
-            if auth_header != API_SECRET:
-                return jsonify({"error": "Unauthorized"}), 401
-        return f(*args, **kwargs)
-
-    return wrapper
-
-
-@app.route("/health", methods=["GET"])
-def health():
-    return jsonify(
-        {
-            "status": "ok",
-            "environment": LIGHTER_ENVIRONMENT,
-            "account_index": LIGHTER_ACCOUNT_INDEX,
-            "base_url": BASE_URL,
-            "timestamp": int(time.time() * 1000),
-        }
-    )
-
-
-@app.route("/api/info", methods=["GET"])
-def get_info():
-    return jsonify(
-        {
-            "environment": LIGHTER_ENVIRONMENT,
-            "account_index": LIGHTER_ACCOUNT_INDEX,
-            "api_key_index": LIGHTER_API_KEY_INDEX,
-            "base_url": BASE_URL,
-            "auth_required": bool(API_SECRET),
-            "nonce_retry_attempts": NONCE_RETRY_ATTEMPTS,
-            "nonce_retry_delay_ms": NONCE_RETRY_DELAY_MS,
-        }
-    )
-
-
-@app.route("/api/nonce/refresh", methods=["POST"])
-@require_auth
-def refresh_nonce_endpoint():
-    """Manually refresh the nonce from the server."""
-    try:
-        refresh_client_nonce()
-        return jsonify({"success": True, "message": "Nonce refreshed"})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/client/reset", methods=["POST"])
-@require_auth
-def reset_client_endpoint():
-    """Reset the client entirely (re-initializes on next request)."""
-    try:
-        reset_client()
-        return jsonify({"success": True, "message": "Client reset"})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/limit", methods=["POST"])
-@require_auth
-@async_route
-async def create_limit_order():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "buy").lower()
-        size = float(data.get("size", 0))
-        price = float(data.get("price", 0))
-        reduce_only = bool(data.get("reduce_only", False))
-        post_only = bool(data.get("post_only", False))
-        client_order_id = int(data.get("client_order_id", 0)) or int(time.time() * 1000)
-
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-        if price <= 0:
-            return jsonify({"error": "price must be > 0 for limit orders"}), 400
-
-        is_ask = side == "sell"
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        price_int = convert_price_to_int(price, price_dec)
-
-        time_in_force = (
-            client.ORDER_TIME_IN_FORCE_POST_ONLY
-            if post_only
-            else client.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME
-        )
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_order,
-            market_index=market_index,
-            client_order_index=client_order_id,
-            base_amount=base_amount,
-            price=price_int,
-            is_ask=is_ask,
-            order_type=client.ORDER_TYPE_LIMIT,
-            time_in_force=time_in_force,
-            reduce_only=reduce_only,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "order": {
-                    "market_index": market_index,
-                    "side": side,
-                    "size": size,
-                    "price": price,
-                    "type": "limit",
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error creating limit order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/market", methods=["POST"])
-@require_auth
-@async_route
-async def create_market_order():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-        order_api = get_order_api()
-
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "buy").lower()
-        size = float(data.get("size", 0))
-        slippage = float(data.get("slippage", 0.5)) / 100
-        reduce_only = bool(data.get("reduce_only", False))
-        client_order_id = int(data.get("client_order_id", 0)) or int(time.time() * 1000)
-
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-
-        orderbook = await order_api.order_book_orders(market_id=market_index, limit=1)
-
-        is_ask = side == "sell"
-
-        if is_ask and orderbook.bids:
-            current_price = float(orderbook.bids[0].price)
-        elif not is_ask and orderbook.asks:
-            current_price = float(orderbook.asks[0].price)
-        else:
-            return jsonify({"error": "Could not get current price"}), 400
-
-        slippage_multiplier = (1 - slippage) if is_ask else (1 + slippage)
-        execution_price = current_price * slippage_multiplier
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        price_int = convert_price_to_int(execution_price, price_dec)
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_order,
-            market_index=market_index,
-            client_order_index=client_order_id,
-            base_amount=base_amount,
-            price=price_int,
-            is_ask=is_ask,
-            order_type=client.ORDER_TYPE_MARKET,
-            time_in_force=client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
-            reduce_only=reduce_only,
-            order_expiry=client.DEFAULT_IOC_EXPIRY,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "order": {
-                    "market_index": market_index,
-                    "side": side,
-                    "size": size,
-                    "execution_price": execution_price,
-                    "type": "market",
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error creating market order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-# =============================================================================
-# TAKE PROFIT / STOP LOSS ORDERS
-# =============================================================================
-
-
-@app.route("/api/order/tp", methods=["POST"])
-@require_auth
-@async_route
-async def create_tp_order():
-    """
-    Create a Take Profit order.
-    Triggers when mark price reaches trigger_price, then executes at price.
-    For LONG positions: is_ask=True (SELL to take profit)
-    For SHORT positions: is_ask=False (BUY to take profit)
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "sell").lower()
-        size = float(data.get("size", 0))
-        trigger_price = float(data.get("trigger_price", 0))
-        price = float(data.get("price", 0)) or trigger_price
-        reduce_only = bool(data.get("reduce_only", True))
-        client_order_id = int(data.get("client_order_id", 0)) or int(time.time() * 1000)
-
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-        if trigger_price <= 0:
-            return jsonify({"error": "trigger_price must be > 0"}), 400
-
-        is_ask = side == "sell"
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
-        price_int = convert_price_to_int(price, price_dec)
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_tp_order,
-            market_index=market_index,
-            client_order_index=client_order_id,
-            base_amount=base_amount,
-            trigger_price=trigger_price_int,
-            price=price_int,
-            is_ask=is_ask,
-            reduce_only=reduce_only,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "order": {
-                    "market_index": market_index,
-                    "side": side,
-                    "size": size,
-                    "trigger_price": trigger_price,
-                    "price": price,
-                    "type": "take_profit",
-                    "reduce_only": reduce_only,
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error creating TP order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/tp-limit", methods=["POST"])
-@require_auth
-@async_route
-async def create_tp_limit_order():
-    """
-    Create a Take Profit Limit order.
-    Triggers when mark price reaches trigger_price, then places limit order at price.
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "sell").lower()
-        size = float(data.get("size", 0))
-        trigger_price = float(data.get("trigger_price", 0))
-        price = float(data.get("price", 0)) or trigger_price
-        reduce_only = bool(data.get("reduce_only", True))
-        client_order_id = int(data.get("client_order_id", 0)) or int(time.time() * 1000)
-
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-        if trigger_price <= 0:
-            return jsonify({"error": "trigger_price must be > 0"}), 400
-
-        is_ask = side == "sell"
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
-        price_int = convert_price_to_int(price, price_dec)
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_tp_limit_order,
-            market_index=market_index,
-            client_order_index=client_order_id,
-            base_amount=base_amount,
-            trigger_price=trigger_price_int,
-            price=price_int,
-            is_ask=is_ask,
-            reduce_only=reduce_only,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "order": {
-                    "market_index": market_index,
-                    "side": side,
-                    "size": size,
-                    "trigger_price": trigger_price,
-                    "price": price,
-                    "type": "take_profit_limit",
-                    "reduce_only": reduce_only,
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error creating TP Limit order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/sl", methods=["POST"])
-@require_auth
-@async_route
-async def create_sl_order():
-    """
-    Create a Stop Loss order.
-    Triggers when mark price reaches trigger_price, then executes at price.
-    For LONG positions: is_ask=True (SELL to stop loss)
-    For SHORT positions: is_ask=False (BUY to stop loss)
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
 
-        client = get_client()
+__all__ = ["app", "stream_slots", "worker_warmup"]
 
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "sell").lower()
-        size = float(data.get("size", 0))
-        trigger_price = float(data.get("trigger_price", 0))
-        price = float(data.get("price", 0)) or trigger_price
-        reduce_only = bool(data.get("reduce_only", True))
-        client_order_id = int(data.get("client_order_id", 0)) or int(time.time() * 1000)
 
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-        if trigger_price <= 0:
-            return jsonify({"error": "trigger_price must be > 0"}), 400
-
-        is_ask = side == "sell"
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
-        price_int = convert_price_to_int(price, price_dec)
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_sl_order,
-            market_index=market_index,
-            client_order_index=client_order_id,
-            base_amount=base_amount,
-            trigger_price=trigger_price_int,
-            price=price_int,
-            is_ask=is_ask,
-            reduce_only=reduce_only,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "order": {
-                    "market_index": market_index,
-                    "side": side,
-                    "size": size,
-                    "trigger_price": trigger_price,
-                    "price": price,
-                    "type": "stop_loss",
-                    "reduce_only": reduce_only,
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error creating SL order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/sl-limit", methods=["POST"])
-@require_auth
-@async_route
-async def create_sl_limit_order():
-    """
-    Create a Stop Loss Limit order.
-    Triggers when mark price reaches trigger_price, then places limit order at price.
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "sell").lower()
-        size = float(data.get("size", 0))
-        trigger_price = float(data.get("trigger_price", 0))
-        price = float(data.get("price", 0)) or trigger_price
-        reduce_only = bool(data.get("reduce_only", True))
-        client_order_id = int(data.get("client_order_id", 0)) or int(time.time() * 1000)
-
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-        if trigger_price <= 0:
-            return jsonify({"error": "trigger_price must be > 0"}), 400
-
-        is_ask = side == "sell"
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
-        price_int = convert_price_to_int(price, price_dec)
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_sl_limit_order,
-            market_index=market_index,
-            client_order_index=client_order_id,
-            base_amount=base_amount,
-            trigger_price=trigger_price_int,
-            price=price_int,
-            is_ask=is_ask,
-            reduce_only=reduce_only,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "order": {
-                    "market_index": market_index,
-                    "side": side,
-                    "size": size,
-                    "trigger_price": trigger_price,
-                    "price": price,
-                    "type": "stop_loss_limit",
-                    "reduce_only": reduce_only,
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error creating SL Limit order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/entry-with-brackets", methods=["POST"])
-@require_auth
-@async_route
-async def create_entry_with_brackets():
-    """
-    Create entry order with TP and SL brackets in a single call.
-    This is more efficient and ensures all orders are placed together.
-
-    Body:
-    {
-        "market_index": 0,
-        "side": "buy",
-        "size": 0.1,
-        "slippage": 0.5,
-        "take_profits": [
-            {"trigger_price": 3600.00, "size_percent": 33},
-            {"trigger_price": 3700.00, "size_percent": 33},
-            {"trigger_price": 3800.00, "size_percent": 34}
-        ],
-        "stop_loss": {
-            "trigger_price": 3300.00
-        }
-    }
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-        order_api = get_order_api()
-
-        market_index = int(data.get("market_index", 0))
-        side = data.get("side", "buy").lower()
-        size = float(data.get("size", 0))
-        slippage = float(data.get("slippage", 0.5)) / 100
-
-        take_profits = data.get("take_profits", [])
-        sl_config = data.get("stop_loss", {})
-
-        if size <= 0:
-            return jsonify({"error": "size must be > 0"}), 400
-
-        results = {
-            "entry": None,
-            "take_profits": [],
-            "stop_loss": None,
-            "errors": []
-        }
-
-        # Get market decimals
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(size, size_dec)
-        is_ask_entry = side == "sell"
-
-        # 1. Create entry order (market)
-        orderbook = await order_api.order_book_orders(market_id=market_index, limit=1)
-
-        if is_ask_entry and orderbook.bids:
-            current_price = float(orderbook.bids[0].price)
-        elif not is_ask_entry and orderbook.asks:
-            current_price = float(orderbook.asks[0].price)
-        else:
-            return jsonify({"error": "Could not get current price"}), 400
-
-        slippage_multiplier = (1 - slippage) if is_ask_entry else (1 + slippage)
-        execution_price = current_price * slippage_multiplier
-        price_int = convert_price_to_int(execution_price, price_dec)
-
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_order,
-            market_index=market_index,
-            client_order_index=int(time.time() * 1000),
-            base_amount=base_amount,
-            price=price_int,
-            is_ask=is_ask_entry,
-            order_type=client.ORDER_TYPE_MARKET,
-            time_in_force=client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
-            reduce_only=False,
-            order_expiry=client.DEFAULT_IOC_EXPIRY,
-        )
-
-        if err:
-            results["errors"].append({"type": "entry", "error": str(err)})
-            return jsonify({"success": False, **results}), 400
-
-        results["entry"] = {
-            "tx_hash": response.tx_hash if response else None,
-            "side": side,
-            "size": size,
-            "execution_price": execution_price,
-        }
-
-        # For brackets: opposite side of entry
-        # LONG entry (buy) = SELL for TP/SL
-        # SHORT entry (sell) = BUY for TP/SL
-        bracket_is_ask = not is_ask_entry
-        bracket_side = "sell" if bracket_is_ask else "buy"
-
-        # 2. Create Take Profit orders
-        for i, tp_config in enumerate(take_profits):
-            if not tp_config.get("trigger_price"):
-                continue
-
-            tp_trigger = float(tp_config["trigger_price"])
-            tp_price = float(tp_config.get("price", tp_trigger))
-            size_percent = float(tp_config.get("size_percent", 100))
-            tp_size = size * (size_percent / 100)
-
-            tp_base_amount = convert_size_to_base_amount(tp_size, size_dec)
-            tp_trigger_int = convert_price_to_int(tp_trigger, price_dec)
-            tp_price_int = convert_price_to_int(tp_price, price_dec)
-
-            tx, response, err = await execute_with_nonce_retry(
-                client.create_tp_order,
-                market_index=market_index,
-                client_order_index=int(time.time() * 1000) + i + 1,
-                base_amount=tp_base_amount,
-                trigger_price=tp_trigger_int,
-                price=tp_price_int,
-                is_ask=bracket_is_ask,
-                reduce_only=True,
-            )
-
-            if err:
-                results["errors"].append({"type": f"take_profit_{i+1}", "error": str(err)})
-            else:
-                results["take_profits"].append({
-                    "tx_hash": response.tx_hash if response else None,
-                    "trigger_price": tp_trigger,
-                    "price": tp_price,
-                    "size": tp_size,
-                    "size_percent": size_percent,
-                })
-
-        # 3. Create Stop Loss order
-        if sl_config.get("trigger_price"):
-            sl_trigger = float(sl_config["trigger_price"])
-            sl_price = float(sl_config.get("price", sl_trigger))
-            sl_size_percent = float(sl_config.get("size_percent", 100))
-            sl_size = size * (sl_size_percent / 100)
-
-            sl_base_amount = convert_size_to_base_amount(sl_size, size_dec)
-            sl_trigger_int = convert_price_to_int(sl_trigger, price_dec)
-            sl_price_int = convert_price_to_int(sl_price, price_dec)
-
-            tx, response, err = await execute_with_nonce_retry(
-                client.create_sl_order,
-                market_index=market_index,
-                client_order_index=int(time.time() * 1000) + len(take_profits) + 1,
-                base_amount=sl_base_amount,
-                trigger_price=sl_trigger_int,
-                price=sl_price_int,
-                is_ask=bracket_is_ask,
-                reduce_only=True,
-            )
-
-            if err:
-                results["errors"].append({"type": "stop_loss", "error": str(err)})
-            else:
-                results["stop_loss"] = {
-                    "tx_hash": response.tx_hash if response else None,
-                    "trigger_price": sl_trigger,
-                    "price": sl_price,
-                    "size": sl_size,
-                }
-
-        return jsonify({
-            "success": len(results["errors"]) == 0,
-            **results
-        })
-
-    except Exception as e:
-        logger.exception("Error creating entry with brackets")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/cancel", methods=["POST"])
-@require_auth
-@async_route
-async def cancel_order():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-
-        market_index = int(data.get("market_index", 0))
-        order_index = int(data.get("order_index", 0))
-
-        if order_index <= 0:
-            return jsonify({"error": "order_index is required"}), 400
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.cancel_order,
-            market_index=market_index,
-            order_index=order_index,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "cancelled": {"market_index": market_index, "order_index": order_index},
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error cancelling order")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/order/cancel-all", methods=["POST"])
-@require_auth
-@async_route
-async def cancel_all_orders():
-    try:
-        data = request.get_json() or {}
-        client = get_client()
-        order_api = get_order_api()
-
-        market_index = data.get("market_index")
-
-        auth_token = create_auth_token()
-        active_orders = await order_api.account_active_orders(
-            account_index=LIGHTER_ACCOUNT_INDEX,
-            market_id=market_index if market_index is not None else -1,
-            auth=auth_token,
-        )
-
-        orders = active_orders.orders or []
-        if not orders:
-            return jsonify(
-                {
-                    "success": True,
-                    "message": "No orders to cancel",
-                    "cancelled_count": 0,
-                }
-            )
-
-        cancelled = []
-        errors = []
-
-        for order in orders:
-            try:
-                # Execute with automatic retry on nonce errors
-                _, response, err = await execute_with_nonce_retry(
-                    client.cancel_order,
-                    market_index=getattr(order, "market_index", market_index or 0),
-                    order_index=order.order_index,
-                )
-                if err:
-                    errors.append({"order_index": order.order_index, "error": str(err)})
-                else:
-                    cancelled.append(order.order_index)
-            except Exception as e:
-                errors.append({"order_index": order.order_index, "error": str(e)})
-
-        return jsonify(
-            {
-                "success": len(errors) == 0,
-                "cancelled_count": len(cancelled),
-                "cancelled_orders": cancelled,
-                "errors": errors if errors else None,
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error cancelling all orders")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/position/close", methods=["POST"])
-@require_auth
-@async_route
-async def close_position():
-    try:
-        data = request.get_json() or {}
-        client = get_client()
-        account_api = get_account_api()
-        order_api = get_order_api()
-
-        market_index = int(data.get("market_index", 0))
-        slippage = float(data.get("slippage", 0.5)) / 100
-
-        response = await account_api.account(
-            by="index", value=str(LIGHTER_ACCOUNT_INDEX)
-        )
-
-        position = None
-        # Response is DetailedAccounts with accounts list
-        accounts = getattr(response, "accounts", []) or []
-        positions = []
-        for account in accounts:
-            positions.extend(getattr(account, "positions", []) or [])
-        for p in positions:
-            p_market = getattr(p, "market_index", getattr(p, "market_id", None))
-            if p_market == market_index:
-                position = p
-                break
-
-        if not position:
-            return jsonify(
-                {
-                    "success": True,
-                    "message": "No position to close",
-                    "market_index": market_index,
-                }
-            )
-
-        position_size = abs(
-            float(getattr(position, "position", getattr(position, "size", 0)))
-        )
-        is_long = getattr(position, "sign", 0) > 0
-
-        if position_size <= 0:
-            return jsonify({"success": True, "message": "Position already closed"})
-
-        orderbook = await order_api.order_book_orders(market_id=market_index, limit=1)
-
-        is_ask = is_long
-
-        if is_ask and orderbook.bids:
-            current_price = float(orderbook.bids[0].price)
-        elif not is_ask and orderbook.asks:
-            current_price = float(orderbook.asks[0].price)
-        else:
-            return jsonify({"error": "Could not get price for close"}), 400
-
-        slippage_multiplier = (1 - slippage) if is_ask else (1 + slippage)
-        execution_price = current_price * slippage_multiplier
-
-        # Get market decimals for proper conversion
-        size_dec, price_dec = await get_market_decimals(market_index)
-        base_amount = convert_size_to_base_amount(position_size, size_dec)
-        price_int = convert_price_to_int(execution_price, price_dec)
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.create_order,
-            market_index=market_index,
-            client_order_index=int(time.time() * 1000),
-            base_amount=base_amount,
-            price=price_int,
-            is_ask=is_ask,
-            order_type=client.ORDER_TYPE_MARKET,
-            time_in_force=client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
-            reduce_only=True,
-            order_expiry=client.DEFAULT_IOC_EXPIRY,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "closed_position": {
-                    "market_index": market_index,
-                    "size": position_size,
-                    "side": "long" if is_long else "short",
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error closing position")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/position/update-leverage", methods=["POST"])
-@require_auth
-@async_route
-async def update_leverage():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "JSON body required"}), 400
-
-        client = get_client()
-
-        market_index = int(data.get("market_index", 0))
-        leverage = int(data.get("leverage", 10))
-        margin_mode = data.get("margin_mode", "cross").lower()
-
-        if leverage < 1 or leverage > 100:
-            return jsonify({"error": "leverage must be between 1 and 100"}), 400
-
-        fraction = leverage * 100
-        mode = (
-            client.CROSS_MARGIN_MODE
-            if margin_mode == "cross"
-            else client.ISOLATED_MARGIN_MODE
-        )
-
-        # Execute with automatic retry on nonce errors
-        tx, response, err = await execute_with_nonce_retry(
-            client.update_leverage,
-            market_index=market_index,
-            fraction=fraction,
-            margin_mode=mode,
-        )
-
-        if err:
-            return jsonify({"success": False, "error": str(err)}), 400
-
-        return jsonify(
-            {
-                "success": True,
-                "tx_hash": response.tx_hash if response else None,
-                "leverage": {
-                    "market_index": market_index,
-                    "leverage": leverage,
-                    "margin_mode": margin_mode,
-                },
-            }
-        )
-
-    except Exception as e:
-        logger.exception("Error updating leverage")
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-@app.route("/api/account", methods=["GET"])
-@require_auth
-@async_route
-async def get_account():
-    try:
-        account_api = get_account_api()
-        account = await account_api.account(
-            by="index", value=str(LIGHTER_ACCOUNT_INDEX)
-        )
-        return jsonify(account.model_dump())
-    except Exception as e:
-        logger.exception("Error getting account")
-        return jsonify({"error": str(e)}), 500
-
-
-@app.route("/api/positions", methods=["GET"])
-@require_auth
-@async_route
-async def get_positions():
-    try:
-        account_api = get_account_api()
-        response = await account_api.account(
-            by="index", value=str(LIGHTER_ACCOUNT_INDEX)
-        )
-
-        positions = []
-        # Response is DetailedAccounts with accounts list
-        accounts = getattr(response, "accounts", []) or []
-        for account in accounts:
-            account_positions = getattr(account, "positions", []) or []
-            for p in account_positions:
-                pos_size = float(getattr(p, "position", getattr(p, "size", 0)))
-                if pos_size != 0:
-                    positions.append(
-                        {
-                            "market_index": getattr(
-                                p, "market_index", getattr(p, "market_id", 0)
-                            ),
-                            "size": abs(pos_size),
-                            "side": "long" if pos_size > 0 else "short",
-                        }
-                    )
-
-        return jsonify({"positions": positions, "count": len(positions)})
-    except Exception as e:
-        logger.exception("Error getting positions")
-        return jsonify({"error": str(e)}), 500
-
-
-@app.route("/api/orders", methods=["GET"])
-@require_auth
-@async_route
-async def get_orders():
-    try:
-        order_api = get_order_api()
-        market_index = request.args.get("market_index", type=int, default=-1)
-
-        auth_token = create_auth_token()
-        active_orders = await order_api.account_active_orders(
-            account_index=LIGHTER_ACCOUNT_INDEX,
-            market_id=market_index,
-            auth=auth_token,
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["sequencer"]:
+        if not NONCE_SEQUENCER_SOCKET:
+            sys.exit("NONCE_SEQUENCER_SOCKET is not set")
+        asyncio.run(
+            serve_nonce_sequencer(NONCE_SEQUENCER_SOCKET, NONCE_LEASE_TIMEOUT_S)
         )
+        sys.exit(0)
 
-        orders = []
-        for o in active_orders.orders or []:
-            orders.append(
-                {
-                    "order_index": o.order_index,
-                    "market_index": getattr(o, "market_index", 0),
-                    "side": "sell" if getattr(o, "is_ask", False) else "buy",
-                    "size": float(
-                        getattr(o, "remaining_base_amount", o.initial_base_amount)
-                    ),
-                    "price": float(o.price),
-                }
-            )
-
-        return jsonify({"orders": orders, "count": len(orders)})
-    except Exception as e:
-        logger.exception("Error getting orders")
-        return jsonify({"error": str(e)}), 500
-
-
-@app.route("/api/auth-token", methods=["GET"])
-@require_auth
-@async_route
-async def get_auth_token():
-    try:
-        client = get_client()
-        expiry = request.args.get("expiry", type=int, default=3600)
-
-        token, err = client.create_auth_token_with_expiry(expiry)
-
-        if err:
-            return jsonify({"error": err}), 400
-
-        return jsonify({"token": token, "expires_in": expiry})
-    except Exception as e:
-        logger.exception("Error generating auth token")
-        return jsonify({"error": str(e)}), 500
-
-
-if __name__ == "__main__":
     if not LIGHTER_API_KEY:
         print("WARNING: LIGHTER_API_KEY not configured!")
 
+    worker_warmup.start()
+
     print(f"\nLighter Trading Backend")
     print(f"Environment: {LIGHTER_ENVIRONMENT}")
     print(f"Account Index: {LIGHTER_ACCOUNT_INDEX}")
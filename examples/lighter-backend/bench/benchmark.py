@@ -0,0 +1,347 @@
+"""
+Lighter Backend Benchmark
+=========================
+Drives app.py routes against the local mock exchange at increasing
+concurrency and reports throughput and p50/p95/p99 latency per route.
+
+Nothing touches mainnet: the mock serves REST, sendTx/sendTxBatch and the
+WebSocket stream, and a throwaway API key is generated for every run.
+
+Usage:
+    python bench/benchmark.py
+    python bench/benchmark.py --latency-ms 25 --nonce-error-rate 0.02 \\
+        --concurrency 1,4,16,64 --requests 200 --scenarios limit,brackets
+
+By default the app runs in-process (Flask test client, one persistent event
+loop like a gunicorn worker). With --target the requests go over HTTP to an
+already running backend instead; start it and mock_exchange.py yourself,
+with LIGHTER_BASE_URL pointing at the mock.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_exchange import MockExchange  # noqa: E402
+
+
+class Scenario(NamedTuple):
+    method: str
+    path: str
+    body: Optional[dict] = None
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "limit": Scenario(
+        "POST",
+        "/api/order/limit",
+        {"market_index": 0, "side": "buy", "size": 0.1, "price": 2900.0},
+    ),
+    "market": Scenario(
+        "POST",
+        "/api/order/market",
+        {"market_index": 0, "side": "buy", "size": 0.1, "slippage": 0.5},
+    ),
+    "brackets": Scenario(
+        "POST",
+        "/api/order/entry-with-brackets",
+        {
+            "market_index": 0,
+            "side": "buy",
+            "size": 0.1,
+            "slippage": 0.5,
+            "take_profits": [
+                {"trigger_price": 3300.0, "size_percent": 50},
+                {"trigger_price": 3400.0, "size_percent": 50},
+            ],
+            "stop_loss": {"trigger_price": 2800.0},
+        },
+    ),
+    "modify": Scenario(
+        "POST",
+        "/api/order/modify",
+        {
+            "orders": [
+                {"client_order_id": 1, "price": 2750.0},
+                {"client_order_id": 2, "price": 2750.0},
+            ]
+        },
+    ),
+    "cancel-all": Scenario("POST", "/api/order/cancel-all", {"mode": "native"}),
+    "cancel-all-batch": Scenario("POST", "/api/order/cancel-all", {"mode": "batch"}),
+    "positions": Scenario("GET", "/api/positions"),
+    "account": Scenario("GET", "/api/account"),
+}
+
+DEFAULT_SCENARIOS = "limit,market,brackets,cancel-all,cancel-all-batch,positions"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(
+        0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1)
+    )
+    return sorted_values[rank]
+
+
+def is_failure(status: int, payload) -> bool:
+    if status >= 400:
+        return True
+    return isinstance(payload, dict) and payload.get("success") is False
+
+
+# =============================================================================
+# TRANSPORTS
+# =============================================================================
+
+
+def in_process_sender(flask_app) -> Callable[[Scenario], tuple]:
+    """Send through the Flask test client (one client per thread)."""
+    local = threading.local()
+
+    def send(scenario: Scenario) -> tuple:
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = flask_app.test_client()
+        response = client.open(
+            scenario.path, method=scenario.method, json=scenario.body
+        )
+        return response.status_code, response.get_json(silent=True)
+
+    return send
+
+
+def http_sender(target: str, api_secret: str) -> Callable[[Scenario], tuple]:
+    """Send over HTTP to a running backend (one keep-alive session per thread)."""
+    import requests
+
+    local = threading.local()
+    headers = {"X-API-Secret": api_secret} if api_secret else {}
+
+    def send(scenario: Scenario) -> tuple:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        response = session.request(
+            scenario.method,
+            target.rstrip("/") + scenario.path,
+            json=scenario.body,
+            headers=headers,
+        )
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        return response.status_code, payload
+
+    return send
+
+
+def start_in_process(args) -> tuple:
+    """Start the mock exchange, then import app.py wired to it."""
+    import lighter
+
+    private_key, public_key, err = lighter.signer_client.create_api_key()
+    if err:
+        raise RuntimeError(f"Could not create a benchmark API key: {err}")
+
+    exchange = MockExchange(
+        args.account_index,
+        {args.api_key_index: public_key},
+        latency_ms=args.latency_ms,
+        nonce_error_rate=args.nonce_error_rate,
+        resting_orders=args.resting_orders,
+    )
+    base_url = exchange.start()
+
+    os.environ.update(
+        {
+            "LIGHTER_BASE_URL": base_url,
+            "LIGHTER_API_KEY": private_key,
+            "LIGHTER_ACCOUNT_INDEX": str(args.account_index),
+            "LIGHTER_API_KEY_INDEX": str(args.api_key_index),
+            "ORDER_BOOK_MARKETS": "0",
+            "API_SECRET": "",
+        }
+    )
+    import app as backend
+
+    if not args.verbose:
+        # Injected nonce errors would otherwise flood the report with retries
+        logging.getLogger().setLevel(logging.ERROR)
+
+    # Measure warm workers: wait for the boot warm-up like a readiness probe
+    client = backend.app.test_client()
+    deadline = time.monotonic() + 30
+    while client.get("/health/ready").status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Backend did not become ready within 30 s")
+        time.sleep(0.05)
+    return exchange, in_process_sender(backend.app)
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+
+def run_level(send: Callable, scenario: Scenario, concurrency: int, total: int) -> dict:
+    """Issue `total` requests with `concurrency` in flight; collect latencies."""
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            status, payload = send(scenario)
+            failed = is_failure(status, payload)
+            error = (payload or {}).get("error") if failed else None
+        except Exception as e:
+            failed, error = True, str(e)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if failed:
+                errors.append(str(error))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": round(total / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def print_table(name: str, rows: List[dict]):
+    print(f"\n{name}")
+    print(
+        f"{'conc':>6} {'reqs':>6} {'errors':>6} {'req/s':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['concurrency']:>6} {row['requests']:>6} {row['errors']:>6} "
+            f"{row['throughput_rps']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}"
+        )
+        if row["first_error"]:
+            print(f"       first error: {row['first_error'][:120]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark app.py against a mock exchange"
+    )
+    parser.add_argument(
+        "--scenarios",
+        default=DEFAULT_SCENARIOS,
+        help=f"comma-separated, from: {','.join(SCENARIOS)}",
+    )
+    parser.add_argument(
+        "--concurrency", default="1,4,16,64", help="comma-separated concurrency levels"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=200,
+        help="requests per scenario and concurrency level",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=10, help="untimed requests before each scenario"
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="latency injected on every sendTx/sendTxBatch",
+    )
+    parser.add_argument(
+        "--nonce-error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of valid transactions rejected with 21104",
+    )
+    parser.add_argument(
+        "--resting-orders",
+        type=int,
+        default=10,
+        help="open orders reported to cancel-all",
+    )
+    parser.add_argument("--account-index", type=int, default=1)
+    parser.add_argument("--api-key-index", type=int, default=3)
+    parser.add_argument(
+        "--target",
+        default="",
+        help="URL of a running backend; default runs app.py in-process",
+    )
+    parser.add_argument("--api-secret", default=os.getenv("API_SECRET", ""))
+    parser.add_argument(
+        "--json", default="", help="also write the results to this file"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="keep the app's INFO/WARNING logs"
+    )
+    args = parser.parse_args()
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    exchange = None
+    if args.target:
+        send = http_sender(args.target, args.api_secret)
+    else:
+        exchange, send = start_in_process(args)
+
+    results = {
+        "config": {
+            "latency_ms": args.latency_ms,
+            "nonce_error_rate": args.nonce_error_rate,
+            "resting_orders": args.resting_orders,
+            "target": args.target or "in-process",
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        scenario = SCENARIOS[name]
+        for _ in range(args.warmup):
+            send(scenario)
+        rows = [run_level(send, scenario, level, args.requests) for level in levels]
+        results["scenarios"][name] = rows
+        print_table(f"{name} ({scenario.method} {scenario.path})", rows)
+
+    if exchange is not None:
+        results["exchange"] = exchange.stats()
+        print(f"\nmock exchange: {json.dumps(exchange.stats())}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
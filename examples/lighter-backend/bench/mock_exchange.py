@@ -0,0 +1,460 @@
+"""
+Mock Lighter Exchange
+=====================
+In-process stand-in for the Lighter REST API, sendTx/sendTxBatch and the
+/stream WebSocket, used by the benchmark suite.
+
+Nonces are enforced per (account, API key) like the real exchange, so the
+backend's nonce handling is exercised. Latency and nonce errors can be
+injected on every transaction send.
+
+Usage:
+    python mock_exchange.py --port 8790 --latency-ms 20 --nonce-error-rate 0.01
+
+The standalone mode needs the public key of the API key the backend signs
+with (--public-key); the benchmark runner creates one and wires it up.
+"""
+
+import json
+import random
+import asyncio
+import argparse
+import threading
+from aiohttp import web
+
+NONCE_ERROR = {"code": 21104, "message": "invalid nonce"}
+
+MARKET = {
+    "symbol": "ETH",
+    "market_id": 0,
+    "market_type": "perp",
+    "base_asset_id": 0,
+    "quote_asset_id": 0,
+    "status": "active",
+    "taker_fee": "0",
+    "maker_fee": "0",
+    "liquidation_fee": "0",
+    "min_base_amount": "0.005",
+    "min_quote_amount": "10",
+    "supported_size_decimals": 4,
+    "supported_price_decimals": 2,
+    "supported_quote_decimals": 6,
+    "order_quote_limit": "",
+    "is_maker_fee_enabled": False,
+    "is_taker_fee_enabled": False,
+    "created_at": "",
+    "multiplier": "1",
+}
+
+
+class MockExchange:
+    """
+    Lighter endpoints used by app.py, served by aiohttp.
+
+    latency_ms delays every sendTx/sendTxBatch call; nonce_error_rate
+    rejects that fraction of otherwise valid transactions with 21104.
+    Every accountActiveOrders call (and the account_all_orders snapshot)
+    returns `resting_orders` orders, so cancel-all does the same work on
+    each request.
+    """
+
+    def __init__(
+        self,
+        account_index: int,
+        public_keys: dict,
+        latency_ms: float = 0.0,
+        nonce_error_rate: float = 0.0,
+        resting_orders: int = 0,
+        mid_price: float = 3000.0,
+        book_update_interval_s: float = 0.5,
+    ):
+        self.account_index = account_index
+        self.public_keys = dict(public_keys)
+        self.latency = latency_ms / 1000
+        self.nonce_error_rate = nonce_error_rate
+        self.resting_orders = resting_orders
+        self.mid_price = mid_price
+        self.book_update_interval = book_update_interval_s
+        self.nonces: dict = {}
+        self.calls: dict = {}
+        self.accepted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+        }
+
+    # -------------------------------------------------------------------------
+    # REST
+    # -------------------------------------------------------------------------
+
+    async def api_keys(self, request):
+        self._count("apikeys")
+        account = int(request.query.get("account_index", self.account_index))
+        wanted = int(request.query.get("api_key_index", 255))
+        keys = [
+            {
+                "account_index": account,
+                "api_key_index": index,
+                "nonce": 0,
+                "public_key": public_key.removeprefix("0x"),
+            }
+            for index, public_key in self.public_keys.items()
+            if wanted in (index, 255)
+        ]
+        return web.json_response({"code": 200, "api_keys": keys})
+
+    async def next_nonce(self, request):
+        self._count("nextNonce")
+        key = (int(request.query["account_index"]), int(request.query["api_key_index"]))
+        return web.json_response({"code": 200, "nonce": self.nonces.get(key, 0)})
+
+    async def order_books(self, request):
+        self._count("orderBooks")
+        return web.json_response({"code": 200, "order_books": [MARKET]})
+
+    async def order_book_orders(self, request):
+        self._count("orderBookOrders")
+
+        def level(price: float) -> dict:
+            return {
+                "order_index": 1,
+                "order_id": "1",
+                "owner_account_index": 1,
+                "initial_base_amount": "1",
+                "remaining_base_amount": "1",
+                "price": f"{price:.2f}",
+                "order_expiry": 0,
+                "transaction_time": 0,
+            }
+
+        return web.json_response(
+            {
+                "code": 200,
+                "total_asks": 1,
+                "asks": [level(self.mid_price + 1)],
+                "total_bids": 1,
+                "bids": [level(self.mid_price - 1)],
+            }
+        )
+
+    def _position(self, market_index: int, size: str, sign: int) -> dict:
+        return {
+            "market_id": market_index,
+            "symbol": MARKET["symbol"],
+            "initial_margin_fraction": "5",
+            "open_order_count": 0,
+            "pending_order_count": 0,
+            "position_tied_order_count": 0,
+            "sign": sign,
+            "position": size,
+            "avg_entry_price": f"{self.mid_price:.2f}",
+            "position_value": "1",
+            "unrealized_pnl": "0",
+            "realized_pnl": "0",
+            "liquidation_price": "0",
+            "margin_mode": 0,
+            "allocated_margin": "0",
+            "total_discount": "0",
+            "margin_set_flag": 0,
+        }
+
+    async def account(self, request):
+        self._count("account")
+        account_index = int(request.query.get("value", self.account_index))
+        account = {
+            "code": 200,
+            "account_type": 0,
+            "index": account_index,
+            "l1_address": "0x0",
+            "cancel_all_time": 0,
+            "total_order_count": self.resting_orders,
+            "total_isolated_order_count": 0,
+            "pending_order_count": 0,
+            "available_balance": "900",
+            "status": 1,
+            "collateral": "1000",
+            "account_index": account_index,
+            "name": "",
+            "description": "",
+            "can_invite": False,
+            "referral_points_percentage": "0",
+            "positions": [self._position(0, "0.5", 1)],
+            "assets": [],
+            "total_asset_value": "1000",
+            "cross_asset_value": "1000",
+            "pool_info": {
+                "status": 0,
+                "operator_fee": "0",
+                "min_operator_share_rate": "0",
+                "annual_percentage_yield": 0,
+                "sharpe_ratio": 0,
+            },
+            "shares": [],
+            "created_at": 0,
+            "transaction_time": 0,
+            "can_rfq": False,
+            "cross_initial_margin_requirement": "0",
+            "cross_maintenance_margin_requirement": "0",
+            "can_rfq_market_ids": [],
+            "metadata": {},
+            "agent_enabled": False,
+        }
+        return web.json_response({"code": 200, "total": 1, "accounts": [account]})
+
+    def _order(self, i: int, account_index: int) -> dict:
+        return {
+            "order_index": i,
+            "client_order_index": i,
+            "order_id": str(i),
+            "client_order_id": str(i),
+            "market_index": 0,
+            "owner_account_index": account_index,
+            "initial_base_amount": "0.1",
+            "price": f"{self.mid_price * 0.9:.2f}",
+            "nonce": 1,
+            "remaining_base_amount": "0.1",
+            "is_ask": False,
+            "base_size": 1,
+            "base_price": 1,
+            "filled_base_amount": "0",
+            "filled_quote_amount": "0",
+            "side": "buy",
+            "type": "limit",
+            "time_in_force": "good-till-time",
+            "reduce_only": False,
+            "trigger_price": "0",
+            "order_expiry": 0,
+            "status": "open",
+            "trigger_status": "na",
+            "trigger_time": 0,
+            "parent_order_index": 0,
+            "parent_order_id": "0",
+            "to_trigger_order_id_0": "0",
+            "to_trigger_order_id_1": "0",
+            "to_cancel_order_id_0": "0",
+            "block_height": 1,
+            "timestamp": 1,
+            "created_at": 1,
+            "updated_at": 1,
+            "transaction_time": 1,
+            "integrator_fee_collector_index": "0",
+            "integrator_maker_fee": "0",
+            "integrator_taker_fee": "0",
+            "order_flags": 0,
+            "order_version": 0,
+        }
+
+    def _resting_orders(self, account_index: int) -> list:
+        return [
+            self._order(i, account_index) for i in range(1, self.resting_orders + 1)
+        ]
+
+    async def active_orders(self, request):
+        self._count("accountActiveOrders")
+        account_index = int(request.query.get("account_index", self.account_index))
+        orders = self._resting_orders(account_index)
+        return web.json_response({"code": 200, "orders": orders})
+
+    # -------------------------------------------------------------------------
+    # TRANSACTIONS
+    # -------------------------------------------------------------------------
+
+    def _accept(self, tx_info: dict) -> bool:
+        """Apply one transaction if its nonce is the next one for its key."""
+        key = (tx_info["AccountIndex"], tx_info["ApiKeyIndex"])
+        with self._lock:
+            expected = self.nonces.get(key, 0)
+            if tx_info["Nonce"] != expected or random.random() < self.nonce_error_rate:
+                self.rejected += 1
+                return False
+            self.nonces[key] = expected + 1
+            self.accepted += 1
+            return True
+
+    async def send_tx(self, request):
+        self._count("sendTx")
+        form = await request.post()
+        tx_info = json.loads(form["tx_info"])
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not self._accept(tx_info):
+            return web.json_response(NONCE_ERROR, status=400)
+        return web.json_response(
+            {
+                "code": 200,
+                "tx_hash": f"0x{tx_info['Nonce']:064x}",
+                "predicted_execution_time_ms": 1,
+                "volume_quota_remaining": 1,
+            }
+        )
+
+    async def send_tx_batch(self, request):
+        self._count("sendTxBatch")
+        form = await request.post()
+        tx_infos = [json.loads(tx_info) for tx_info in json.loads(form["tx_infos"])]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        hashes = []
+        for tx_info in tx_infos:
+            if not self._accept(tx_info):
+                return web.json_response(NONCE_ERROR, status=400)
+            hashes.append(f"0x{tx_info['Nonce']:064x}")
+        return web.json_response(
+            {
+                "code": 200,
+                "tx_hash": hashes,
+                "predicted_execution_time_ms": 1,
+                "volume_quota_remaining": 1,
+            }
+        )
+
+    # -------------------------------------------------------------------------
+    # WEBSOCKET
+    # -------------------------------------------------------------------------
+
+    def _book(self) -> dict:
+        mid = self.mid_price
+        return {
+            "offset": 1,
+            "asks": [
+                {"price": f"{mid + 2:.2f}", "size": "1.0"},
+                {"price": f"{mid + 3:.2f}", "size": "2.0"},
+            ],
+            "bids": [
+                {"price": f"{mid - 2:.2f}", "size": "1.5"},
+                {"price": f"{mid - 3:.2f}", "size": "3.0"},
+            ],
+        }
+
+    async def stream(self, request):
+        self._count("stream")
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"type": "connected"})
+        markets = set()
+
+        async def publish_books():
+            # Keeps subscribed books inside the backend's staleness window
+            while not ws.closed:
+                await asyncio.sleep(self.book_update_interval)
+                for market in list(markets):
+                    await ws.send_json(
+                        {
+                            "type": "update/order_book",
+                            "channel": f"order_book:{market}",
+                            "order_book": {"offset": 2, "asks": [], "bids": []},
+                        }
+                    )
+
+        publisher = asyncio.create_task(publish_books())
+        try:
+            async for message in ws:
+                data = json.loads(message.data)
+                if data.get("type") == "ping":
+                    await ws.send_json({"type": "pong"})
+                    continue
+                if data.get("type") != "subscribe":
+                    continue
+                channel, _, target = data.get("channel", "").partition("/")
+                if channel == "order_book":
+                    markets.add(target)
+                    await ws.send_json(
+                        {
+                            "type": "subscribed/order_book",
+                            "channel": f"order_book:{target}",
+                            "order_book": self._book(),
+                        }
+                    )
+                elif channel == "account_all":
+                    await ws.send_json(
+                        {
+                            "type": "subscribed/account_all",
+                            "channel": f"account_all:{target}",
+                            "positions": {"0": self._position(0, "0.5", 1)},
+                        }
+                    )
+                elif channel == "account_all_orders":
+                    await ws.send_json(
+                        {
+                            "type": "subscribed/account_all_orders",
+                            "channel": f"account_all_orders:{target}",
+                            "orders": {"0": self._resting_orders(int(target))},
+                        }
+                    )
+                elif channel == "user_stats":
+                    await ws.send_json(
+                        {
+                            "type": "subscribed/user_stats",
+                            "channel": f"user_stats:{target}",
+                            "stats": {"collateral": "1000", "available_balance": "900"},
+                        }
+                    )
+        finally:
+            publisher.cancel()
+        return ws
+
+    async def mock_stats(self, request):
+        return web.json_response(self.stats())
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/v1/apikeys", self.api_keys)
+        app.router.add_get("/api/v1/nextNonce", self.next_nonce)
+        app.router.add_get("/api/v1/orderBooks", self.order_books)
+        app.router.add_get("/api/v1/orderBookOrders", self.order_book_orders)
+        app.router.add_get("/api/v1/account", self.account)
+        app.router.add_get("/api/v1/accountActiveOrders", self.active_orders)
+        app.router.add_post("/api/v1/sendTx", self.send_tx)
+        app.router.add_post("/api/v1/sendTxBatch", self.send_tx_batch)
+        app.router.add_get("/stream", self.stream)
+        app.router.add_get("/mock/stats", self.mock_stats)
+        return app
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve from a daemon thread; returns the base URL."""
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+
+        async def serve():
+            runner = web.AppRunner(self.make_app(), access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, host, port)
+            await site.start()
+            return runner.addresses[0][1]
+
+        bound_port = asyncio.run_coroutine_threadsafe(serve(), loop).result()
+        return f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Lighter exchange")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--account-index", type=int, default=0)
+    parser.add_argument("--api-key-index", type=int, default=3)
+    parser.add_argument("--public-key", required=True)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--nonce-error-rate", type=float, default=0.0)
+    parser.add_argument("--resting-orders", type=int, default=10)
+    args = parser.parse_args()
+
+    exchange = MockExchange(
+        args.account_index,
+        {args.api_key_index: args.public_key},
+        latency_ms=args.latency_ms,
+        nonce_error_rate=args.nonce_error_rate,
+        resting_orders=args.resting_orders,
+    )
+    web.run_app(exchange.make_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
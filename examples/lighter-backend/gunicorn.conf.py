@@ -0,0 +1,27 @@
+"""
+Gunicorn hooks for the Lighter backend (loaded automatically from the
+working directory; command-line flags still set workers, threads, etc).
+"""
+
+
+def post_worker_init(worker):
+    # Warm the worker up before it accepts requests. Importing app.py does
+    # not do it (the nonce sequencer process imports it too), and with
+    # --preload the import happened in the master anyway.
+    from app import stream_slots, worker_warmup
+    from lighter_backend.metrics import METRICS_DIR, METRICS_FLUSH_S, metrics
+
+    # /api/stream responses hold a request thread each: keep most of them
+    # for order routes and health checks
+    stream_slots.configure(worker.cfg.threads)
+    # /metrics answers for every worker, not just the one scraped
+    metrics.share(METRICS_DIR, METRICS_FLUSH_S)
+    worker_warmup.start()
+
+
+def child_exit(server, worker):
+    # Runs in the master: forget the worker's metrics so a restart does not
+    # leave its last samples behind
+    from lighter_backend.metrics import METRICS_DIR, mark_process_dead
+
+    mark_process_dead(METRICS_DIR, worker.pid)
@@ -0,0 +1,7 @@
+"""
+Lighter trading backend: the Flask app, the Lighter clients and the
+nonce, retry, submission and job machinery behind its endpoints.
+
+`app.py` at the project root is the entrypoint; configuration is read
+from the environment (see its docstring).
+"""
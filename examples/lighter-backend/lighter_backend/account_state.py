@@ -0,0 +1,463 @@
+"""Account state from the account WebSocket channels, and our live orders."""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Any, Tuple, Optional, Dict, List
+
+from .events import SSE_QUEUE_SIZE, SSE_REPLAY_SIZE, EventHub
+from .http_pool import get_account_api, get_order_api
+from .streams import StreamFeed
+
+logger = logging.getLogger(__name__)
+
+
+ACCOUNT_STREAM = os.getenv("ACCOUNT_STREAM", "true").lower() == "true"
+ORDER_STORE = os.getenv("ORDER_STORE", "true").lower() == "true"
+ORDER_RECONCILE_INTERVAL_S = float(os.getenv("ORDER_RECONCILE_INTERVAL_S", "60"))
+# Maximum age of the REST-only account fields (balances, collateral, ...)
+# served next to streamed positions
+ACCOUNT_REST_TTL_S = float(os.getenv("ACCOUNT_REST_TTL_S", "5"))
+
+# Order statuses that still rest on (or are about to reach) the book
+LIVE_ORDER_STATUSES = frozenset(("open", "pending", "in-progress"))
+
+
+class OwnOrder:
+    """One of our live orders, as a compact slotted record."""
+
+    __slots__ = (
+        "order_index",
+        "client_order_index",
+        "market_index",
+        "is_ask",
+        "price",
+        "remaining_base_amount",
+        "initial_base_amount",
+        "trigger_price",
+        "order_type",
+        "status",
+        "reduce_only",
+        "updated_at",
+    )
+
+    def __init__(self, data: dict, updated_at: float):
+        self.order_index = int(data["order_index"])
+        self.client_order_index = int(data.get("client_order_index") or 0)
+        self.market_index = int(data.get("market_index", 0))
+        self.is_ask = bool(data.get("is_ask", False))
+        self.price = str(data.get("price", "0"))
+        self.initial_base_amount = str(data.get("initial_base_amount", "0"))
+        self.remaining_base_amount = str(
+            data.get("remaining_base_amount", self.initial_base_amount)
+        )
+        self.trigger_price = str(data.get("trigger_price", "0"))
+        self.order_type = str(data.get("type", ""))
+        self.status = str(data.get("status", "open"))
+        self.reduce_only = bool(data.get("reduce_only", False))
+        self.updated_at = updated_at
+
+    def to_dict(self) -> dict:
+        return {
+            "order_index": self.order_index,
+            "client_order_id": self.client_order_index,
+            "market_index": self.market_index,
+            "side": "sell" if self.is_ask else "buy",
+            "size": float(self.remaining_base_amount),
+            "price": float(self.price),
+            "trigger_price": float(self.trigger_price),
+            "type": self.order_type,
+            "status": self.status,
+            "reduce_only": self.reduce_only,
+        }
+
+
+class OrderStore:
+    """
+    Our live orders, indexed by order_index, market and client_order_index.
+
+    Fed by `account_all_orders` updates and replaced by REST snapshots.
+    A REST snapshot is taken as of the moment it was requested: orders the
+    stream touched after that moment keep their streamed state, so a slow
+    reconcile cannot resurrect a filled order or drop a new one.
+    """
+
+    def __init__(self):
+        self._by_index: Dict[int, OwnOrder] = {}
+        self._by_market: Dict[int, Dict[int, OwnOrder]] = {}
+        self._by_client_id: Dict[int, int] = {}
+        # order_index -> when the stream reported it gone
+        self._removed: Dict[int, float] = {}
+        self.ready = False
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._by_index)
+
+    def _add(self, order: OwnOrder):
+        self._remove(order.order_index)
+        self._by_index[order.order_index] = order
+        self._by_market.setdefault(order.market_index, {})[order.order_index] = order
+        if order.client_order_index:
+            self._by_client_id[order.client_order_index] = order.order_index
+
+    def _remove(self, order_index: int):
+        order = self._by_index.pop(order_index, None)
+        if order is None:
+            return
+        market = self._by_market.get(order.market_index)
+        if market is not None:
+            market.pop(order_index, None)
+            if not market:
+                del self._by_market[order.market_index]
+        if self._by_client_id.get(order.client_order_index) == order_index:
+            del self._by_client_id[order.client_order_index]
+
+    def apply(self, data: dict):
+        """Apply one streamed order update."""
+        now = time.monotonic()
+        if str(data.get("status", "open")) in LIVE_ORDER_STATUSES:
+            self._removed.pop(int(data["order_index"]), None)
+            self._add(OwnOrder(data, now))
+        else:
+            order_index = int(data["order_index"])
+            self._remove(order_index)
+            self._removed[order_index] = now
+
+    def replace(
+        self, orders: List[dict], as_of: float, market_index: Optional[int] = None
+    ):
+        """
+        Replace the store (or one market) with a snapshot taken at `as_of`
+        (monotonic); updates streamed after `as_of` win over the snapshot.
+        """
+        current = (
+            self._by_index.values()
+            if market_index is None
+            else self._by_market.get(market_index, {}).values()
+        )
+        for order in list(current):
+            if order.updated_at < as_of:
+                self._remove(order.order_index)
+        for data in orders:
+            if str(data.get("status", "open")) not in LIVE_ORDER_STATUSES:
+                continue
+            order_index = int(data["order_index"])
+            existing = self._by_index.get(order_index)
+            if (existing is not None and existing.updated_at >= as_of) or (
+                self._removed.get(order_index, 0) >= as_of
+            ):
+                continue
+            self._add(OwnOrder(data, as_of))
+        if market_index is None:
+            self._removed = {i: t for i, t in self._removed.items() if t >= as_of}
+            self.ready = True
+        self.synced_at = time.time()
+
+    def orders(self, market_index: Optional[int] = None) -> List[OwnOrder]:
+        if market_index is None:
+            return list(self._by_index.values())
+        return list(self._by_market.get(market_index, {}).values())
+
+    def get(self, order_index: int) -> Optional[OwnOrder]:
+        return self._by_index.get(order_index)
+
+    def by_client_id(self, client_order_index: int) -> Optional[OwnOrder]:
+        order_index = self._by_client_id.get(client_order_index)
+        return self._by_index.get(order_index) if order_index is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "orders": len(self._by_index),
+            "markets": len(self._by_market),
+            "ready": self.ready,
+            "synced_at": int(self.synced_at * 1000) if self.synced_at else None,
+        }
+
+
+class AccountStateFeed(StreamFeed):
+    """
+    In-memory account snapshot fed from the `account_all` and
+    `account_all_orders` WebSocket channels.
+
+    Positions are kept per market and replaced by each update. The rest
+    of the account (balances, assets, ...) is not on those channels: it
+    comes from a REST fetch at most ACCOUNT_REST_TTL_S old, stamped with
+    its own `account_as_of`, and `account_dict` serves it in the REST
+    shape. State is served from memory only while the connection is up
+    and the initial snapshot has arrived.
+
+    Updates after the snapshot are also published to `events`: fills,
+    order changes and position changes, for /api/stream. Our live orders
+    are kept in `orders`, reconciled with REST every
+    ORDER_RECONCILE_INTERVAL_S.
+    """
+
+    name = "account"
+
+    def __init__(
+        self,
+        url: str,
+        account_index: int,
+        auth_token: Callable[[], Awaitable[Tuple[str, float, Any]]],
+    ):
+        super().__init__(url)
+        self.account_index = account_index
+        self.auth_token = auth_token
+        self.response: Optional[dict] = None
+        self.account: Optional[dict] = None
+        # When the REST fetch behind `account` was requested (epoch seconds)
+        self.account_as_of = 0.0
+        self.positions: Dict[int, dict] = {}
+        self.ready = False
+        self.hits = 0
+        self.fallbacks = 0
+        self.account_refreshes = 0
+        self._account_refresh = None
+        self.events = EventHub(SSE_QUEUE_SIZE, SSE_REPLAY_SIZE)
+        self.orders = OrderStore()
+        self.order_hits = 0
+        self.order_fallbacks = 0
+        self._reconcile_task = None
+
+    def start(self):
+        super().start()
+        if ORDER_STORE:
+            task = self._reconcile_task
+            loop = asyncio.get_running_loop()
+            if task is None or task.done() or task.get_loop() is not loop:
+                self._reconcile_task = loop.create_task(self._reconcile_forever())
+
+    def stop(self):
+        super().stop()
+        task = self._reconcile_task
+        if task is not None and not task.done():
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    async def _auth_token(self) -> str:
+        token, _, err = await self.auth_token()
+        if err:
+            raise Exception(f"auth token: {err}")
+        return token
+
+    async def _on_connect(self, ws):
+        token = await self._auth_token()
+        for channel in ("account_all", "account_all_orders"):
+            await ws.send_json(
+                {
+                    "type": "subscribe",
+                    "channel": f"{channel}/{self.account_index}",
+                    "auth": token,
+                }
+            )
+
+    def _on_disconnect(self):
+        self.ready = False
+        self.orders.ready = False
+
+    async def _handle(self, message: dict):
+        message_type = message.get("type", "")
+        if message_type in ("subscribed/account_all", "update/account_all"):
+            positions = message.get("positions") or {}
+            is_update = message_type == "update/account_all"
+            if not is_update:
+                self.positions.clear()
+                self.ready = True
+            for position in positions.values():
+                market_index = int(position["market_id"])
+                previous = self.positions.get(market_index)
+                self.positions[market_index] = position
+                if is_update and _position_changed(previous, position):
+                    size, side = position_side(position)
+                    self.events.publish(
+                        "position",
+                        market_index,
+                        {"size": size, "side": side, "position": position},
+                    )
+            if is_update:
+                for market, trades in (message.get("trades") or {}).items():
+                    for trade in trades:
+                        self.events.publish("fill", int(market), {"trade": trade})
+        elif message_type == "subscribed/account_all_orders":
+            orders = [
+                o for market in (message.get("orders") or {}).values() for o in market
+            ]
+            self.orders.replace(orders, time.monotonic())
+        elif message_type == "update/account_all_orders":
+            for market, orders in (message.get("orders") or {}).items():
+                for order in orders:
+                    self.orders.apply(order)
+                    self.events.publish("order", int(market), {"order": order})
+
+    def fresh(self) -> bool:
+        return self.ready and self.connected
+
+    async def _fetch(self):
+        requested = time.time()
+        response = await get_account_api().account(
+            by="index", value=str(self.account_index)
+        )
+        accounts = getattr(response, "accounts", []) or []
+        if not accounts:
+            raise Exception(f"Account {self.account_index} not found")
+        account = accounts[0].model_dump()
+        self.response = response.model_dump()
+        self.account = account
+        self.account_as_of = requested
+        if not self.fresh():
+            self.positions = {int(p["market_id"]): p for p in account["positions"]}
+
+    async def _fetch_orders(self, market_index: Optional[int] = None) -> List[dict]:
+        """Our active orders over REST; also reconciles the order store."""
+        as_of = time.monotonic()
+        response = await get_order_api().account_active_orders(
+            account_index=self.account_index,
+            market_id=market_index if market_index is not None else -1,
+            authorization=await self._auth_token(),
+        )
+        orders = [o.model_dump() for o in response.orders or []]
+        if ORDER_STORE:
+            self.orders.replace(orders, as_of, market_index)
+        return orders
+
+    async def _reconcile_forever(self):
+        while True:
+            await asyncio.sleep(ORDER_RECONCILE_INTERVAL_S)
+            if not self.connected:
+                continue
+            try:
+                await self._fetch_orders()
+            except Exception as e:
+                logger.warning(
+                    f"Order reconcile failed for account {self.account_index}: {e}"
+                )
+
+    async def active_orders(
+        self, market_index: Optional[int] = None
+    ) -> Tuple[List[OwnOrder], str]:
+        """Our live orders (optionally one market) and their source."""
+        if ACCOUNT_STREAM and ORDER_STORE:
+            self.start()
+            if self.fresh() and self.orders.ready:
+                self.order_hits += 1
+                return self.orders.orders(market_index), "stream"
+            self.order_fallbacks += 1
+        orders = await self._fetch_orders(market_index)
+        now = time.monotonic()
+        return [OwnOrder(o, now) for o in orders], "rest"
+
+    async def find_order(
+        self, client_order_index: int = 0, order_index: int = 0
+    ) -> Optional[OwnOrder]:
+        """Our live order with this client_order_index (or order_index), if any."""
+        if ACCOUNT_STREAM and ORDER_STORE:
+            self.start()
+            if self.fresh() and self.orders.ready:
+                self.order_hits += 1
+                if order_index:
+                    return self.orders.get(order_index)
+                return self.orders.by_client_id(client_order_index)
+            self.order_fallbacks += 1
+        for order in await self._fetch_orders():
+            if (order_index and int(order["order_index"]) == order_index) or (
+                not order_index
+                and int(order.get("client_order_index") or 0) == client_order_index
+            ):
+                return OwnOrder(order, time.monotonic())
+        return None
+
+    async def snapshot(self, need_account: bool = False) -> Tuple[dict, str, float]:
+        """
+        Return (positions by market, source, as_of epoch seconds).
+
+        With need_account, also makes sure the non-position fields are at
+        most ACCOUNT_REST_TTL_S old (see `account_as_of`); while the stream
+        stays up that is one REST call per worker per TTL.
+        """
+        if ACCOUNT_STREAM:
+            self.start()
+            if self.fresh():
+                account_age = time.time() - self.account_as_of
+                if need_account and account_age > ACCOUNT_REST_TTL_S:
+                    await self._refresh_account()
+                self.hits += 1
+                # A live connection vouches for the state up to its last message
+                return self.positions, "stream", self.last_message_time
+            self.fallbacks += 1
+        await self._fetch()
+        return self.positions, "rest", time.time()
+
+    async def _refresh_account(self):
+        """Re-fetch the REST fields, coalescing concurrent callers into one call."""
+        loop = asyncio.get_running_loop()
+        task = self._account_refresh
+        if task is None or task.done() or task.get_loop() is not loop:
+            self.account_refreshes += 1
+            task = self._account_refresh = loop.create_task(self._fetch())
+        await asyncio.shield(task)
+
+    def account_dict(self) -> dict:
+        """The account in the REST `DetailedAccount` shape, with live positions."""
+        account = dict(self.account or {})
+        rest_positions = {
+            int(p["market_id"]): p for p in account.get("positions") or []
+        }
+        account["positions"] = [
+            rest_position(position, rest_positions.get(market_index))
+            for market_index, position in self.positions.items()
+        ]
+        return account
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "ready": self.ready,
+            "positions": len(self.positions),
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "account_refreshes": self.account_refreshes,
+            "account_as_of": (
+                int(self.account_as_of * 1000) if self.account_as_of else None
+            ),
+            "order_store": {
+                **self.orders.stats(),
+                "hits": self.order_hits,
+                "fallbacks": self.order_fallbacks,
+            },
+        }
+
+
+def rest_position(position: dict, template: Optional[dict] = None) -> dict:
+    """
+    A position in the REST `AccountPosition` shape: its fields and their
+    types, whatever the WebSocket sent. Fields the stream did not send keep
+    the REST value of `template` (the same market's last REST position).
+    """
+    import lighter
+
+    result = {}
+    for name, field in lighter.AccountPosition.model_fields.items():
+        value = position.get(name, (template or {}).get(name))
+        if name == "additional_properties":
+            value = (template or {}).get(name) or {}
+        elif value is not None:
+            value = int(value) if field.annotation is int else str(value)
+        result[name] = value
+    return result
+
+
+def _position_changed(previous: Optional[dict], position: dict) -> bool:
+    if previous is None:
+        return True
+    return any(
+        previous.get(key) != position.get(key)
+        for key in ("position", "sign", "avg_entry_price")
+    )
+
+
+def position_side(position: dict) -> Tuple[float, str]:
+    """Absolute size and "long"/"short" for a position dict."""
+    size = float(position.get("position", 0))
+    is_short = position.get("sign", 1) < 0 or size < 0
+    return abs(size), "short" if is_short else "long"
@@ -0,0 +1,237 @@
+"""Per-account contexts (client, nonces, keys, stream) and the LRU pool holding them."""
+
+import asyncio
+import threading
+import weakref
+import logging
+from collections import OrderedDict
+from typing import Any, Tuple, Optional, List
+
+from flask import g, has_app_context
+
+from .account_state import AccountStateFeed
+from .auth_tokens import AUTH_TOKEN_RENEW_MARGIN_S, AUTH_TOKEN_TTL_S, AuthTokenCache
+from .config import (
+    BASE_URL,
+    CLIENT_POOL_SIZE,
+    KEY_SCHEDULING,
+    LIGHTER_ACCOUNT_INDEX,
+    NONCE_SEQUENCER_SOCKET,
+    api_private_keys,
+)
+from .http_pool import get_api_client, use_shared_session
+from .metrics import timed_call
+from .nonces import KeyScheduler, NonceSequencer, RemoteNonceSequencer
+from .streams import WS_URL
+from .submission import SubmissionQueue
+
+logger = logging.getLogger(__name__)
+
+
+class AccountContext:
+    """
+    Everything that is per account: the SignerClient, nonce sequencer, key
+    scheduler and account stream. The HTTP pool, market registry and order
+    books are shared by all accounts.
+    """
+
+    def __init__(self, account_index: int, sequencer=None):
+        self.account_index = account_index
+        self.keys = api_private_keys(account_index)
+        self.primary_key = next(iter(self.keys))
+        self.client = None
+        self._building = None
+        if sequencer is None:
+            sequencer = (
+                RemoteNonceSequencer(NONCE_SEQUENCER_SOCKET, account_index)
+                if NONCE_SEQUENCER_SOCKET
+                else NonceSequencer(account_index)
+            )
+        self.sequencer = sequencer
+        self.scheduler = KeyScheduler(list(self.keys), KEY_SCHEDULING)
+        self.submitter = SubmissionQueue(self)
+        self.state = AccountStateFeed(WS_URL, account_index, self.auth_token)
+
+    async def get_client(self):
+        """
+        Get the account's SignerClient, initializing if necessary. Building
+        it and check_client() block, so they run in the default executor;
+        concurrent first callers share one build.
+        """
+        if self.client is None:
+            building = self._building
+            if building is None:
+                loop = asyncio.get_running_loop()
+                building = loop.run_in_executor(None, self._build_client)
+                self._building = building
+            try:
+                client = await asyncio.shield(building)
+            finally:
+                if self._building is building and building.done():
+                    self._building = None
+            if self.client is None:
+                self.client = self._wire_client(client)
+                logger.info(
+                    f"Lighter SignerClient initialized for account {self.account_index}"
+                )
+        return self.client
+
+    def _build_client(self):
+        """Create and verify the SignerClient (blocking; runs off the loop)."""
+        try:
+            import lighter
+            from lighter import nonce_manager
+        except ImportError:
+            raise Exception("lighter not installed. Run: pip install zklighter")
+
+        async def construct():
+            client = lighter.SignerClient(
+                url=BASE_URL,
+                api_private_keys=self.keys,
+                account_index=self.account_index,
+                # Nonces are passed explicitly by NonceSequencer; the SDK
+                # manager is never asked for one
+                nonce_management_type=nonce_manager.NonceManagerType.OPTIMISTIC,
+            )
+            # The SDK opens its own session on this throwaway loop; the
+            # client sends through the shared pool instead
+            await client.api_client.close()
+            return client
+
+        client = asyncio.run(construct())
+        err = client.check_client()
+        if err:
+            raise Exception(f"Client verification error: {err}")
+        return client
+
+    def _wire_client(self, client):
+        """Point a new SignerClient at the shared pool (on the loop)."""
+        import lighter
+
+        # Send transactions through the shared pool instead of the
+        # SignerClient's own ApiClient
+        api_client = get_api_client()
+        own_api_client = client.api_client
+        client.api_client = api_client
+        client.tx_api = lighter.TransactionApi(api_client)
+        client.order_api = lighter.OrderApi(api_client)
+        client.nonce_manager.api_client = api_client
+        use_shared_session(own_api_client)
+        # Time signing and sending separately inside create_order & co
+        for name in dir(client):
+            if name.startswith("sign_") and callable(getattr(client, name)):
+                setattr(client, name, timed_call("sign", getattr(client, name)))
+        client.send_tx = timed_call("send", client.send_tx)
+        return client
+
+    async def auth_token(self, ttl: int = AUTH_TOKEN_TTL_S) -> Tuple[str, float, Any]:
+        """A cached auth token of the primary key. Returns (token, expires_at, error)."""
+        return auth_token_cache.get(await self.get_client(), self.primary_key, ttl)
+
+    @property
+    def idle(self) -> bool:
+        """No transaction of the account is being signed, queued or sent."""
+        return not any(self.scheduler.in_flight.values())
+
+    def reset(self):
+        self.client = None
+        self.sequencer.invalidate()
+
+    def close(self):
+        self.state.stop()
+        self.submitter.stop()
+
+
+class ClientPool:
+    """
+    Per-account contexts, created on first use and evicted least recently used.
+
+    Evicting an account drops its client and local nonces; they are
+    rebuilt (and resynced) if the account is used again. Only idle
+    accounts are evicted: while every pooled account has transactions in
+    flight the pool grows past max_size. A new context of an account
+    shares the sequencer of any older one still referenced (say, evicted
+    while a request was about to use it), so two sequencers never drive
+    the same key.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._accounts: "OrderedDict[int, AccountContext]" = OrderedDict()
+        self._sequencers: "weakref.WeakValueDictionary[int, Any]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, account_index: int) -> AccountContext:
+        with self._lock:
+            account = self._accounts.get(account_index)
+            if account is not None:
+                self._accounts.move_to_end(account_index)
+                self.hits += 1
+                return account
+            self.misses += 1
+            account = AccountContext(account_index, self._sequencers.get(account_index))
+            self._accounts[account_index] = account
+            self._sequencers[account_index] = account.sequencer
+            self._evict()
+            return account
+
+    def _evict(self):
+        excess = len(self._accounts) - self.max_size
+        idle = [a for a in list(self._accounts.values())[:-1] if a.idle]
+        for evicted in idle[: max(excess, 0)]:
+            del self._accounts[evicted.account_index]
+            evicted.close()
+            self.evictions += 1
+            logger.info(f"Evicted account {evicted.account_index} from client pool")
+
+    def accounts(self) -> List[AccountContext]:
+        return list(self._accounts.values())
+
+    def peek(self, account_index: int) -> Optional[AccountContext]:
+        """The account's context if pooled, without touching LRU order."""
+        return self._accounts.get(account_index)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._accounts),
+            "max_size": self.max_size,
+            "accounts": list(self._accounts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+client_pool = ClientPool(CLIENT_POOL_SIZE)
+auth_token_cache = AuthTokenCache(AUTH_TOKEN_RENEW_MARGIN_S, client_pool.peek)
+
+
+def current_account_index() -> int:
+    """The account_index a request targets, or the default."""
+    account_index = g.get("account_index") if has_app_context() else None
+    if account_index is None:
+        account_index = LIGHTER_ACCOUNT_INDEX
+    return account_index
+
+
+def current_account() -> AccountContext:
+    """The context of the account a request targets, created if needed."""
+    return client_pool.get(current_account_index())
+
+
+async def get_client():
+    """Get the Lighter SignerClient of the request's account."""
+    return await current_account().get_client()
+
+
+async def create_auth_token():
+    """Get a valid auth token of the request's account (cached)."""
+    token, _, err = await current_account().auth_token()
+    if err:
+        raise Exception(f"Failed to create auth token: {err}")
+    return token
@@ -0,0 +1,115 @@
+"""Cache of signed auth tokens, renewed in the background while in use."""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Any, Tuple, Optional, Dict
+
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+AUTH_TOKEN_TTL_S = int(os.getenv("AUTH_TOKEN_TTL_S", "600"))
+AUTH_TOKEN_RENEW_MARGIN_S = int(os.getenv("AUTH_TOKEN_RENEW_MARGIN_S", "120"))
+
+
+class AuthTokenCache:
+    """
+    Signed auth tokens, keyed by account, API key index and expiry bucket.
+
+    A token is reused while it has more than the renew margin left. A
+    background task re-signs tokens that are in use before they get there,
+    so read paths (/api/orders, cancel-all) normally never sign at all.
+    Tokens not used for a whole TTL are dropped instead of renewed.
+    """
+
+    def __init__(self, renew_margin: int, accounts: Callable[[int], Any]):
+        self.renew_margin = renew_margin
+        # account_index -> pooled AccountContext, None once evicted
+        self.accounts = accounts
+        # (account_index, api_key_index, ttl) -> [token, expires_at, last_used]
+        self._tokens: Dict[Tuple[int, int, int], list] = {}
+        self._renew_task = None
+        self.hits = 0
+        self.misses = 0
+        self.renewals = 0
+
+    @staticmethod
+    def bucket(ttl: int) -> int:
+        """Round a requested lifetime up to the minute so callers share tokens."""
+        return max(60, -(-ttl // 60) * 60)
+
+    def _margin(self, ttl: int) -> float:
+        return min(self.renew_margin, ttl / 2)
+
+    def _sign(self, client, api_key_index: int, ttl: int) -> Optional[str]:
+        token, err = client.create_auth_token_with_expiry(
+            deadline=ttl, api_key_index=api_key_index
+        )
+        if err:
+            return err
+        key = (client.account_index, api_key_index, ttl)
+        entry = self._tokens.get(key)
+        last_used = entry[2] if entry else time.time()
+        self._tokens[key] = [token, time.time() + ttl, last_used]
+        return None
+
+    def get(self, client, api_key_index: int, ttl: int) -> Tuple[str, float, Any]:
+        """Get a valid token. Returns (token, expires_at, error)."""
+        with timed("auth_token"):
+            return self._get(client, api_key_index, ttl)
+
+    def _get(self, client, api_key_index: int, ttl: int) -> Tuple[str, float, Any]:
+        ttl = self.bucket(ttl)
+        key = (client.account_index, api_key_index, ttl)
+        now = time.time()
+        entry = self._tokens.get(key)
+        if entry and entry[1] - now > self._margin(ttl):
+            self.hits += 1
+            entry[2] = now
+        else:
+            self.misses += 1
+            err = self._sign(client, api_key_index, ttl)
+            if err:
+                return None, 0, err
+            entry = self._tokens[key]
+            entry[2] = now
+        self._start_renewer()
+        return entry[0], entry[1], None
+
+    def _start_renewer(self):
+        loop = asyncio.get_running_loop()
+        task = self._renew_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._renew_task = loop.create_task(self._renew_forever())
+
+    async def _renew_forever(self):
+        while True:
+            await asyncio.sleep(max(1, self.renew_margin / 4))
+            now = time.time()
+            for key, entry in list(self._tokens.items()):
+                account_index, api_key_index, ttl = key
+                account = self.accounts(account_index)
+                if now - entry[2] > ttl or account is None:
+                    del self._tokens[key]
+                    continue
+                if entry[1] - now > 2 * self._margin(ttl):
+                    continue
+                try:
+                    err = self._sign(await account.get_client(), api_key_index, ttl)
+                    if err:
+                        logger.warning(f"Auth token renewal failed: {err}")
+                    else:
+                        self.renewals += 1
+                except Exception as e:
+                    logger.warning(f"Auth token renewal failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "tokens": len(self._tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "renewals": self.renewals,
+        }
@@ -0,0 +1,56 @@
+"""Account, key and environment configuration read from the environment."""
+
+import os
+from typing import Optional, Dict
+
+LIGHTER_API_KEY = os.getenv("LIGHTER_API_KEY", "")
+LIGHTER_ACCOUNT_INDEX = int(os.getenv("LIGHTER_ACCOUNT_INDEX", "0"))
+LIGHTER_API_KEY_INDEX = int(os.getenv("LIGHTER_API_KEY_INDEX", "3"))
+# Extra keys of the same account to shard transactions over: "4:0xkey,5:0xkey"
+LIGHTER_EXTRA_API_KEYS = {
+    int(index): key
+    for index, key in (
+        pair.strip().split(":", 1)
+        for pair in os.getenv("LIGHTER_EXTRA_API_KEYS", "").split(",")
+        if pair.strip()
+    )
+}
+KEY_SCHEDULING = os.getenv("KEY_SCHEDULING", "least-loaded")
+# Accounts a request may select with account_index (empty: any)
+LIGHTER_ACCOUNT_INDEXES = {
+    int(a) for a in os.getenv("LIGHTER_ACCOUNT_INDEXES", "").split(",") if a.strip()
+}
+# Keys for accounts that do not use the default ones:
+# "account_index:api_key_index:private_key,..."
+LIGHTER_SUBACCOUNT_KEYS: Dict[int, Dict[int, str]] = {}
+for _entry in os.getenv("LIGHTER_SUBACCOUNT_KEYS", "").split(","):
+    if _entry.strip():
+        _account, _key_index, _key = _entry.strip().split(":", 2)
+        LIGHTER_SUBACCOUNT_KEYS.setdefault(int(_account), {})[int(_key_index)] = _key
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "16"))
+LIGHTER_ENVIRONMENT = os.getenv("LIGHTER_ENVIRONMENT", "mainnet")
+FLASK_PORT = int(os.getenv("FLASK_PORT", "3001"))
+API_SECRET = os.getenv("API_SECRET", "")
+
+BASE_URL = os.getenv("LIGHTER_BASE_URL", "").rstrip("/") or (
+    "https://mainnet.zklighter.elliot.ai"
+    if LIGHTER_ENVIRONMENT == "mainnet"
+    else "https://testnet.zklighter.elliot.ai"
+)
+
+# Optional shared sequencer process (python app.py sequencer), so several
+# workers can use the same API key without racing for nonces
+NONCE_SEQUENCER_SOCKET = os.getenv("NONCE_SEQUENCER_SOCKET", "")
+NONCE_LEASE_TIMEOUT_S = float(os.getenv("NONCE_LEASE_TIMEOUT_S", "30"))
+
+
+def api_private_keys(account_index: Optional[int] = None) -> Dict[int, str]:
+    """
+    Signing keys of an account, primary key first.
+
+    Accounts listed in LIGHTER_SUBACCOUNT_KEYS use their own keys; every
+    other account uses LIGHTER_API_KEY plus LIGHTER_EXTRA_API_KEYS.
+    """
+    if account_index in LIGHTER_SUBACCOUNT_KEYS:
+        return dict(LIGHTER_SUBACCOUNT_KEYS[account_index])
+    return {LIGHTER_API_KEY_INDEX: LIGHTER_API_KEY, **LIGHTER_EXTRA_API_KEYS}
@@ -0,0 +1,104 @@
+"""JSON encoding, field projection and compression of responses."""
+
+import os
+import gzip
+from typing import Any, Optional
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from .metrics import timed
+from .web import app
+
+COMPRESSION = os.getenv("COMPRESSION", "true").lower() == "true"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "5"))
+
+try:
+    import orjson
+except ImportError:  # Optional: pip install orjson
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() and request bodies through orjson when it is installed."""
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        # jsonify() only passes layout options: compact separators or indent
+        if orjson is None or set(kwargs) - {"separators", "indent"}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+app.json = FastJSONProvider(app)
+
+
+def parse_fields(raw: Optional[str]) -> Optional[dict]:
+    """`fields=a,b.c` as a tree {"a": {}, "b": {"c": {}}}; None keeps everything."""
+    if not raw:
+        return None
+    tree: dict = {}
+    for path in raw.split(","):
+        node = tree
+        for part in path.strip().split("."):
+            if part:
+                node = node.setdefault(part, {})
+    return tree or None
+
+
+def project(value: Any, tree: Optional[dict]) -> Any:
+    """Keep only the fields in `tree`; lists are projected item by item."""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {k: project(value[k], sub) for k, sub in tree.items() if k in value}
+    return value
+
+
+def requested_fields() -> Optional[dict]:
+    return parse_fields(request.args.get("fields"))
+
+
+@app.after_request
+def compress_response(response):
+    """gzip or br a JSON response when the client accepts it and it is big enough."""
+    if (
+        not COMPRESSION
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.mimetype != "application/json"
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(
+        ["br", "gzip"] if brotli else ["gzip"]
+    )
+    if encoding is None or (response.content_length or 0) < COMPRESS_MIN_BYTES:
+        return response
+    with timed("compress"):
+        data = response.get_data()
+        if encoding == "br":
+            data = brotli.compress(data, quality=COMPRESS_LEVEL)
+        else:
+            data = gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
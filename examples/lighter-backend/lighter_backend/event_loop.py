@@ -0,0 +1,50 @@
+"""The persistent per-worker asyncio loop that async routes run on."""
+
+import os
+import asyncio
+import threading
+from typing import Any, Coroutine
+
+# One long-lived loop per worker process, running in a daemon thread.
+# SDK clients, HTTP sessions and background tasks are bound to this loop,
+# so they survive between requests instead of dying with asyncio.run().
+_loop = None
+_loop_thread = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the worker event loop, starting it if necessary.
+
+    The loop is (re)started lazily and keyed by pid, so a worker forked
+    from a preloaded master gets its own loop instead of a dead thread.
+    """
+    global _loop, _loop_thread, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or not _loop_thread.is_alive():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_run_loop, args=(loop,), name="lighter-loop", daemon=True
+            )
+            thread.start()
+            _loop, _loop_thread, _loop_pid = loop, thread, os.getpid()
+    return _loop
+
+
+def run_async(coro: Coroutine) -> Any:
+    """
+    Run a coroutine on the worker event loop and wait for its result.
+
+    Must be called from a request thread, never from the loop itself.
+    The caller's context (Flask request/app context) is copied into the
+    task, so route coroutines can keep using `request` and `jsonify`.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    return future.result()
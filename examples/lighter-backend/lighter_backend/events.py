@@ -0,0 +1,191 @@
+"""Fan-out of account events to /api/stream consumers."""
+
+import os
+import json
+import queue
+import secrets
+import threading
+from collections import deque
+from typing import Tuple, Optional
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1000"))
+SSE_REPLAY_SIZE = int(os.getenv("SSE_REPLAY_SIZE", "1000"))
+SSE_MAX_CONSUMERS = int(os.getenv("SSE_MAX_CONSUMERS", "32"))
+SSE_KEEPALIVE_S = float(os.getenv("SSE_KEEPALIVE_S", "15"))
+# Share of a worker's request threads that streams may hold
+SSE_THREAD_SHARE = 0.25
+
+EVENT_TYPES = ("fill", "order", "position")
+
+
+class EventConsumer:
+    """
+    One downstream subscriber with a bounded queue.
+
+    The publisher never blocks on a slow consumer: when the queue is full
+    the oldest event is dropped and counted, and the consumer is told how
+    many it missed so it can resync over REST.
+    """
+
+    __slots__ = ("queue", "types", "market_index", "dropped", "resync")
+
+    def __init__(self, size: int, types: Tuple[str, ...], market_index: Optional[int]):
+        self.queue: "queue.Queue[tuple]" = queue.Queue(maxsize=size)
+        self.types = types
+        self.market_index = market_index
+        self.dropped = 0
+        self.resync = False
+
+    def wants(self, event: tuple) -> bool:
+        _, event_type, market_index, _ = event
+        return event_type in self.types and (
+            self.market_index is None or self.market_index == market_index
+        )
+
+    def offer(self, event: tuple):
+        if not self.wants(event):
+            return
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[tuple]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class StreamSlots:
+    """
+    Worker-wide cap on open /api/stream responses.
+
+    A stream holds a request thread for as long as it is open, so under
+    gunicorn the cap is derived from the worker's thread count and kept
+    well below it (SSE_THREAD_SHARE): order routes and health checks need
+    the other threads. SSE_MAX_CONSUMERS is the cap when the thread count
+    is unknown, and an upper bound otherwise.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.threads: Optional[int] = None
+        self.active = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def configure(self, threads: int):
+        """Size the cap for a worker serving requests on `threads` threads."""
+        self.threads = threads
+        self.limit = min(SSE_MAX_CONSUMERS, int(threads * SSE_THREAD_SHARE))
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.active >= self.limit:
+                self.refused += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "limit": self.limit,
+                "threads": self.threads,
+                "refused": self.refused,
+            }
+
+
+stream_slots = StreamSlots(SSE_MAX_CONSUMERS)
+
+
+class EventHub:
+    """
+    Fans account events out from one upstream subscription to many consumers.
+
+    Each event is serialized once, numbered, and kept in a replay buffer so
+    a consumer reconnecting with Last-Event-ID gets what it missed. Event
+    ids are "<epoch>-<seq>": the epoch is random per hub, so an id issued
+    by another worker (or before a restart) is recognized as foreign and
+    the consumer is told to resync instead of being replayed the wrong
+    events.
+    """
+
+    def __init__(self, queue_size: int, replay_size: int):
+        self.queue_size = queue_size
+        self.epoch = secrets.token_hex(4)
+        self.published = 0
+        self._seq = 0
+        self._replay: deque = deque(maxlen=replay_size)
+        self._consumers: set = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, market_index: Optional[int], data: dict):
+        payload = json.dumps({"type": event_type, "market_index": market_index, **data})
+        with self._lock:
+            self._seq += 1
+            self.published += 1
+            event = (self._seq, event_type, market_index, payload)
+            self._replay.append(event)
+            consumers = list(self._consumers)
+        for consumer in consumers:
+            consumer.offer(event)
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def subscribe(
+        self,
+        types: Tuple[str, ...],
+        market_index: Optional[int],
+        last_event_id: Optional[str] = None,
+    ) -> EventConsumer:
+        """
+        A new consumer. With a Last-Event-ID of this hub it is replayed what
+        it missed; with any other one it is flagged for a full resync.
+        """
+        consumer = EventConsumer(self.queue_size, types, market_index)
+        if last_event_id is not None:
+            epoch, _, seq = last_event_id.rpartition("-")
+            if epoch == self.epoch and seq.isdigit():
+                last_event_id = int(seq)
+            else:
+                consumer.resync = True
+                last_event_id = None
+        with self._lock:
+            if last_event_id is not None:
+                missed = [event for event in self._replay if event[0] > last_event_id]
+                if self._replay and self._replay[0][0] > last_event_id + 1:
+                    # Older events already left the replay buffer
+                    consumer.dropped += self._replay[0][0] - last_event_id - 1
+                for event in missed:
+                    consumer.offer(event)
+            self._consumers.add(consumer)
+        return consumer
+
+    def unsubscribe(self, consumer: EventConsumer):
+        with self._lock:
+            self._consumers.discard(consumer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            consumers = list(self._consumers)
+        return {
+            "consumers": len(consumers),
+            "published": self.published,
+            "last_event_id": self.event_id(self._seq),
+            "queued": sum(c.queue.qsize() for c in consumers),
+            "dropped": sum(c.dropped for c in consumers),
+        }
@@ -0,0 +1,138 @@
+"""Sending a request's transactions with nonce handling and retries."""
+
+import asyncio
+import logging
+from typing import Callable, Any, Tuple, List
+
+from .accounts import current_account
+from .metrics import NONCE_RETRIES
+from .retry import NONCE_RETRY_ATTEMPTS, RetryPolicy, classify_error, retry_policy
+from .submission import SUBMIT_QUEUE, operation_leg
+from .transactions import TX_BATCH_MAX_SIZE, TxLeg, sign_and_send
+
+logger = logging.getLogger(__name__)
+
+
+def reset_client():
+    """Reset the request's account client to force re-initialization with fresh nonce."""
+    account = current_account()
+    account.reset()
+    logger.info(
+        f"Client reset for account {account.account_index} - will re-initialize on next request"
+    )
+
+
+async def execute_with_nonce_retry(
+    operation: Callable, *args, **kwargs
+) -> Tuple[Any, Any, Any]:
+    """
+    Execute a trading operation with a locally sequenced nonce.
+
+    Runs on the request's account; the API key is chosen by its key
+    scheduler and kept for all attempts.
+    On a nonce error the sequencer resyncs from the server; whether and
+    when the operation is retried is up to `retry_policy`.
+
+    Args:
+        operation: Async function to execute (e.g., client.create_order)
+        *args, **kwargs: Arguments to pass to the operation
+
+    Returns:
+        Tuple of (tx, response, error) from the operation
+
+    With SUBMIT_QUEUE the transaction goes through the key's submission
+    queue instead (see SubmissionQueue); `tx` is then None.
+    """
+    account = current_account()
+    nonce_sequencer = account.sequencer
+
+    leg = operation_leg(operation, kwargs) if SUBMIT_QUEUE else None
+    if leg is not None:
+        import lighter
+
+        with account.scheduler.use(kwargs.get("market_index")) as api_key_index:
+            (result,) = await account.submitter.submit(
+                operation.__self__, api_key_index, [leg]
+            )
+        if result["error"]:
+            return None, None, result["error"]
+        response = lighter.RespSendTx.model_construct(
+            code=200, tx_hash=result["tx_hash"]
+        )
+        return None, response, None
+
+    blocked = retry_policy.admit()
+    if blocked:
+        return None, None, blocked
+
+    delay = 0.0
+    with account.scheduler.use(kwargs.get("market_index")) as api_key_index:
+        for attempt in range(NONCE_RETRY_ATTEMPTS):
+            if delay:
+                await asyncio.sleep(delay)
+
+            async with nonce_sequencer.reserve(api_key_index) as nonce:
+                try:
+                    tx, response, err = await operation(
+                        *args, nonce=nonce, api_key_index=api_key_index, **kwargs
+                    )
+                except Exception as e:
+                    if classify_error(e) not in RetryPolicy.RETRYABLE:
+                        retry_policy.record(e)
+                        # The exchange may or may not have seen this nonce
+                        nonce_sequencer.invalidate(api_key_index)
+                        raise
+                    err = e
+
+                error_class = retry_policy.record(err)
+                if error_class is None:
+                    return tx, response, err
+                if error_class == "nonce":
+                    nonce_sequencer.report_gap(api_key_index)
+                else:
+                    # Rejected transactions do not consume their nonce
+                    nonce_sequencer.release(api_key_index, nonce)
+
+                delay = retry_policy.delay(error_class, attempt, NONCE_RETRY_ATTEMPTS)
+                if delay is None:
+                    if error_class == "nonce":
+                        err = f"Nonce error after {attempt + 1} attempts: {err}"
+                    return None, None, err
+                if error_class == "nonce":
+                    NONCE_RETRIES.inc(kind="single")
+                logger.warning(
+                    f"{error_class} error on attempt {attempt + 1}/{NONCE_RETRY_ATTEMPTS}, "
+                    f"retrying in {delay * 1000:.0f} ms: {err}"
+                )
+
+
+async def _send_batch_chunk(client, legs: List[TxLeg]) -> List[dict]:
+    """Sign and submit up to TX_BATCH_MAX_SIZE legs on one API key."""
+    account = current_account()
+    market_index = legs[0].params.get("market_index")
+
+    with account.scheduler.use(market_index) as api_key_index:
+        if SUBMIT_QUEUE:
+            return await account.submitter.submit(client, api_key_index, legs)
+        return await sign_and_send(client, account, api_key_index, legs)
+
+
+async def send_tx_batch(client, legs: List[TxLeg]) -> List[dict]:
+    """
+    Sign legs locally with consecutive nonces and submit them in batches.
+
+    Legs within a sendTxBatch call (TX_BATCH_MAX_SIZE) share one API key
+    and keep their order; with several keys, chunks go out in parallel.
+    Returns one {"tx_hash", "error"} dict per leg, in the same order.
+    """
+    chunks = [
+        legs[start : start + TX_BATCH_MAX_SIZE]
+        for start in range(0, len(legs), TX_BATCH_MAX_SIZE)
+    ]
+    if len(current_account().scheduler.keys) > 1:
+        chunk_results = await asyncio.gather(
+            *(_send_batch_chunk(client, chunk) for chunk in chunks)
+        )
+    else:
+        chunk_results = [await _send_batch_chunk(client, chunk) for chunk in chunks]
+    return [result for chunk in chunk_results for result in chunk]
@@ -0,0 +1,111 @@
+"""Shared keep-alive HTTP pool and the Lighter REST API clients on top of it."""
+
+import os
+import ssl
+import asyncio
+import logging
+
+from .config import BASE_URL
+from .metrics import HTTP_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+# Shared HTTP connection pool
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+
+# Shared Lighter REST clients (initialized on demand)
+_api_client = None
+_order_api = None
+_account_api = None
+_http_session = None
+_http_session_loop = None
+
+
+def get_http_session():
+    """
+    Get the shared aiohttp session, creating it if necessary.
+
+    Every REST call to Lighter (SDK read APIs, SignerClient sends and our
+    own raw requests) goes through this keep-alive pool, so connections
+    and their TLS handshakes are reused across requests. Must be called
+    from the worker event loop.
+    """
+    global _http_session, _http_session_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_session_loop is not loop:
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            # One context for every connection, so CA certs are loaded once
+            ssl=ssl.create_default_context(),
+        )
+        # Count new vs reused connections for the pool hit ratio
+        trace = aiohttp.TraceConfig()
+
+        async def on_create(session, ctx, params):
+            HTTP_CONNECTIONS.inc(outcome="new")
+
+        async def on_reuse(session, ctx, params):
+            HTTP_CONNECTIONS.inc(outcome="reused")
+
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        _http_session = aiohttp.ClientSession(
+            connector=connector, trust_env=True, trace_configs=[trace]
+        )
+        _http_session_loop = loop
+        logger.info(f"HTTP pool created (size={HTTP_POOL_SIZE})")
+    return _http_session
+
+
+def use_shared_session(api_client):
+    """Point an SDK ApiClient at the shared session, closing its own."""
+    session = get_http_session()
+    rest_client = api_client.rest_client
+    own_session = getattr(rest_client, "pool_manager", None)
+    if own_session is session:
+        return
+    rest_client.pool_manager = session
+    if own_session is not None and not own_session.closed:
+        asyncio.get_running_loop().create_task(own_session.close())
+
+
+def get_api_client():
+    """Get the shared Lighter ApiClient used by all REST paths."""
+    global _api_client
+    if _api_client is None:
+        import lighter
+
+        _api_client = lighter.ApiClient(
+            configuration=lighter.Configuration(host=BASE_URL)
+        )
+    use_shared_session(_api_client)
+    return _api_client
+
+
+def get_order_api():
+    """Get Lighter OrderApi for read operations."""
+    global _order_api
+    api_client = get_api_client()
+    if _order_api is None:
+        import lighter
+
+        _order_api = lighter.OrderApi(api_client)
+    return _order_api
+
+
+def get_account_api():
+    """Get Lighter AccountApi for read operations."""
+    global _account_api
+    api_client = get_api_client()
+    if _account_api is None:
+        import lighter
+
+        _account_api = lighter.AccountApi(api_client)
+    return _account_api
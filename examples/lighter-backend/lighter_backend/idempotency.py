@@ -0,0 +1,329 @@
+"""Idempotency keys and client order ids of write endpoints."""
+
+import os
+import hashlib
+import json
+import time
+import sqlite3
+import threading
+import uuid
+from functools import wraps
+from typing import Tuple, Optional, List
+
+from flask import request, jsonify, g
+
+from .jobs import in_job
+from .shared_state import SharedStore, shared_store
+from .web import app
+
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", "600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "30"))
+IDEMPOTENCY_LEASE_S = float(os.getenv("IDEMPOTENCY_LEASE_S", "120"))
+
+# Largest client_order_index the signer accepts (48 bits)
+MAX_CLIENT_ORDER_INDEX = 2**48 - 1
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ClientOrderIds:
+    """
+    Collision-free, increasing client order ids for orders sent without one.
+
+    An id is the current time in ms times `slots` plus a slot of its own,
+    so ids from different workers differ in the low digits. Slots are
+    handed out through the shared store, one per worker of the host (a
+    dead worker's slot goes to the next one to ask). Ids within a process
+    step by `slots`, staying unique even inside one millisecond.
+    """
+
+    def __init__(self, store: SharedStore, slots: int = 100):
+        self.store = store
+        store.define("""
+            CREATE TABLE IF NOT EXISTS order_id_slots (
+                slot INTEGER PRIMARY KEY,
+                pid INTEGER NOT NULL
+            );
+            """)
+        self.slots = slots
+        self.slot: Optional[int] = None
+        self._pid = None
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def _claim_slot(self) -> int:
+        pid = os.getpid()
+        with self.store.transaction() as conn:
+            rows = conn.execute("SELECT slot, pid FROM order_id_slots").fetchall()
+            dead = [(row["slot"],) for row in rows if not _alive(row["pid"])]
+            conn.executemany("DELETE FROM order_id_slots WHERE slot = ?", dead)
+            taken = {row["slot"] for row in rows} - {slot for slot, in dead}
+            free = [slot for slot in range(self.slots) if slot not in taken]
+            if not free:
+                raise RuntimeError(f"All {self.slots} client order id slots are taken")
+            conn.execute(
+                "INSERT INTO order_id_slots (slot, pid) VALUES (?, ?)", (free[0], pid)
+            )
+        return free[0]
+
+    def take(self, count: int = 1) -> List[int]:
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use in this process (or a forked child)
+                self.slot, self._pid, self._last = self._claim_slot(), os.getpid(), 0
+            first = int(time.time() * 1000) * self.slots + self.slot
+            first = max(first, self._last + self.slots)
+            ids = [first + i * self.slots for i in range(count)]
+            self._last = ids[-1]
+        if ids[-1] > MAX_CLIENT_ORDER_INDEX:
+            raise ValueError("client order id space exhausted")
+        return ids
+
+    def next(self) -> int:
+        return self.take(1)[0]
+
+
+client_order_ids = ClientOrderIds(shared_store)
+
+
+shared_store.define("""
+    CREATE TABLE IF NOT EXISTS idempotency (
+        key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        owner TEXT NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0,
+        body BLOB,
+        status INTEGER,
+        mimetype TEXT,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idempotency_expires_at ON idempotency (expires_at);
+    """)
+
+
+class IdempotentEntry:
+    """One idempotency key: in flight until `done`, then replayable."""
+
+    __slots__ = ("fingerprint", "owner", "done", "response", "expires_at")
+
+    def __init__(self, fingerprint: str, owner: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.owner = owner
+        self.done = False
+        self.response: Optional[Tuple[bytes, int, str]] = None
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "IdempotentEntry":
+        entry = cls(row["fingerprint"], row["owner"], row["expires_at"])
+        if row["done"]:
+            entry.done = True
+            entry.response = (row["body"], row["status"], row["mimetype"])
+        return entry
+
+
+class IdempotencyCache:
+    """
+    Map from an idempotency key to an in-flight or finished request, kept in
+    the shared store so a retry that lands on another worker finds it too.
+
+    The first request with a key claims it and runs; concurrent duplicates,
+    in any worker, wait for it and get its response. Successful responses
+    are replayed until they expire; failures release the key so a retry
+    runs again. A claim whose worker died mid-request lapses after `lease`
+    seconds. At most `max_keys` finished keys are kept.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, store: SharedStore, max_keys: int, ttl: float, lease: float):
+        self.store = store
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.lease = lease
+        self.hits = 0
+        self.misses = 0
+
+    def claim(self, key: str, fingerprint: str) -> Tuple[IdempotentEntry, bool]:
+        """Return (entry, owner); owner is True if the caller must run the request."""
+        now = time.time()
+        with self.store.transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row["expires_at"] > now:
+                self.hits += 1
+                return IdempotentEntry.from_row(row), False
+            entry = IdempotentEntry(fingerprint, uuid.uuid4().hex, now + self.lease)
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, fingerprint, owner, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, fingerprint, entry.owner, entry.expires_at),
+            )
+            self.misses += 1
+            if self.misses % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+            return entry, True
+
+    def wait(
+        self, key: str, entry: IdempotentEntry, timeout: float
+    ) -> Optional[IdempotentEntry]:
+        """
+        Wait for the owner of `entry` to finish. Returns the finished entry,
+        or an entry with no response if the owner released the key; None
+        on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        conn = self.store.connect()
+        while True:
+            row = conn.execute(
+                "SELECT * FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+            if (
+                row is None
+                or row["owner"] != entry.owner
+                or row["expires_at"] <= time.time()
+            ):
+                return IdempotentEntry(entry.fingerprint, entry.owner, 0.0)
+            if row["done"]:
+                return IdempotentEntry.from_row(row)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+
+    def complete(self, key: str, entry: IdempotentEntry, response):
+        with self.store.transaction() as conn:
+            conn.execute(
+                "UPDATE idempotency SET done = 1, body = ?, status = ?, mimetype = ?, "
+                "expires_at = ? WHERE key = ? AND owner = ?",
+                (
+                    response.get_data(),
+                    response.status_code,
+                    response.mimetype,
+                    time.time() + self.ttl,
+                    key,
+                    entry.owner,
+                ),
+            )
+
+    def release(self, key: str, entry: IdempotentEntry):
+        with self.store.transaction() as conn:
+            conn.execute(
+                "DELETE FROM idempotency WHERE key = ? AND owner = ?",
+                (key, entry.owner),
+            )
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+        conn.execute(
+            """
+            DELETE FROM idempotency WHERE key IN (
+                SELECT key FROM idempotency WHERE done = 1
+                ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_keys,),
+        )
+
+    def stats(self) -> dict:
+        (keys,) = (
+            self.store.connect().execute("SELECT COUNT(*) FROM idempotency").fetchone()
+        )
+        return {
+            "keys": keys,
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl_s": self.ttl,
+            "path": self.store.path,
+        }
+
+
+idempotency_cache = IdempotencyCache(
+    shared_store, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_S, IDEMPOTENCY_LEASE_S
+)
+
+# Routes where client_order_id names an existing order, not the request
+ORDER_TARGET_ENDPOINTS = {"cancel_order", "modify_order"}
+
+
+def idempotency_key() -> Optional[str]:
+    """Key from the Idempotency-Key header, else an explicit client_order_id."""
+    key = request.headers.get("Idempotency-Key")
+    if not key and request.endpoint not in ORDER_TARGET_ENDPOINTS:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and body.get("client_order_id"):
+            key = f"coid:{body['client_order_id']}"
+    if not key:
+        return None
+    return json.dumps([g.get("account_index"), request.path, key])
+
+
+def idempotent(f):
+    """
+    Decorator for transaction routes: a repeated request with the same key
+    gets the first request's response instead of signing and sending again.
+    """
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        key = idempotency_key()
+        if key is None or in_job():
+            # A job's replay already went through here when it was accepted
+            return f(*args, **kwargs)
+        # Not hash(): it is salted per process, and workers share the keys
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        while True:
+            entry, owner = idempotency_cache.claim(key, fingerprint)
+            if owner:
+                break
+            if entry.fingerprint != fingerprint:
+                return (
+                    jsonify(
+                        {
+                            "error": "Idempotency key was already used with a different request"
+                        }
+                    ),
+                    422,
+                )
+            entry = idempotency_cache.wait(key, entry, IDEMPOTENCY_WAIT_S)
+            if entry is None:
+                return (
+                    jsonify(
+                        {
+                            "error": "A request with this idempotency key is still in progress"
+                        }
+                    ),
+                    409,
+                )
+            if entry.response is not None:
+                body, status, mimetype = entry.response
+                response = app.response_class(body, status=status, mimetype=mimetype)
+                response.headers["Idempotent-Replayed"] = "true"
+                return response
+            # The first request failed and released the key: run this one
+
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except BaseException:
+            idempotency_cache.release(key, entry)
+            raise
+        if response.status_code < 400:
+            idempotency_cache.complete(key, entry, response)
+        else:
+            idempotency_cache.release(key, entry)
+        return response
+
+    return wrapper
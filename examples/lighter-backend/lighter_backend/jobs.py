@@ -0,0 +1,320 @@
+"""Async jobs: write requests run in the background and polled by id."""
+
+import os
+import json
+import time
+import sqlite3
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Callable, Optional
+
+import requests
+from flask import request, jsonify
+from werkzeug.test import EnvironBuilder
+
+from .metrics import Counter, metrics
+from .shared_state import SharedStore, shared_store
+from .web import app
+
+logger = logging.getLogger(__name__)
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "3600"))
+JOB_MAX_KEPT = int(os.getenv("JOB_MAX_KEPT", "1000"))
+JOB_CALLBACK_TIMEOUT_S = float(os.getenv("JOB_CALLBACK_TIMEOUT_S", "10"))
+
+JOBS = metrics.register(
+    Counter(
+        "lighter_jobs_total",
+        "Async jobs by route and final status",
+        ("route", "status"),
+    )
+)
+
+
+# WSGI environ key marking a request re-dispatched by a job
+JOB_ENVIRON_KEY = "lighter.job_id"
+
+shared_store.define("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        route TEXT NOT NULL,
+        status TEXT NOT NULL,
+        http_status INTEGER,
+        result TEXT,
+        callback_url TEXT,
+        callback_status TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+    """)
+
+
+class Job:
+    """One route call accepted with 202 and run on the job executor."""
+
+    __slots__ = (
+        "id",
+        "route",
+        "status",
+        "http_status",
+        "result",
+        "callback_url",
+        "callback_status",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+
+    def __init__(self, job_id: str, route: str, callback_url: Optional[str]):
+        self.id = job_id
+        self.route = route
+        self.status = "queued"
+        self.http_status = None
+        self.result = None
+        self.callback_url = callback_url
+        self.callback_status = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        job = cls(row["id"], row["route"], row["callback_url"])
+        for name in (
+            "status",
+            "http_status",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ):
+            setattr(job, name, row[name])
+        job.result = json.loads(row["result"]) if row["result"] else None
+        job.callback_status = (
+            json.loads(row["callback_status"]) if row["callback_status"] else None
+        )
+        return job
+
+    def to_row(self) -> tuple:
+        return (
+            self.id,
+            self.route,
+            self.status,
+            self.http_status,
+            json.dumps(self.result) if self.result is not None else None,
+            self.callback_url,
+            (
+                json.dumps(self.callback_status)
+                if self.callback_status is not None
+                else None
+            ),
+            self.created_at,
+            self.started_at,
+            self.finished_at,
+        )
+
+    def to_dict(self) -> dict:
+        def ms(t: Optional[float]) -> Optional[int]:
+            return int(t * 1000) if t else None
+
+        return {
+            "job_id": self.id,
+            "route": self.route,
+            "status": self.status,
+            "http_status": self.http_status,
+            "result": self.result,
+            "callback_url": self.callback_url,
+            "callback_status": self.callback_status,
+            "created_at": ms(self.created_at),
+            "started_at": ms(self.started_at),
+            "finished_at": ms(self.finished_at),
+        }
+
+
+class JobManager:
+    """
+    Runs accepted requests on a small thread pool, off the request workers.
+
+    A job re-dispatches its original request (path, headers, body) through
+    the full Flask pipeline, so the before/after-request hooks (account,
+    metrics, Server-Timing) run as for any request, and stores the route's
+    JSON response. Jobs are recorded in the shared store: the job runs in
+    the worker that accepted it, but any worker answers GET /api/jobs/<id>.
+    Finished jobs are kept for `ttl` seconds, at most `max_kept`, and
+    pushed to the job's callback URL if one was given.
+    """
+
+    def __init__(self, store: SharedStore, workers: int, ttl: float, max_kept: int):
+        self.store = store
+        self.ttl = ttl
+        self.max_kept = max_kept
+        self._executor = None
+        self._workers = workers
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self._workers, thread_name_prefix="lighter-job"
+            )
+        return self._executor
+
+    def submit(self, callback_url: Optional[str]) -> Job:
+        """Queue a copy of the current request to be dispatched again."""
+        route = request.url_rule.rule if request.url_rule else request.path
+        job = Job(uuid.uuid4().hex, route, callback_url)
+        # The result is stored as JSON, so the replay must not be compressed
+        headers = [(k, v) for k, v in request.headers if k.lower() != "accept-encoding"]
+        environ = EnvironBuilder(
+            path=request.path,
+            method=request.method,
+            headers=headers,
+            data=request.get_data(),
+            query_string=request.query_string.decode(),
+        ).get_environ()
+        environ[JOB_ENVIRON_KEY] = job.id
+        with self.store.transaction() as conn:
+            self._prune(conn)
+            self._save(conn, job)
+        self._get_executor().submit(self._run, job, environ)
+        return job
+
+    def _save(self, conn: sqlite3.Connection, job: Job):
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            job.to_row(),
+        )
+
+    def _update(self, job: Job):
+        with self.store.transaction() as conn:
+            self._save(conn, job)
+
+    def _run(self, job: Job, environ: dict):
+        job.status = "running"
+        job.started_at = time.time()
+        self._update(job)
+        try:
+            with app.request_context(environ):
+                response = app.full_dispatch_request()
+            job.http_status = response.status_code
+            job.result = response.get_json(silent=True)
+            job.status = "succeeded" if response.status_code < 400 else "failed"
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.status = "failed"
+            job.result = {"success": False, "error": str(e)}
+        job.finished_at = time.time()
+        self._update(job)
+        JOBS.inc(route=job.route, status=job.status)
+        if job.callback_url:
+            self._notify(job)
+            self._update(job)
+
+    def _notify(self, job: Job):
+        try:
+            resp = requests.post(
+                job.callback_url, json=job.to_dict(), timeout=JOB_CALLBACK_TIMEOUT_S
+            )
+            job.callback_status = resp.status_code
+        except Exception as e:
+            logger.warning(f"Callback for job {job.id} failed: {e}")
+            job.callback_status = str(e)
+
+    def _prune(self, conn: sqlite3.Connection):
+        conn.execute(
+            "DELETE FROM jobs WHERE finished_at < ?", (time.time() - self.ttl,)
+        )
+        conn.execute(
+            """
+            DELETE FROM jobs WHERE id IN (
+                SELECT id FROM jobs WHERE finished_at IS NOT NULL
+                ORDER BY finished_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_kept,),
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = (
+            self.store.connect()
+            .execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return Job.from_row(row) if row is not None else None
+
+    def stats(self) -> dict:
+        kept, active = (
+            self.store.connect()
+            .execute(
+                "SELECT COUNT(*), COUNT(*) FILTER (WHERE status IN ('queued', 'running')) "
+                "FROM jobs"
+            )
+            .fetchone()
+        )
+        return {"workers": self._workers, "kept": kept, "active": active}
+
+
+job_manager = JobManager(shared_store, JOB_WORKERS, JOB_TTL_S, JOB_MAX_KEPT)
+
+
+def in_job() -> bool:
+    """True while a job re-dispatches its request."""
+    return JOB_ENVIRON_KEY in request.environ
+
+
+def wants_async() -> bool:
+    """Async mode: ?async=true, "async": true in the body, or Prefer: respond-async."""
+    if in_job():
+        return False
+    if request.args.get("async", "").lower() in ("1", "true"):
+        return True
+    if "respond-async" in request.headers.get("Prefer", ""):
+        return True
+    body = request.get_json(silent=True)
+    return isinstance(body, dict) and body.get("async") is True
+
+
+def async_job(validate: Optional[Callable[[dict], Optional[str]]] = None):
+    """
+    Decorator for slow multi-leg routes: in async mode the request is
+    validated with `validate(body)`, then answered with 202 and a job id
+    while the route runs on the job executor.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not wants_async():
+                return f(*args, **kwargs)
+            data = request.get_json(silent=True) or {}
+            if not isinstance(data, dict):
+                return jsonify({"error": "JSON body must be an object"}), 400
+            try:
+                error = validate(data) if validate else None
+            except (TypeError, ValueError) as e:
+                error = str(e)
+            if error:
+                return jsonify({"error": error}), 400
+            callback_url = data.get("callback_url")
+            if callback_url and not str(callback_url).startswith(
+                ("http://", "https://")
+            ):
+                return jsonify({"error": "callback_url must be an http(s) URL"}), 400
+
+            job = job_manager.submit(callback_url)
+            status_url = f"/api/jobs/{job.id}"
+            return (
+                jsonify(
+                    {"job_id": job.id, "status": job.status, "status_url": status_url}
+                ),
+                202,
+                {"Location": status_url},
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,207 @@
+"""Market metadata registry and price/size conversions."""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, List, NamedTuple
+
+from .config import BASE_URL
+from .http_pool import get_http_session
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+MARKET_PREFETCH = os.getenv("MARKET_PREFETCH", "true").lower() == "true"
+MARKET_REFRESH_INTERVAL_S = int(os.getenv("MARKET_REFRESH_INTERVAL_S", "300"))
+MARKET_MISS_TTL_S = int(os.getenv("MARKET_MISS_TTL_S", "60"))
+
+DEFAULT_SIZE_DECIMALS = 4
+DEFAULT_PRICE_DECIMALS = 2
+
+
+class MarketInfo(NamedTuple):
+    """Static trading metadata for one market."""
+
+    market_index: int
+    symbol: str
+    size_decimals: int
+    price_decimals: int
+    min_base_amount: float
+    min_quote_amount: float
+
+    @property
+    def tick_size(self) -> float:
+        return 10**-self.price_decimals
+
+    @property
+    def step_size(self) -> float:
+        return 10**-self.size_decimals
+
+    def to_dict(self) -> dict:
+        return {
+            **self._asdict(),
+            "tick_size": self.tick_size,
+            "step_size": self.step_size,
+        }
+
+
+class MarketRegistry:
+    """
+    In-memory market metadata.
+
+    Loaded when the worker boots and refreshed in the background every
+    `refresh_interval` seconds. Lookups of known markets never touch the
+    network; an unknown market_index triggers at most one reload per
+    `miss_ttl` seconds (negative cache) instead of one per request.
+    """
+
+    def __init__(self, refresh_interval: int, miss_ttl: int):
+        self.refresh_interval = refresh_interval
+        self.miss_ttl = miss_ttl
+        self._markets: Dict[int, MarketInfo] = {}
+        self._misses: Dict[int, float] = {}
+        self._loaded_at = 0.0
+        self._load_lock = None
+        self._refresh_task = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at > 0
+
+    async def load(self):
+        """Download /api/v1/orderBooks and replace the registry contents."""
+        session = get_http_session()
+        async with session.get(f"{BASE_URL}/api/v1/orderBooks") as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+
+        markets = {}
+        for ob in data.get("order_books", []):
+            mid = ob.get("market_id")
+            if mid is None:
+                continue
+            markets[mid] = MarketInfo(
+                market_index=mid,
+                symbol=ob.get("symbol", ""),
+                size_decimals=ob.get("supported_size_decimals", DEFAULT_SIZE_DECIMALS),
+                price_decimals=ob.get(
+                    "supported_price_decimals", DEFAULT_PRICE_DECIMALS
+                ),
+                min_base_amount=float(ob.get("min_base_amount") or 0),
+                min_quote_amount=float(ob.get("min_quote_amount") or 0),
+            )
+
+        self._markets = markets
+        # Misses still within miss_ttl keep holding off reloads, unless the
+        # new data resolves them
+        now = time.time()
+        self._misses = {
+            market_index: missed_at
+            for market_index, missed_at in self._misses.items()
+            if market_index not in markets and now - missed_at < self.miss_ttl
+        }
+        self._loaded_at = now
+        logger.info(f"Market registry loaded ({len(markets)} markets)")
+
+    async def _reload_once(self):
+        """Reload, coalescing concurrent callers into a single download."""
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        loaded_at = self._loaded_at
+        async with self._load_lock:
+            if self._loaded_at == loaded_at:
+                await self.load()
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self._reload_once()
+            except Exception as e:
+                logger.warning(f"Market registry refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def ensure_loaded(self):
+        """Load the registry now if it has never been loaded."""
+        self.start()
+        if not self.loaded:
+            await self._reload_once()
+
+    def start(self):
+        """Start the background refresh task on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._load_lock = None
+            self._refresh_task = loop.create_task(self._refresh_forever())
+
+    async def get(self, market_index: int) -> Optional[MarketInfo]:
+        """Get a market, loading the registry if it is empty or the index is new."""
+        market = self._markets.get(market_index)
+        if market is not None:
+            self.hits += 1
+            return market
+
+        self.misses += 1
+        self.start()
+        missed_at = self._misses.get(market_index)
+        if missed_at is not None and time.time() - missed_at < self.miss_ttl:
+            return None
+
+        await self._reload_once()
+        market = self._markets.get(market_index)
+        if market is None:
+            self._misses[market_index] = time.time()
+        return market
+
+    def all(self) -> List[MarketInfo]:
+        return sorted(self._markets.values(), key=lambda m: m.market_index)
+
+    def stats(self) -> dict:
+        return {
+            "markets": len(self._markets),
+            "loaded_at": int(self._loaded_at * 1000) if self.loaded else None,
+            "negative_cache": len(self._misses),
+            "refresh_interval_s": self.refresh_interval,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+market_registry = MarketRegistry(MARKET_REFRESH_INTERVAL_S, MARKET_MISS_TTL_S)
+
+
+async def get_market_decimals(market_index: int) -> tuple:
+    """Get size and price decimals for a market."""
+    with timed("decimals"):
+        market = await market_registry.get(market_index)
+    if market is None:
+        return DEFAULT_SIZE_DECIMALS, DEFAULT_PRICE_DECIMALS
+    return market.size_decimals, market.price_decimals
+
+
+async def check_order_size(
+    market_index: int, size: float, price: float = 0
+) -> Optional[str]:
+    """Validate an order against the market minimums. Returns an error or None."""
+    market = await market_registry.get(market_index)
+    if market is None:
+        return None
+    if size < market.min_base_amount:
+        return f"size must be >= {market.min_base_amount} for {market.symbol}"
+    if price > 0 and size * price < market.min_quote_amount:
+        return f"order value must be >= {market.min_quote_amount} for {market.symbol}"
+    return None
+
+
+def convert_size_to_base_amount(size: float, size_decimals: int) -> int:
+    """Convert human-readable size to base amount (integer)."""
+    return int(size * (10**size_decimals))
+
+
+def convert_price_to_int(price: float, price_decimals: int) -> int:
+    """Convert human-readable price to integer."""
+    return int(price * (10**price_decimals))
@@ -0,0 +1,357 @@
+"""Prometheus-style metrics and per-request stage timing."""
+
+import os
+import json
+import time
+import asyncio
+import bisect
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Tuple, Optional, Dict, List
+
+from flask import g, has_app_context
+
+from .config import FLASK_PORT
+
+logger = logging.getLogger(__name__)
+
+
+# Where gunicorn workers leave their samples for each other's /metrics
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(
+    tempfile.gettempdir(), f"lighter-backend-{FLASK_PORT}-metrics"
+)
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "1"))
+
+
+# Latency buckets (seconds), from sub-millisecond local work up to slow sends
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _add_label(labels: str, pair: str) -> str:
+    return "{" + pair + ("," + labels[1:] if labels else "}")
+
+
+class Counter:
+    """Monotonic counter with labels (Prometheus text exposition)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(
+            tuple(str(labels.get(n, "")) for n in self.labelnames), 0
+        )
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels (Prometheus text exposition)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            entry[i] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, key, f'le="{le}"'),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), entry[-1]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), cumulative
+
+
+class CallbackMetric:
+    """Metric read at scrape time from a callback returning {labels: value}."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...],
+        fn: Callable,
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} failed: {e}")
+            return
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics, rendered in the Prometheus text format.
+
+    Under gunicorn every sample carries a `worker` label (the pid), and
+    once `share` runs each worker dumps its samples to a directory every
+    `interval` seconds; /metrics, whichever worker serves it, renders its
+    own live samples plus the other workers' latest dumps. Every scrape
+    then sees every worker, and each series stays monotonic.
+    """
+
+    def __init__(self):
+        self._metrics: list = []
+        self.directory: Optional[str] = None
+        self.interval = 1.0
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def _samples(self) -> Dict[str, list]:
+        """This process's samples per metric."""
+        worker = f'worker="{os.getpid()}"'
+        return {
+            metric.name: [
+                (name, _add_label(labels, worker), value)
+                for name, labels, value in metric.samples()
+            ]
+            for metric in self._metrics
+        }
+
+    def share(self, directory: str, interval: float):
+        """Start dumping this worker's samples for the others (daemon thread)."""
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.interval = directory, interval
+        threading.Thread(target=self._dump_forever, daemon=True).start()
+
+    def _dump_forever(self):
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        while True:
+            try:
+                with open(path + ".tmp", "w") as f:
+                    json.dump(self._samples(), f)
+                os.replace(path + ".tmp", path)
+            except Exception as e:
+                logger.warning(f"Metrics dump failed: {e}")
+            time.sleep(self.interval)
+
+    def _other_workers(self) -> List[Dict[str, list]]:
+        own = f"{os.getpid()}.json"
+        # A dump this old is from a worker that died without child_exit
+        stale_before = time.time() - max(10 * self.interval, 10)
+        dumps = []
+        for name in os.listdir(self.directory):
+            if name == own or not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < stale_before:
+                    continue
+                with open(path) as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return dumps
+
+    def render(self) -> str:
+        samples = self._samples()
+        others = self._other_workers() if self.directory else []
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for dump in [samples] + others:
+                for name, labels, value in dump.get(metric.name, ()):
+                    lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def mark_process_dead(directory: str, pid: int):
+    """Drop a worker's dump once it has exited (gunicorn child_exit)."""
+    try:
+        os.remove(os.path.join(directory, f"{pid}.json"))
+    except FileNotFoundError:
+        pass
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.register(
+    Counter(
+        "lighter_http_requests_total",
+        "HTTP requests served",
+        ("route", "method", "status"),
+    )
+)
+HTTP_LATENCY = metrics.register(
+    Histogram(
+        "lighter_http_request_seconds", "HTTP request latency", ("route", "method")
+    )
+)
+STAGE_LATENCY = metrics.register(
+    Histogram(
+        "lighter_stage_seconds",
+        "Latency of internal stages "
+        "(parse, decimals, orderbook, auth_token, nonce_acquire, queue, sign, send)",
+        ("stage",),
+    )
+)
+NONCE_RETRIES = metrics.register(
+    Counter(
+        "lighter_nonce_retries_total",
+        "Transactions retried after a nonce error",
+        ("kind",),
+    )
+)
+HTTP_CONNECTIONS = metrics.register(
+    Counter(
+        "lighter_upstream_connections_total",
+        "Connections to Lighter, new vs reused from the keep-alive pool",
+        ("outcome",),
+    )
+)
+
+
+# Spans of stages run on behalf of requests outside their context (the
+# submission writers), collected to be handed back to them
+_collected_spans: ContextVar[Optional[list]] = ContextVar(
+    "collected_spans", default=None
+)
+
+
+def record_stage(stage: str, started: float, ended: Optional[float] = None):
+    """
+    Observe a stage that began at `started` (perf_counter) and ends now or
+    at `ended`. Inside a request the span is also kept for its
+    Server-Timing header and trace; inside `collect_stages` it is
+    collected instead.
+    """
+    elapsed = (ended if ended is not None else time.perf_counter()) - started
+    STAGE_LATENCY.observe(elapsed, stage=stage)
+    collected = _collected_spans.get()
+    if collected is not None:
+        collected.append((stage, started, elapsed))
+    else:
+        add_stage_spans([(stage, started, elapsed)])
+
+
+def add_stage_spans(spans: List[tuple]):
+    """Keep (stage, started, elapsed) spans for the current request, if any."""
+    if has_app_context():
+        request_spans = g.get("stage_spans")
+        if request_spans is not None:
+            request_spans.extend(spans)
+
+
+@contextmanager
+def collect_stages():
+    """Collect the spans recorded inside the block into the yielded list."""
+    spans = []
+    token = _collected_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _collected_spans.reset(token)
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of a block under lighter_stage_seconds{stage}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, start)
+
+
+def timed_call(stage: str, fn: Callable) -> Callable:
+    """Wrap a sync or async callable so every call is timed as `stage`."""
+    if asyncio.iscoroutinefunction(fn):
+
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with timed(stage):
+                return await fn(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timed(stage):
+            return fn(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,430 @@
+"""Local nonce sequencing, the shared sequencer server and API key scheduling."""
+
+import os
+import json
+import time
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Dict, List
+
+from .event_loop import get_event_loop
+from .http_pool import get_api_client
+from .metrics import record_stage, timed
+
+logger = logging.getLogger(__name__)
+
+
+class NonceSequencer:
+    """
+    Hands out transaction nonces locally, per API key.
+
+    The next nonce of a key is fetched from /api/v1/nextNonce once and then
+    incremented in memory, so signing a transaction costs no extra round
+    trip. The sequencer only goes back to the server after a gap is
+    detected (an exchange nonce error such as 21104) or when the outcome of
+    a send is unknown.
+
+    `reserve()` holds the key's lock until the transaction has been sent,
+    so transactions on one key reach the exchange in nonce order.
+    """
+
+    def __init__(self, account_index: int):
+        self.account_index = account_index
+        self._next: Dict[int, int] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._loop = None
+        self.issued = 0
+        self.released = 0
+        self.gaps = 0
+        self.resyncs = 0
+        self.last_resync_at = None
+
+    def _lock(self, api_key_index: int) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._locks = {}
+            self._next = {}
+            self._loop = loop
+        lock = self._locks.get(api_key_index)
+        if lock is None:
+            lock = self._locks[api_key_index] = asyncio.Lock()
+        return lock
+
+    async def _fetch(self, api_key_index: int) -> int:
+        import lighter
+
+        resp = await lighter.TransactionApi(get_api_client()).next_nonce(
+            account_index=self.account_index, api_key_index=api_key_index
+        )
+        return resp.nonce
+
+    async def _resync_locked(self, api_key_index: int) -> int:
+        nonce = await self._fetch(api_key_index)
+        self._next[api_key_index] = nonce
+        self.resyncs += 1
+        self.last_resync_at = int(time.time() * 1000)
+        logger.info(f"Nonce resynced for API key {api_key_index}: next={nonce}")
+        return nonce
+
+    async def resync(self, api_key_index: int) -> int:
+        """Fetch the next nonce from the server now."""
+        async with self._lock(api_key_index):
+            return await self._resync_locked(api_key_index)
+
+    async def resync_held(self, api_key_index: int) -> int:
+        """Fetch the next nonce from the server while holding the key in `reserve`."""
+        return await self._resync_locked(api_key_index)
+
+    @asynccontextmanager
+    async def reserve(self, api_key_index: int, count: int = 1):
+        """Hold the key and yield the first of `count` consecutive nonces."""
+        acquire_started = time.perf_counter()
+        async with self._lock(api_key_index):
+            if api_key_index not in self._next:
+                await self._resync_locked(api_key_index)
+            record_stage("nonce_acquire", acquire_started)
+            first = self._next[api_key_index]
+            self._next[api_key_index] = first + count
+            self.issued += count
+            yield first
+
+    def release(self, api_key_index: int, first: int):
+        """Give back nonces the exchange rejected without consuming."""
+        self._next[api_key_index] = first
+        self.released += 1
+
+    def report_gap(self, api_key_index: int):
+        """Drop the local nonce after a nonce error; the next reserve resyncs."""
+        self._next.pop(api_key_index, None)
+        self.gaps += 1
+
+    def invalidate(self, api_key_index: Optional[int] = None):
+        """Forget local nonces whose state is unknown (resync on next use)."""
+        if api_key_index is None:
+            self._next.clear()
+        else:
+            self._next.pop(api_key_index, None)
+
+    def stats(self) -> dict:
+        return {
+            "issued": self.issued,
+            "released": self.released,
+            "gaps": self.gaps,
+            "resyncs": self.resyncs,
+            "resync_ratio": round(self.resyncs / self.issued, 4) if self.issued else 0,
+            "last_resync_at": self.last_resync_at,
+            "next": dict(self._next),
+        }
+
+
+class RemoteNonceSequencer:
+    """
+    NonceSequencer client for a shared sequencer process (`python app.py sequencer`).
+
+    Same interface as NonceSequencer, but nonces and per-key ordering live
+    in one process reached over a Unix socket, so any number of gunicorn
+    workers can share an API key without racing for nonces. A reservation
+    is a lease: the sequencer holds the key until the worker reports the
+    outcome of its send (or disconnects, or the lease times out, in which
+    case the key is resynced).
+
+    Protocol: newline-delimited JSON requests tagged with an `id`; replies
+    carry the same `id`.
+    """
+
+    def __init__(self, socket_path: str, account_index: int):
+        self.socket_path = socket_path
+        self.account_index = account_index
+        self._reader = None
+        self._writer = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._held: Dict[int, list] = {}
+        self._lease_ids: Dict[int, int] = {}
+        self._next_id = 0
+        self._connect_lock = None
+        self._loop = None
+        self._server_stats: dict = {}
+        self.leases = 0
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._writer = None
+            self._connect_lock = asyncio.Lock()
+            self._loop = loop
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    self.socket_path
+                )
+                loop.create_task(self._read_replies(self._reader))
+                logger.info(f"Connected to nonce sequencer at {self.socket_path}")
+        return self._writer
+
+    async def _read_replies(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self._pending.pop(reply.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("Nonce sequencer disconnected")
+                    )
+
+    async def _request(self, op: str, **fields) -> dict:
+        writer = await self._connection()
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"id": request_id, "op": op, "account": self.account_index, **fields}
+        writer.write(json.dumps(message).encode() + b"\n")
+        reply = await future
+        if reply.get("error"):
+            raise Exception(f"Nonce sequencer: {reply['error']}")
+        self._server_stats = reply.get("stats", self._server_stats)
+        return reply
+
+    async def _send_quietly(self, op: str, fields: dict):
+        try:
+            await self._request(op, **fields)
+        except Exception as e:
+            logger.warning(f"Nonce sequencer {op} failed: {e}")
+
+    def _post(self, op: str, **fields):
+        """Fire-and-forget request, callable from the loop or a request thread."""
+        try:
+            asyncio.get_running_loop().create_task(self._send_quietly(op, fields))
+        except RuntimeError:
+            asyncio.run_coroutine_threadsafe(
+                self._send_quietly(op, fields), get_event_loop()
+            )
+
+    async def resync(self, api_key_index: int) -> int:
+        reply = await self._request("resync", key=api_key_index)
+        return reply["nonce"]
+
+    async def resync_held(self, api_key_index: int) -> int:
+        lease = self._lease_ids[api_key_index]
+        reply = await self._request("resync_lease", lease=lease)
+        return reply["nonce"]
+
+    @asynccontextmanager
+    async def reserve(self, api_key_index: int, count: int = 1):
+        with timed("nonce_acquire"):
+            reply = await self._request("reserve", key=api_key_index, count=count)
+        ops = self._held[api_key_index] = []
+        self._lease_ids[api_key_index] = reply["lease"]
+        self.leases += 1
+        try:
+            yield reply["first"]
+        finally:
+            self._held.pop(api_key_index, None)
+            self._lease_ids.pop(api_key_index, None)
+            self._post("done", lease=reply["lease"], ops=ops)
+
+    def _record(self, api_key_index: int, op: list):
+        """Attach an outcome to the held lease, or send it on its own."""
+        ops = self._held.get(api_key_index)
+        if ops is not None:
+            ops.append(op)
+        else:
+            self._post("apply", key=api_key_index, ops=[op])
+
+    def release(self, api_key_index: int, first: int):
+        self._record(api_key_index, ["release", first])
+
+    def report_gap(self, api_key_index: int):
+        self._record(api_key_index, ["gap"])
+
+    def invalidate(self, api_key_index: Optional[int] = None):
+        if api_key_index is None:
+            self._post("invalidate_all")
+        else:
+            self._record(api_key_index, ["invalidate"])
+
+    def stats(self) -> dict:
+        if self._loop is not None:
+            self._post("stats")
+        return {
+            "mode": "remote",
+            "socket": self.socket_path,
+            "connected": self._writer is not None and not self._writer.is_closing(),
+            "leases": self.leases,
+            "server": self._server_stats,
+        }
+
+
+def _apply_nonce_ops(sequencer: NonceSequencer, api_key_index: int, ops: list):
+    for op in ops:
+        if op[0] == "release":
+            sequencer.release(api_key_index, op[1])
+        elif op[0] == "gap":
+            sequencer.report_gap(api_key_index)
+        elif op[0] == "invalidate":
+            sequencer.invalidate(api_key_index)
+
+
+async def serve_nonce_sequencer(socket_path: str, lease_timeout: float):
+    """
+    Run the shared nonce sequencer on a Unix socket (see RemoteNonceSequencer).
+
+    Owns a NonceSequencer per account; each `reserve` holds the key's
+    lock until the worker sends `done` with the outcome of its send.
+    """
+    sequencers: Dict[int, NonceSequencer] = {}
+    lease_ids = itertools.count(1)
+
+    def sequencer_for(req: dict) -> NonceSequencer:
+        account_index = req["account"]
+        if account_index not in sequencers:
+            sequencers[account_index] = NonceSequencer(account_index)
+        return sequencers[account_index]
+
+    async def handle_connection(reader, writer):
+        leases: Dict[int, asyncio.Future] = {}
+        # Lease -> (sequencer, key) it holds, for resyncs under the lease
+        held: Dict[int, tuple] = {}
+        tasks = set()
+
+        def reply(message: dict):
+            if not writer.is_closing():
+                writer.write(json.dumps(message).encode() + b"\n")
+
+        async def hold(req: dict):
+            sequencer = sequencer_for(req)
+            api_key_index = req["key"]
+            try:
+                async with sequencer.reserve(
+                    api_key_index, req.get("count", 1)
+                ) as first:
+                    lease = next(lease_ids)
+                    done = leases[lease] = asyncio.get_running_loop().create_future()
+                    held[lease] = (sequencer, api_key_index)
+                    reply({"id": req["id"], "lease": lease, "first": first})
+                    try:
+                        ops = await asyncio.wait_for(done, lease_timeout)
+                    except (asyncio.TimeoutError, ConnectionError):
+                        # The worker died or hung mid-send: outcome unknown
+                        logger.warning(
+                            f"Nonce lease {lease} lost, resyncing key {api_key_index}"
+                        )
+                        sequencer.invalidate(api_key_index)
+                        return
+                    finally:
+                        leases.pop(lease, None)
+                        held.pop(lease, None)
+                    _apply_nonce_ops(sequencer, api_key_index, ops)
+            except Exception as e:
+                reply({"id": req["id"], "error": str(e)})
+
+        async def resync(req: dict):
+            sequencer = sequencer_for(req)
+            try:
+                if req["op"] == "resync_lease":
+                    # The lease's hold() task has the key's lock
+                    if req["lease"] not in held:
+                        raise Exception(f"lease {req['lease']} is not held")
+                    sequencer, api_key_index = held[req["lease"]]
+                    nonce = await sequencer.resync_held(api_key_index)
+                else:
+                    nonce = await sequencer.resync(req["key"])
+                reply({"id": req["id"], "nonce": nonce, "stats": sequencer.stats()})
+            except Exception as e:
+                reply({"id": req["id"], "error": str(e)})
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                req = json.loads(line)
+                op = req.get("op")
+                sequencer = sequencer_for(req)
+                if op == "reserve":
+                    task = asyncio.get_running_loop().create_task(hold(req))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    continue
+                if op in ("resync", "resync_lease"):
+                    task = asyncio.get_running_loop().create_task(resync(req))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    continue
+                if op == "done":
+                    done = leases.get(req["lease"])
+                    if done is not None and not done.done():
+                        done.set_result(req.get("ops", []))
+                elif op == "apply":
+                    _apply_nonce_ops(sequencer, req["key"], req.get("ops", []))
+                elif op == "invalidate_all":
+                    sequencer.invalidate()
+                reply({"id": req["id"], "stats": sequencer.stats()})
+        finally:
+            for done in leases.values():
+                if not done.done():
+                    done.set_exception(ConnectionError("worker disconnected"))
+            writer.close()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+    logger.info(f"Nonce sequencer listening on {socket_path}")
+    async with server:
+        await server.serve_forever()
+
+
+class KeyScheduler:
+    """
+    Spreads transactions over the account's API keys.
+
+    Every key has its own nonce stream in the sequencer, so transactions on
+    different keys never wait for each other. `least-loaded` picks the key
+    with the fewest transactions in flight (ties rotate); `sticky` pins each
+    market to one key, so orders on a market keep their submission order.
+    """
+
+    def __init__(self, key_indexes: List[int], mode: str = "least-loaded"):
+        self.keys = list(key_indexes)
+        self.mode = mode
+        self.in_flight = {k: 0 for k in self.keys}
+        self.picks = {k: 0 for k in self.keys}
+        self._rotation = 0
+
+    def pick(self, market_index: Optional[int] = None) -> int:
+        if len(self.keys) == 1:
+            return self.keys[0]
+        if self.mode == "sticky" and market_index is not None:
+            return self.keys[market_index % len(self.keys)]
+        self._rotation = (self._rotation + 1) % len(self.keys)
+        rotated = self.keys[self._rotation :] + self.keys[: self._rotation]
+        return min(rotated, key=self.in_flight.__getitem__)
+
+    @contextmanager
+    def use(self, market_index: Optional[int] = None):
+        """Pick a key and count it as busy until the block exits."""
+        api_key_index = self.pick(market_index)
+        self.in_flight[api_key_index] += 1
+        self.picks[api_key_index] += 1
+        try:
+            yield api_key_index
+        finally:
+            self.in_flight[api_key_index] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "keys": self.keys,
+            "in_flight": dict(self.in_flight),
+            "picks": dict(self.picks),
+        }
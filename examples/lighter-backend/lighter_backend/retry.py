@@ -0,0 +1,203 @@
+"""Classification of upstream errors, retry budget and circuit breaker."""
+
+import os
+import time
+import asyncio
+import random
+import re
+import threading
+import logging
+from typing import Any, Optional
+
+from .metrics import Counter, metrics
+
+logger = logging.getLogger(__name__)
+
+
+NONCE_RETRY_ATTEMPTS = int(os.getenv("NONCE_RETRY_ATTEMPTS", "3"))
+# Base of the exponential backoff (the first nonce retry does not wait)
+NONCE_RETRY_DELAY_MS = int(os.getenv("NONCE_RETRY_DELAY_MS", "50"))
+RETRY_MAX_DELAY_MS = int(os.getenv("RETRY_MAX_DELAY_MS", "2000"))
+# Retries earned per first attempt, and the most that can be saved up
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_BURST = float(os.getenv("RETRY_BUDGET_BURST", "20"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S", "5"))
+
+# Exchange error codes meaning "this nonce was not the next one"
+NONCE_ERROR_CODES = {
+    int(c) for c in os.getenv("NONCE_ERROR_CODES", "21104").split(",") if c.strip()
+}
+
+# Matches JSON bodies ("code": 21104) and the SDK's model repr (code=21104)
+_ERROR_CODE_RE = re.compile(r"""\bcode["']?\s*[:=]\s*(\d+)""")
+_HTTP_STATUS_RE = re.compile(r"^\((\d{3})\)")
+
+RETRY_DECISIONS = metrics.register(
+    Counter(
+        "lighter_retry_decisions_total",
+        "Retry policy decisions on failed sends, by error class",
+        ("error_class", "decision"),
+    )
+)
+
+
+def error_code(error: Any) -> Optional[int]:
+    """The exchange's error code in an ApiException, its body or message."""
+    body = getattr(error, "body", None) or str(error)
+    match = _ERROR_CODE_RE.search(body if isinstance(body, str) else str(body))
+    return int(match.group(1)) if match else None
+
+
+def classify_error(error: Any) -> Optional[str]:
+    """
+    Error class of a failed send, from structured codes rather than text:
+
+    - "nonce": exchange nonce error (NONCE_ERROR_CODES); safe to re-sign
+    - "throttled": HTTP 429 or no connection made; nothing was sent
+    - "unavailable": 5xx or timeout; the exchange may have seen the tx
+    - "rejected": any other answer from the exchange
+    """
+    if error is None:
+        return None
+    if error_code(error) in NONCE_ERROR_CODES:
+        return "nonce"
+    status = getattr(error, "status", None)
+    if status is None:
+        match = _HTTP_STATUS_RE.match(str(error).strip())
+        status = int(match.group(1)) if match else None
+    if status == 429:
+        return "throttled"
+    if status is not None and status >= 500:
+        return "unavailable"
+    if isinstance(error, (ConnectionRefusedError, ConnectionResetError)) or (
+        type(error).__name__ == "ClientConnectorError"
+    ):
+        return "throttled"
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)) or (
+        type(error).__name__.startswith(("ServerDisconnected", "ServerTimeout"))
+    ):
+        return "unavailable"
+    return "rejected"
+
+
+def is_nonce_error(error: Any) -> bool:
+    """Check if an error is an exchange nonce error (by error code)."""
+    return classify_error(error) == "nonce"
+
+
+class RetryPolicy:
+    """
+    Decides whether, and after how long, a failed send is retried.
+
+    Nonce errors are retried right away once (the sequencer has resynced)
+    and then with exponential backoff and full jitter; throttling always
+    backs off. Outcomes the exchange may have applied ("unavailable") and
+    plain rejections are never retried, so a retry cannot duplicate an
+    order. Apart from that first nonce retry, retries spend from a
+    process-wide budget that earns RETRY_BUDGET_RATIO per first attempt,
+    which caps retry traffic at that share of real traffic during
+    incidents.
+
+    The circuit breaker opens after BREAKER_FAILURES consecutive
+    throttled/unavailable sends and fails new sends immediately for
+    BREAKER_COOLDOWN_S; then one probe goes through, and its outcome
+    closes or re-opens it.
+
+    Replace `retry_policy` with a subclass to change these decisions.
+    """
+
+    RETRYABLE = ("nonce", "throttled")
+    BREAKER_CLASSES = ("throttled", "unavailable")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens = RETRY_BUDGET_BURST
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_until == 0.0:
+                return "closed"
+            return "half-open" if self.probing else "open"
+
+    def admit(self) -> Optional[str]:
+        """Before a first attempt: None to go ahead, or why not."""
+        with self._lock:
+            now = time.monotonic()
+            if self.opened_until:
+                if now < self.opened_until:
+                    RETRY_DECISIONS.inc(error_class="breaker", decision="rejected")
+                    return "Upstream circuit open, not sending"
+                # Cooldown over: this send is the probe (one per cooldown)
+                self.opened_until = now + BREAKER_COOLDOWN_S
+                self.probing = True
+            self.tokens = min(RETRY_BUDGET_BURST, self.tokens + RETRY_BUDGET_RATIO)
+        return None
+
+    def record(self, error: Any) -> Optional[str]:
+        """After every attempt: update the breaker; returns the error class."""
+        error_class = classify_error(error)
+        with self._lock:
+            if error_class in self.BREAKER_CLASSES:
+                self.failures += 1
+                if self.probing or self.failures >= BREAKER_FAILURES:
+                    if not self.opened_until:
+                        self.trips += 1
+                        logger.warning(
+                            f"Upstream circuit open for {BREAKER_COOLDOWN_S}s "
+                            f"after {self.failures} failures: {error}"
+                        )
+                    self.opened_until = time.monotonic() + BREAKER_COOLDOWN_S
+                    self.probing = False
+            else:
+                # The exchange answered: it is up
+                self.failures = 0
+                self.opened_until = 0.0
+                self.probing = False
+        return error_class
+
+    def delay(self, error_class: str, attempt: int, attempts: int) -> Optional[float]:
+        """Seconds to wait before attempt `attempt + 1`, or None to give up."""
+        if error_class not in self.RETRYABLE:
+            decision = "final"
+        elif attempt + 1 >= attempts:
+            decision = "exhausted"
+        else:
+            # Breaker and budget are read together, under the lock record() holds
+            with self._lock:
+                if self.opened_until:
+                    decision = "breaker_open"
+                elif error_class == "nonce" and attempt == 0:
+                    # The resync is the fix; this retry is part of the first attempt
+                    decision = "retry"
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    decision = "retry"
+                else:
+                    decision = "budget_exhausted"
+        RETRY_DECISIONS.inc(error_class=error_class, decision=decision)
+        if decision != "retry":
+            return None
+        if error_class == "nonce" and attempt == 0:
+            return 0.0
+        cap = min(RETRY_MAX_DELAY_MS, NONCE_RETRY_DELAY_MS * 2**attempt) / 1000
+        return random.uniform(0, cap)
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "budget_tokens": round(self.tokens, 2),
+            "max_attempts": NONCE_RETRY_ATTEMPTS,
+            "base_delay_ms": NONCE_RETRY_DELAY_MS,
+            "max_delay_ms": RETRY_MAX_DELAY_MS,
+        }
+
+
+retry_policy = RetryPolicy()
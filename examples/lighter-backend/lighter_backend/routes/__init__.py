@@ -0,0 +1,6 @@
+"""HTTP endpoints. Importing this package registers them on `app`."""
+
+from ..web import app
+from . import system, orders, brackets, account
+
+__all__ = ["app"]
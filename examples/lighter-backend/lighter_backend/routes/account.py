@@ -0,0 +1,334 @@
+"""Position, account, order and event stream endpoints."""
+
+import json
+import time
+import logging
+from typing import Optional
+
+from flask import Response, request, jsonify
+
+from ..account_state import ACCOUNT_STREAM, AccountStateFeed, position_side
+from ..accounts import current_account, get_client
+from ..encoding import project, requested_fields
+from ..event_loop import get_event_loop
+from ..events import EVENT_TYPES, SSE_KEEPALIVE_S, stream_slots
+from ..execution import execute_with_nonce_retry
+from ..idempotency import client_order_ids, idempotent
+from ..jobs import async_job
+from ..markets import (
+    convert_price_to_int,
+    convert_size_to_base_amount,
+    get_market_decimals,
+)
+from ..order_books import get_top_of_book
+from ..web import app, async_route, require_auth
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_close(data: dict) -> Optional[str]:
+    int(data.get("market_index", 0))
+    float(data.get("slippage", 0.5))
+    return None
+
+
+@app.route("/api/position/close", methods=["POST"])
+@require_auth
+@idempotent
+@async_job(_validate_close)
+@async_route
+async def close_position():
+    try:
+        data = request.get_json() or {}
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        slippage = float(data.get("slippage", 0.5)) / 100
+
+        positions, _, _ = await current_account().state.snapshot()
+        position = positions.get(market_index)
+
+        if not position:
+            return jsonify(
+                {
+                    "success": True,
+                    "message": "No position to close",
+                    "market_index": market_index,
+                }
+            )
+
+        position_size = abs(float(position.get("position", 0)))
+        is_long = position.get("sign", 0) > 0
+
+        if position_size <= 0:
+            return jsonify({"success": True, "message": "Position already closed"})
+
+        is_ask = is_long
+
+        current_price = await get_top_of_book(market_index, is_ask)
+        if current_price is None:
+            return jsonify({"error": "Could not get price for close"}), 400
+
+        slippage_multiplier = (1 - slippage) if is_ask else (1 + slippage)
+        execution_price = current_price * slippage_multiplier
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(position_size, size_dec)
+        price_int = convert_price_to_int(execution_price, price_dec)
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_order,
+            market_index=market_index,
+            client_order_index=client_order_ids.next(),
+            base_amount=base_amount,
+            price=price_int,
+            is_ask=is_ask,
+            order_type=client.ORDER_TYPE_MARKET,
+            time_in_force=client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
+            reduce_only=True,
+            order_expiry=client.DEFAULT_IOC_EXPIRY,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "closed_position": {
+                    "market_index": market_index,
+                    "size": position_size,
+                    "side": "long" if is_long else "short",
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error closing position")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/position/update-leverage", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def update_leverage():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        leverage = int(data.get("leverage", 10))
+        margin_mode = data.get("margin_mode", "cross").lower()
+
+        if leverage < 1 or leverage > 100:
+            return jsonify({"error": "leverage must be between 1 and 100"}), 400
+
+        mode = (
+            client.CROSS_MARGIN_MODE
+            if margin_mode == "cross"
+            else client.ISOLATED_MARGIN_MODE
+        )
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.update_leverage,
+            market_index=market_index,
+            margin_mode=mode,
+            leverage=leverage,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "leverage": {
+                    "market_index": market_index,
+                    "leverage": leverage,
+                    "margin_mode": margin_mode,
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error updating leverage")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/account", methods=["GET"])
+@require_auth
+@async_route
+async def get_account():
+    try:
+        account_state = current_account().state
+        _, source, as_of = await account_state.snapshot(need_account=True)
+        # The REST `DetailedAccounts` response, with live positions and
+        # where they came from
+        return jsonify(
+            {
+                **account_state.response,
+                "accounts": [project(account_state.account_dict(), requested_fields())],
+                "source": source,
+                "as_of": int(as_of * 1000),
+                # Balances and the other REST-only fields
+                "account_as_of": int(account_state.account_as_of * 1000),
+            }
+        )
+    except Exception as e:
+        logger.exception("Error getting account")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/positions", methods=["GET"])
+@require_auth
+@async_route
+async def get_positions():
+    try:
+        by_market, source, as_of = await current_account().state.snapshot()
+
+        positions = []
+        for market_index, p in by_market.items():
+            size, side = position_side(p)
+            if size != 0:
+                positions.append(
+                    {"market_index": market_index, "size": size, "side": side}
+                )
+
+        return jsonify(
+            {
+                "positions": project(positions, requested_fields()),
+                "count": len(positions),
+                "source": source,
+                "as_of": int(as_of * 1000),
+            }
+        )
+    except Exception as e:
+        logger.exception("Error getting positions")
+        return jsonify({"error": str(e)}), 500
+
+
+def resync_payload(state: AccountStateFeed, market_index: Optional[int]) -> str:
+    """
+    Data of a `resync` event: the account's current positions and live
+    orders from the stream state, or null where it is not up to date (the
+    client then reloads them over REST).
+    """
+    positions = orders = None
+    if state.fresh():
+        positions = []
+        for index, position in state.positions.items():
+            size, side = position_side(position)
+            if size != 0 and market_index in (None, index):
+                positions.append({"market_index": index, "size": size, "side": side})
+        if state.orders.ready:
+            orders = [o.to_dict() for o in state.orders.orders(market_index)]
+    return json.dumps(
+        {
+            "type": "resync",
+            "market_index": market_index,
+            "positions": positions,
+            "orders": orders,
+        }
+    )
+
+
+@app.route("/api/stream", methods=["GET"])
+@require_auth
+def event_stream():
+    """
+    Server-Sent Events of the account: fills, order changes and position changes.
+
+    Query: types=fill,order,position (default: all), market_index (optional).
+    A reconnecting client sends Last-Event-ID and gets the events it missed
+    while they are still in the replay buffer; otherwise a `lagged` event
+    tells it how many were lost. An id from another worker or an earlier
+    process gets a `resync` event with the current positions and orders.
+    """
+    if not ACCOUNT_STREAM:
+        return jsonify({"error": "ACCOUNT_STREAM is disabled"}), 503
+    types = tuple(
+        t for t in request.args.get("types", ",".join(EVENT_TYPES)).split(",") if t
+    )
+    unknown = [t for t in types if t not in EVENT_TYPES]
+    if unknown:
+        return jsonify({"error": f"types must be among {', '.join(EVENT_TYPES)}"}), 400
+    market_index = request.args.get("market_index", type=int)
+    last_event_id = request.headers.get("Last-Event-ID")
+
+    state = current_account().state
+    if not stream_slots.acquire():
+        return jsonify({"error": "Too many stream consumers"}), 503
+    get_event_loop().call_soon_threadsafe(state.start)
+    hub = state.events
+    consumer = hub.subscribe(types, market_index, last_event_id)
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if consumer.resync:
+                yield f"event: resync\ndata: {resync_payload(state, market_index)}\n\n"
+            while True:
+                event = consumer.get(SSE_KEEPALIVE_S)
+                if consumer.dropped:
+                    dropped, consumer.dropped = consumer.dropped, 0
+                    yield f'event: lagged\ndata: {{"dropped": {dropped}}}\n\n'
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                seq, event_type, _, payload = event
+                yield f"id: {hub.event_id(seq)}\nevent: {event_type}\ndata: {payload}\n\n"
+        finally:
+            hub.unsubscribe(consumer)
+            stream_slots.release()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/orders", methods=["GET"])
+@require_auth
+@async_route
+async def get_orders():
+    try:
+        market_index = request.args.get("market_index", type=int, default=-1)
+
+        live, source = await current_account().state.active_orders(
+            None if market_index == -1 else market_index
+        )
+        orders = project([o.to_dict() for o in live], requested_fields())
+
+        return jsonify({"orders": orders, "count": len(orders), "source": source})
+    except Exception as e:
+        logger.exception("Error getting orders")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/auth-token", methods=["GET"])
+@require_auth
+@async_route
+async def get_auth_token():
+    try:
+        account = current_account()
+        expiry = request.args.get("expiry", type=int, default=3600)
+
+        token, expires_at, err = await account.auth_token(expiry)
+
+        if err:
+            return jsonify({"error": err}), 400
+
+        return jsonify({"token": token, "expires_in": int(expires_at - time.time())})
+    except Exception as e:
+        logger.exception("Error generating auth token")
+        return jsonify({"error": str(e)}), 500
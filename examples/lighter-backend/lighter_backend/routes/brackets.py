@@ -0,0 +1,523 @@
+"""Take-profit / stop-loss endpoints and entries with brackets."""
+
+import logging
+from typing import Optional
+
+from flask import request, jsonify
+
+from ..accounts import get_client
+from ..execution import execute_with_nonce_retry, send_tx_batch
+from ..idempotency import client_order_ids, idempotent
+from ..jobs import async_job
+from ..markets import (
+    check_order_size,
+    convert_price_to_int,
+    convert_size_to_base_amount,
+    get_market_decimals,
+)
+from ..order_books import get_top_of_book
+from ..transactions import TxLeg, order_tx_params
+from ..web import app, async_route, require_auth
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_brackets(data: dict) -> Optional[str]:
+    int(data.get("market_index", 0))
+    if float(data.get("size", 0)) <= 0:
+        return "size must be > 0"
+    float(data.get("slippage", 0.5))
+    if not isinstance(data.get("take_profits", []), list):
+        return "take_profits must be a list"
+    if not isinstance(data.get("stop_loss", {}), dict):
+        return "stop_loss must be an object"
+    return None
+
+
+@app.route("/api/order/tp", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_tp_order():
+    """
+    Create a Take Profit order.
+    Triggers when mark price reaches trigger_price, then executes at price.
+    For LONG positions: is_ask=True (SELL to take profit)
+    For SHORT positions: is_ask=False (BUY to take profit)
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "sell").lower()
+        size = float(data.get("size", 0))
+        trigger_price = float(data.get("trigger_price", 0))
+        price = float(data.get("price", 0)) or trigger_price
+        reduce_only = bool(data.get("reduce_only", True))
+        client_order_id = int(data.get("client_order_id", 0)) or client_order_ids.next()
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+        if trigger_price <= 0:
+            return jsonify({"error": "trigger_price must be > 0"}), 400
+
+        is_ask = side == "sell"
+
+        size_error = await check_order_size(market_index, size, price)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
+        price_int = convert_price_to_int(price, price_dec)
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_tp_order,
+            market_index=market_index,
+            client_order_index=client_order_id,
+            base_amount=base_amount,
+            trigger_price=trigger_price_int,
+            price=price_int,
+            is_ask=is_ask,
+            reduce_only=reduce_only,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "order": {
+                    "market_index": market_index,
+                    "side": side,
+                    "size": size,
+                    "trigger_price": trigger_price,
+                    "price": price,
+                    "type": "take_profit",
+                    "reduce_only": reduce_only,
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating TP order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/tp-limit", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_tp_limit_order():
+    """
+    Create a Take Profit Limit order.
+    Triggers when mark price reaches trigger_price, then places limit order at price.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "sell").lower()
+        size = float(data.get("size", 0))
+        trigger_price = float(data.get("trigger_price", 0))
+        price = float(data.get("price", 0)) or trigger_price
+        reduce_only = bool(data.get("reduce_only", True))
+        client_order_id = int(data.get("client_order_id", 0)) or client_order_ids.next()
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+        if trigger_price <= 0:
+            return jsonify({"error": "trigger_price must be > 0"}), 400
+
+        is_ask = side == "sell"
+
+        size_error = await check_order_size(market_index, size, price)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
+        price_int = convert_price_to_int(price, price_dec)
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_tp_limit_order,
+            market_index=market_index,
+            client_order_index=client_order_id,
+            base_amount=base_amount,
+            trigger_price=trigger_price_int,
+            price=price_int,
+            is_ask=is_ask,
+            reduce_only=reduce_only,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "order": {
+                    "market_index": market_index,
+                    "side": side,
+                    "size": size,
+                    "trigger_price": trigger_price,
+                    "price": price,
+                    "type": "take_profit_limit",
+                    "reduce_only": reduce_only,
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating TP Limit order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/sl", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_sl_order():
+    """
+    Create a Stop Loss order.
+    Triggers when mark price reaches trigger_price, then executes at price.
+    For LONG positions: is_ask=True (SELL to stop loss)
+    For SHORT positions: is_ask=False (BUY to stop loss)
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "sell").lower()
+        size = float(data.get("size", 0))
+        trigger_price = float(data.get("trigger_price", 0))
+        price = float(data.get("price", 0)) or trigger_price
+        reduce_only = bool(data.get("reduce_only", True))
+        client_order_id = int(data.get("client_order_id", 0)) or client_order_ids.next()
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+        if trigger_price <= 0:
+            return jsonify({"error": "trigger_price must be > 0"}), 400
+
+        is_ask = side == "sell"
+
+        size_error = await check_order_size(market_index, size, price)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
+        price_int = convert_price_to_int(price, price_dec)
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_sl_order,
+            market_index=market_index,
+            client_order_index=client_order_id,
+            base_amount=base_amount,
+            trigger_price=trigger_price_int,
+            price=price_int,
+            is_ask=is_ask,
+            reduce_only=reduce_only,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "order": {
+                    "market_index": market_index,
+                    "side": side,
+                    "size": size,
+                    "trigger_price": trigger_price,
+                    "price": price,
+                    "type": "stop_loss",
+                    "reduce_only": reduce_only,
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating SL order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/sl-limit", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_sl_limit_order():
+    """
+    Create a Stop Loss Limit order.
+    Triggers when mark price reaches trigger_price, then places limit order at price.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "sell").lower()
+        size = float(data.get("size", 0))
+        trigger_price = float(data.get("trigger_price", 0))
+        price = float(data.get("price", 0)) or trigger_price
+        reduce_only = bool(data.get("reduce_only", True))
+        client_order_id = int(data.get("client_order_id", 0)) or client_order_ids.next()
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+        if trigger_price <= 0:
+            return jsonify({"error": "trigger_price must be > 0"}), 400
+
+        is_ask = side == "sell"
+
+        size_error = await check_order_size(market_index, size, price)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        trigger_price_int = convert_price_to_int(trigger_price, price_dec)
+        price_int = convert_price_to_int(price, price_dec)
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_sl_limit_order,
+            market_index=market_index,
+            client_order_index=client_order_id,
+            base_amount=base_amount,
+            trigger_price=trigger_price_int,
+            price=price_int,
+            is_ask=is_ask,
+            reduce_only=reduce_only,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "order": {
+                    "market_index": market_index,
+                    "side": side,
+                    "size": size,
+                    "trigger_price": trigger_price,
+                    "price": price,
+                    "type": "stop_loss_limit",
+                    "reduce_only": reduce_only,
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating SL Limit order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/entry-with-brackets", methods=["POST"])
+@require_auth
+@idempotent
+@async_job(_validate_brackets)
+@async_route
+async def create_entry_with_brackets():
+    """
+    Create entry order with TP and SL brackets in a single call.
+    All legs are signed locally and submitted in one batch transaction call.
+
+    Body:
+    {
+        "market_index": 0,
+        "side": "buy",
+        "size": 0.1,
+        "slippage": 0.5,
+        "take_profits": [
+            {"trigger_price": 3600.00, "size_percent": 33},
+            {"trigger_price": 3700.00, "size_percent": 33},
+            {"trigger_price": 3800.00, "size_percent": 34}
+        ],
+        "stop_loss": {
+            "trigger_price": 3300.00
+        }
+    }
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "buy").lower()
+        size = float(data.get("size", 0))
+        slippage = float(data.get("slippage", 0.5)) / 100
+
+        take_profits = data.get("take_profits", [])
+        sl_config = data.get("stop_loss", {})
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+
+        results = {"entry": None, "take_profits": [], "stop_loss": None, "errors": []}
+
+        size_error = await check_order_size(market_index, size)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        is_ask_entry = side == "sell"
+
+        # Entry price from the top of the book
+        current_price = await get_top_of_book(market_index, is_ask_entry)
+        if current_price is None:
+            return jsonify({"error": "Could not get current price"}), 400
+
+        slippage_multiplier = (1 - slippage) if is_ask_entry else (1 + slippage)
+        execution_price = current_price * slippage_multiplier
+        price_int = convert_price_to_int(execution_price, price_dec)
+
+        # For brackets: opposite side of entry
+        # LONG entry (buy) = SELL for TP/SL
+        # SHORT entry (sell) = BUY for TP/SL
+        bracket_is_ask = not is_ask_entry
+        # Entry, one per take profit, then the stop loss
+        leg_client_order_ids = client_order_ids.take(len(take_profits) + 2)
+
+        # All legs are signed locally with consecutive nonces and sent in one
+        # batch, stop loss right after the entry so the position is never
+        # left without a stop while the take profits go out.
+        legs = [
+            TxLeg(
+                "entry",
+                "sign_create_order",
+                order_tx_params(
+                    client,
+                    "market",
+                    market_index=market_index,
+                    client_order_index=leg_client_order_ids[0],
+                    base_amount=base_amount,
+                    price=price_int,
+                    is_ask=is_ask_entry,
+                ),
+            )
+        ]
+        leg_details = [{"side": side, "size": size, "execution_price": execution_price}]
+
+        if sl_config.get("trigger_price"):
+            sl_trigger = float(sl_config["trigger_price"])
+            sl_price = float(sl_config.get("price", sl_trigger))
+            sl_size_percent = float(sl_config.get("size_percent", 100))
+            sl_size = size * (sl_size_percent / 100)
+
+            legs.append(
+                TxLeg(
+                    "stop_loss",
+                    "sign_create_order",
+                    order_tx_params(
+                        client,
+                        "sl",
+                        market_index=market_index,
+                        client_order_index=leg_client_order_ids[-1],
+                        base_amount=convert_size_to_base_amount(sl_size, size_dec),
+                        price=convert_price_to_int(sl_price, price_dec),
+                        is_ask=bracket_is_ask,
+                        reduce_only=True,
+                        trigger_price=convert_price_to_int(sl_trigger, price_dec),
+                    ),
+                )
+            )
+            leg_details.append(
+                {"trigger_price": sl_trigger, "price": sl_price, "size": sl_size}
+            )
+
+        for i, tp_config in enumerate(take_profits):
+            if not tp_config.get("trigger_price"):
+                continue
+
+            tp_trigger = float(tp_config["trigger_price"])
+            tp_price = float(tp_config.get("price", tp_trigger))
+            size_percent = float(tp_config.get("size_percent", 100))
+            tp_size = size * (size_percent / 100)
+
+            legs.append(
+                TxLeg(
+                    f"take_profit_{i+1}",
+                    "sign_create_order",
+                    order_tx_params(
+                        client,
+                        "tp",
+                        market_index=market_index,
+                        client_order_index=leg_client_order_ids[i + 1],
+                        base_amount=convert_size_to_base_amount(tp_size, size_dec),
+                        price=convert_price_to_int(tp_price, price_dec),
+                        is_ask=bracket_is_ask,
+                        reduce_only=True,
+                        trigger_price=convert_price_to_int(tp_trigger, price_dec),
+                    ),
+                )
+            )
+            leg_details.append(
+                {
+                    "trigger_price": tp_trigger,
+                    "price": tp_price,
+                    "size": tp_size,
+                    "size_percent": size_percent,
+                }
+            )
+
+        leg_results = await send_tx_batch(client, legs)
+
+        for leg, detail, result in zip(legs, leg_details, leg_results):
+            if result["error"]:
+                results["errors"].append({"type": leg.name, "error": result["error"]})
+                continue
+            leg_result = {"tx_hash": result["tx_hash"], **detail}
+            if leg.name == "entry":
+                results["entry"] = leg_result
+            elif leg.name == "stop_loss":
+                results["stop_loss"] = leg_result
+            else:
+                results["take_profits"].append(leg_result)
+
+        if results["entry"] is None:
+            return jsonify({"success": False, **results}), 400
+
+        return jsonify({"success": len(results["errors"]) == 0, **results})
+
+    except Exception as e:
+        logger.exception("Error creating entry with brackets")
+        return jsonify({"success": False, "error": str(e)}), 500
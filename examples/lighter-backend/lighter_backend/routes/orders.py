@@ -0,0 +1,656 @@
+"""Order endpoints: limit, market, batch, cancel, modify and cancel-all."""
+
+import os
+import logging
+from typing import Tuple, Optional
+
+from flask import request, jsonify
+
+from ..accounts import current_account, get_client
+from ..execution import execute_with_nonce_retry, send_tx_batch
+from ..idempotency import client_order_ids, idempotent
+from ..jobs import async_job
+from ..markets import (
+    check_order_size,
+    convert_price_to_int,
+    convert_size_to_base_amount,
+    get_market_decimals,
+)
+from ..order_books import get_top_of_book
+from ..transactions import TxLeg, order_tx_params
+from ..web import app, async_route, require_auth
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_cancel_all(data: dict) -> Optional[str]:
+    if data.get("market_index") is not None:
+        int(data["market_index"])
+    if str(data.get("mode", "native")).lower() not in ("native", "batch"):
+        return "mode must be 'native' or 'batch'"
+    return None
+
+
+@app.route("/api/order/limit", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_limit_order():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "buy").lower()
+        size = float(data.get("size", 0))
+        price = float(data.get("price", 0))
+        reduce_only = bool(data.get("reduce_only", False))
+        post_only = bool(data.get("post_only", False))
+        client_order_id = int(data.get("client_order_id", 0)) or client_order_ids.next()
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+        if price <= 0:
+            return jsonify({"error": "price must be > 0 for limit orders"}), 400
+
+        is_ask = side == "sell"
+
+        size_error = await check_order_size(market_index, size, price)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        price_int = convert_price_to_int(price, price_dec)
+
+        time_in_force = (
+            client.ORDER_TIME_IN_FORCE_POST_ONLY
+            if post_only
+            else client.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME
+        )
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_order,
+            market_index=market_index,
+            client_order_index=client_order_id,
+            base_amount=base_amount,
+            price=price_int,
+            is_ask=is_ask,
+            order_type=client.ORDER_TYPE_LIMIT,
+            time_in_force=time_in_force,
+            reduce_only=reduce_only,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "order": {
+                    "market_index": market_index,
+                    "side": side,
+                    "size": size,
+                    "price": price,
+                    "type": "limit",
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating limit order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/market", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_market_order():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        side = data.get("side", "buy").lower()
+        size = float(data.get("size", 0))
+        slippage = float(data.get("slippage", 0.5)) / 100
+        reduce_only = bool(data.get("reduce_only", False))
+        client_order_id = int(data.get("client_order_id", 0)) or client_order_ids.next()
+
+        if size <= 0:
+            return jsonify({"error": "size must be > 0"}), 400
+
+        is_ask = side == "sell"
+
+        current_price = await get_top_of_book(market_index, is_ask)
+        if current_price is None:
+            return jsonify({"error": "Could not get current price"}), 400
+
+        slippage_multiplier = (1 - slippage) if is_ask else (1 + slippage)
+        execution_price = current_price * slippage_multiplier
+
+        size_error = await check_order_size(market_index, size, execution_price)
+        if size_error:
+            return jsonify({"error": size_error}), 400
+
+        # Get market decimals for proper conversion
+        size_dec, price_dec = await get_market_decimals(market_index)
+        base_amount = convert_size_to_base_amount(size, size_dec)
+        price_int = convert_price_to_int(execution_price, price_dec)
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.create_order,
+            market_index=market_index,
+            client_order_index=client_order_id,
+            base_amount=base_amount,
+            price=price_int,
+            is_ask=is_ask,
+            order_type=client.ORDER_TYPE_MARKET,
+            time_in_force=client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
+            reduce_only=reduce_only,
+            order_expiry=client.DEFAULT_IOC_EXPIRY,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "order": {
+                    "market_index": market_index,
+                    "side": side,
+                    "size": size,
+                    "execution_price": execution_price,
+                    "type": "market",
+                },
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating market order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+ORDERS_BATCH_MAX_ITEMS = int(os.getenv("ORDERS_BATCH_MAX_ITEMS", "200"))
+
+# Per-type defaults, matching the single-order routes
+_ORDER_SPEC_DEFAULTS = {
+    "limit": ("buy", False),
+    "market": ("buy", False),
+    "tp": ("sell", True),
+    "tp-limit": ("sell", True),
+    "sl": ("sell", True),
+    "sl-limit": ("sell", True),
+}
+
+
+async def build_order_leg(
+    client, spec: dict, default_client_order_id: int
+) -> Tuple[Optional[TxLeg], dict, Optional[str]]:
+    """
+    Validate one order spec and convert it to a signable leg.
+
+    Applies the same defaults and checks as the single-order route for
+    its `type`. Returns (leg, order summary, error).
+    """
+    order_type = str(spec.get("type", "")).lower()
+    if order_type not in _ORDER_SPEC_DEFAULTS:
+        return None, {}, f"type must be one of {', '.join(_ORDER_SPEC_DEFAULTS)}"
+    default_side, default_reduce_only = _ORDER_SPEC_DEFAULTS[order_type]
+
+    market_index = int(spec.get("market_index", 0))
+    side = str(spec.get("side", default_side)).lower()
+    size = float(spec.get("size", 0))
+    price = float(spec.get("price", 0))
+    trigger_price = float(spec.get("trigger_price", 0))
+    reduce_only = bool(spec.get("reduce_only", default_reduce_only))
+    client_order_id = int(spec.get("client_order_id", 0)) or default_client_order_id
+    is_ask = side == "sell"
+
+    order = {
+        "market_index": market_index,
+        "side": side,
+        "size": size,
+        "type": order_type,
+    }
+
+    if size <= 0:
+        return None, order, "size must be > 0"
+    if order_type == "limit" and price <= 0:
+        return None, order, "price must be > 0 for limit orders"
+    if order_type not in ("limit", "market"):
+        if trigger_price <= 0:
+            return None, order, "trigger_price must be > 0"
+        price = price or trigger_price
+        order["trigger_price"] = trigger_price
+
+    if order_type == "market":
+        current_price = await get_top_of_book(market_index, is_ask)
+        if current_price is None:
+            return None, order, "Could not get current price"
+        slippage = float(spec.get("slippage", 0.5)) / 100
+        price = current_price * ((1 - slippage) if is_ask else (1 + slippage))
+        order["execution_price"] = price
+    else:
+        order["price"] = price
+
+    size_error = await check_order_size(market_index, size, price)
+    if size_error:
+        return None, order, size_error
+
+    size_dec, price_dec = await get_market_decimals(market_index)
+    params = order_tx_params(
+        client,
+        order_type,
+        market_index=market_index,
+        client_order_index=client_order_id,
+        base_amount=convert_size_to_base_amount(size, size_dec),
+        price=convert_price_to_int(price, price_dec),
+        is_ask=is_ask,
+        reduce_only=reduce_only,
+        trigger_price=convert_price_to_int(trigger_price, price_dec),
+        post_only=bool(spec.get("post_only", False)),
+    )
+    order["client_order_id"] = client_order_id
+    return TxLeg(order_type, "sign_create_order", params), order, None
+
+
+@app.route("/api/orders/batch", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def create_orders_batch():
+    """
+    Create many orders of mixed types in one request.
+
+    Body: {"orders": [{"type": "limit"|"market"|"tp"|"tp-limit"|"sl"|"sl-limit",
+    ...same fields as the single-order route...}, ...]}
+
+    Valid orders are signed with consecutive nonces and submitted via
+    sendTxBatch, in request order. Invalid orders are reported and skipped.
+    Returns one result per input order, in the same order.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        specs = data.get("orders")
+        if not isinstance(specs, list) or not specs:
+            return jsonify({"error": "orders must be a non-empty list"}), 400
+        if len(specs) > ORDERS_BATCH_MAX_ITEMS:
+            return (
+                jsonify(
+                    {"error": f"At most {ORDERS_BATCH_MAX_ITEMS} orders per batch"}
+                ),
+                400,
+            )
+
+        client = await get_client()
+        default_client_order_ids = client_order_ids.take(len(specs))
+
+        results = []
+        legs = []
+        leg_positions = []
+        for i, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                results.append(
+                    {"index": i, "success": False, "error": "order must be an object"}
+                )
+                continue
+            try:
+                leg, order, error = await build_order_leg(
+                    client, spec, default_client_order_ids[i]
+                )
+            except (TypeError, ValueError) as e:
+                leg, order, error = None, {}, str(e)
+            results.append({"index": i, "success": False, "order": order})
+            if error:
+                results[-1]["error"] = error
+            else:
+                legs.append(leg)
+                leg_positions.append(i)
+
+        if legs:
+            for i, leg_result in zip(leg_positions, await send_tx_batch(client, legs)):
+                if leg_result["error"]:
+                    results[i]["error"] = leg_result["error"]
+                else:
+                    results[i]["success"] = True
+                    results[i]["tx_hash"] = leg_result["tx_hash"]
+
+        submitted = sum(1 for r in results if r["success"])
+        return jsonify(
+            {
+                "success": submitted == len(results),
+                "submitted": submitted,
+                "failed": len(results) - submitted,
+                "results": results,
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error creating batch orders")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/cancel", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def cancel_order():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        market_index = int(data.get("market_index", 0))
+        order_index = int(data.get("order_index", 0))
+        client_order_id = int(data.get("client_order_id", 0))
+
+        if order_index <= 0 and client_order_id > 0:
+            order = await current_account().state.find_order(client_order_id)
+            if order is None:
+                return (
+                    jsonify(
+                        {
+                            "error": f"No live order with client_order_id {client_order_id}"
+                        }
+                    ),
+                    404,
+                )
+            market_index, order_index = order.market_index, order.order_index
+
+        if order_index <= 0:
+            return jsonify({"error": "order_index or client_order_id is required"}), 400
+
+        # Execute with automatic retry on nonce errors
+        tx, response, err = await execute_with_nonce_retry(
+            client.cancel_order,
+            market_index=market_index,
+            order_index=order_index,
+        )
+
+        if err:
+            return jsonify({"success": False, "error": str(err)}), 400
+
+        return jsonify(
+            {
+                "success": True,
+                "tx_hash": response.tx_hash if response else None,
+                "cancelled": {"market_index": market_index, "order_index": order_index},
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error cancelling order")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =============================================================================
+# MODIFY ORDERS
+# =============================================================================
+
+
+async def build_modify_leg(spec: dict) -> Tuple[Optional[TxLeg], dict, Optional[str]]:
+    """
+    Resolve one amend spec to a sign_modify_order leg.
+
+    The order is found by `order_index` or `client_order_id`; fields left
+    out (market_index, size, price, trigger_price) keep the order's
+    current values. Returns (leg, order summary, error).
+    """
+    order_index = int(spec.get("order_index", 0))
+    client_order_id = int(spec.get("client_order_id", 0))
+    if order_index <= 0 and client_order_id <= 0:
+        return None, {}, "order_index or client_order_id is required"
+
+    current = None
+    if order_index <= 0 or any(
+        k not in spec for k in ("market_index", "size", "price", "trigger_price")
+    ):
+        current = await current_account().state.find_order(client_order_id, order_index)
+        if current is None:
+            target = (
+                f"order_index {order_index}"
+                if order_index > 0
+                else f"client_order_id {client_order_id}"
+            )
+            return None, {}, f"No live order with {target}"
+        order_index = current.order_index
+
+    market_index = int(spec.get("market_index", current.market_index if current else 0))
+    size = float(spec.get("size", current.remaining_base_amount if current else 0))
+    price = float(spec.get("price", current.price if current else 0))
+    trigger_price = float(
+        spec.get("trigger_price", current.trigger_price if current else 0)
+    )
+
+    order = {
+        "order_index": order_index,
+        "market_index": market_index,
+        "size": size,
+        "price": price,
+    }
+    if current is not None and current.client_order_index:
+        order["client_order_id"] = current.client_order_index
+    if trigger_price > 0:
+        order["trigger_price"] = trigger_price
+
+    if size <= 0:
+        return None, order, "size must be > 0"
+    if price <= 0:
+        return None, order, "price must be > 0"
+
+    size_error = await check_order_size(market_index, size, price)
+    if size_error:
+        return None, order, size_error
+
+    size_dec, price_dec = await get_market_decimals(market_index)
+    params = {
+        "market_index": market_index,
+        "order_index": order_index,
+        "base_amount": convert_size_to_base_amount(size, size_dec),
+        "price": convert_price_to_int(price, price_dec),
+        "trigger_price": convert_price_to_int(trigger_price, price_dec),
+    }
+    return TxLeg(f"modify_{order_index}", "sign_modify_order", params), order, None
+
+
+@app.route("/api/order/modify", methods=["POST"])
+@require_auth
+@idempotent
+@async_route
+async def modify_order():
+    """
+    Change price, size or trigger of resting orders in place, with one
+    ModifyOrder transaction instead of a cancel and a create.
+
+    Body: one amend {"order_index" | "client_order_id", "size", "price",
+    "trigger_price", "market_index"}, or {"orders": [amend, ...]}. A list
+    is signed with consecutive nonces and submitted via sendTxBatch, with
+    one result per amend in request order.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "JSON body required"}), 400
+
+        client = await get_client()
+
+        specs = data.get("orders")
+        if specs is None:
+            leg, order, error = await build_modify_leg(data)
+            if error:
+                return jsonify({"success": False, "error": error, "order": order}), 400
+
+            tx, response, err = await execute_with_nonce_retry(
+                client.modify_order, **leg.params
+            )
+            if err:
+                return jsonify({"success": False, "error": str(err)}), 400
+
+            return jsonify(
+                {
+                    "success": True,
+                    "tx_hash": response.tx_hash if response else None,
+                    "order": order,
+                }
+            )
+
+        if not isinstance(specs, list) or not specs:
+            return jsonify({"error": "orders must be a non-empty list"}), 400
+        if len(specs) > ORDERS_BATCH_MAX_ITEMS:
+            return (
+                jsonify(
+                    {"error": f"At most {ORDERS_BATCH_MAX_ITEMS} orders per batch"}
+                ),
+                400,
+            )
+
+        results = []
+        legs = []
+        leg_positions = []
+        for i, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                results.append(
+                    {"index": i, "success": False, "error": "order must be an object"}
+                )
+                continue
+            try:
+                leg, order, error = await build_modify_leg(spec)
+            except (TypeError, ValueError) as e:
+                leg, order, error = None, {}, str(e)
+            results.append({"index": i, "success": False, "order": order})
+            if error:
+                results[-1]["error"] = error
+            else:
+                legs.append(leg)
+                leg_positions.append(i)
+
+        if legs:
+            for i, leg_result in zip(leg_positions, await send_tx_batch(client, legs)):
+                if leg_result["error"]:
+                    results[i]["error"] = leg_result["error"]
+                else:
+                    results[i]["success"] = True
+                    results[i]["tx_hash"] = leg_result["tx_hash"]
+
+        submitted = sum(1 for r in results if r["success"])
+        return jsonify(
+            {
+                "success": submitted == len(results),
+                "submitted": submitted,
+                "failed": len(results) - submitted,
+                "results": results,
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error modifying orders")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/order/cancel-all", methods=["POST"])
+@require_auth
+@idempotent
+@async_job(_validate_cancel_all)
+@async_route
+async def cancel_all_orders():
+    """
+    Cancel all active orders, optionally for a single market.
+
+    mode "native" (default) sends one CancelAllOrders transaction; mode
+    "batch" signs one cancel per order and submits them in batches, which
+    reports a result per order.
+    """
+    try:
+        data = request.get_json() or {}
+        client = await get_client()
+
+        market_index = data.get("market_index")
+        mode = data.get("mode", "native").lower()
+        if mode not in ("native", "batch"):
+            return jsonify({"error": "mode must be 'native' or 'batch'"}), 400
+
+        orders, _ = await current_account().state.active_orders(
+            int(market_index) if market_index is not None else None
+        )
+        if not orders:
+            return jsonify(
+                {
+                    "success": True,
+                    "message": "No orders to cancel",
+                    "cancelled_count": 0,
+                }
+            )
+
+        cancelled = []
+        errors = []
+
+        if mode == "native":
+            # One CancelAllOrders transaction, scoped to the market if given
+            cancel_kwargs = {
+                "time_in_force": client.CANCEL_ALL_TIF_IMMEDIATE,
+                "timestamp_ms": 0,
+            }
+            if market_index is not None:
+                cancel_kwargs["cancel_all_market_index"] = int(market_index)
+            _, response, err = await execute_with_nonce_retry(
+                client.cancel_all_orders, **cancel_kwargs
+            )
+            if err:
+                errors = [
+                    {"order_index": order.order_index, "error": str(err)}
+                    for order in orders
+                ]
+            else:
+                cancelled = [order.order_index for order in orders]
+        else:
+            # One signed cancel per order, submitted in sendTxBatch calls
+            legs = [
+                TxLeg(
+                    f"cancel_{order.order_index}",
+                    "sign_cancel_order",
+                    {
+                        "market_index": order.market_index,
+                        "order_index": order.order_index,
+                    },
+                )
+                for order in orders
+            ]
+            for order, result in zip(orders, await send_tx_batch(client, legs)):
+                if result["error"]:
+                    errors.append(
+                        {"order_index": order.order_index, "error": result["error"]}
+                    )
+                else:
+                    cancelled.append(order.order_index)
+
+        return jsonify(
+            {
+                "success": len(errors) == 0,
+                "cancelled_count": len(cancelled),
+                "cancelled_orders": cancelled,
+                "errors": errors if errors else None,
+            }
+        )
+
+    except Exception as e:
+        logger.exception("Error cancelling all orders")
+        return jsonify({"success": False, "error": str(e)}), 500
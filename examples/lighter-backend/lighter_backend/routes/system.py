@@ -0,0 +1,342 @@
+"""Health, metrics, info, market data, debug and job endpoints."""
+
+import time
+import logging
+from typing import Tuple, Dict
+
+from flask import request, jsonify
+
+from ..accounts import (
+    auth_token_cache,
+    client_pool,
+    current_account,
+    current_account_index,
+)
+from ..config import API_SECRET, BASE_URL, LIGHTER_ACCOUNT_INDEX, LIGHTER_ENVIRONMENT
+from ..events import stream_slots
+from ..execution import reset_client
+from ..http_pool import get_order_api
+from ..idempotency import idempotency_cache
+from ..jobs import job_manager
+from ..markets import market_registry
+from ..metrics import HTTP_CONNECTIONS, CallbackMetric, metrics
+from ..nonces import NonceSequencer
+from ..order_books import ORDER_BOOK_STREAM, OrderBook, order_book_feed
+from ..retry import retry_policy
+from ..tracing import request_profiler
+from ..warmup import worker_warmup
+from ..web import app, async_route, require_auth
+
+logger = logging.getLogger(__name__)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Liveness: the worker is up, whether or not it finished warming up."""
+    return jsonify(
+        {
+            "status": "ok",
+            "ready": worker_warmup.ready,
+            "environment": LIGHTER_ENVIRONMENT,
+            "account_index": LIGHTER_ACCOUNT_INDEX,
+            "base_url": BASE_URL,
+            "timestamp": int(time.time() * 1000),
+        }
+    )
+
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    """Readiness: 503 until the worker warm-up has completed."""
+    return jsonify({"ready": worker_warmup.ready, "warmup": worker_warmup.stats()}), (
+        200 if worker_warmup.ready else 503
+    )
+
+
+def _hit_ratio(hits: int, misses: int) -> float:
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+
+def _cache_lookups() -> Dict[Tuple[str, str], int]:
+    accounts = client_pool.accounts()
+    caches = {
+        "client_pool": (client_pool.hits, client_pool.misses),
+        "idempotency": (idempotency_cache.hits, idempotency_cache.misses),
+        "auth_token": (auth_token_cache.hits, auth_token_cache.misses),
+        "market_registry": (market_registry.hits, market_registry.misses),
+        "order_book_stream": (order_book_feed.hits, order_book_feed.fallbacks),
+        "account_stream": (
+            sum(a.state.hits for a in accounts),
+            sum(a.state.fallbacks for a in accounts),
+        ),
+        "order_store": (
+            sum(a.state.order_hits for a in accounts),
+            sum(a.state.order_fallbacks for a in accounts),
+        ),
+        "http_pool": (
+            HTTP_CONNECTIONS.value(outcome="reused"),
+            HTTP_CONNECTIONS.value(outcome="new"),
+        ),
+    }
+    lookups = {}
+    for cache, (hits, misses) in caches.items():
+        lookups[(cache, "hit")] = hits
+        lookups[(cache, "miss")] = misses
+    return lookups
+
+
+def _cache_hit_ratios() -> Dict[str, float]:
+    lookups = _cache_lookups()
+    caches = dict.fromkeys(cache for cache, _ in lookups)
+    return {c: _hit_ratio(lookups[(c, "hit")], lookups[(c, "miss")]) for c in caches}
+
+
+def _nonce_resync_ratios() -> Dict[str, float]:
+    return {
+        str(a.account_index): a.sequencer.stats().get("resync_ratio", 0)
+        for a in client_pool.accounts()
+        if isinstance(a.sequencer, NonceSequencer)
+    }
+
+
+metrics.register(
+    CallbackMetric(
+        "lighter_cache_lookups_total",
+        "Cache and pool lookups by outcome",
+        ("cache", "outcome"),
+        _cache_lookups,
+        kind="counter",
+    )
+)
+metrics.register(
+    CallbackMetric(
+        "lighter_cache_hit_ratio",
+        "Hit ratio of caches and pools since worker start",
+        ("cache",),
+        _cache_hit_ratios,
+    )
+)
+metrics.register(
+    CallbackMetric(
+        "lighter_nonce_resync_ratio",
+        "Nonce resyncs per nonce issued, per account",
+        ("account_index",),
+        _nonce_resync_ratios,
+    )
+)
+metrics.register(
+    CallbackMetric(
+        "lighter_submit_queue_depth",
+        "Transactions waiting for the submission writer, per account and API key",
+        ("account_index", "api_key_index"),
+        lambda: {
+            (a.account_index, k): depth
+            for a in client_pool.accounts()
+            for k, depth in a.submitter.stats()["depth"].items()
+        },
+    )
+)
+metrics.register(
+    CallbackMetric(
+        "lighter_client_pool_size",
+        "Accounts with a live client in this worker",
+        (),
+        lambda: {(): len(client_pool.accounts())},
+    )
+)
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus metrics of this worker."""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
+@app.route("/api/info", methods=["GET"])
+@require_auth
+def get_info():
+    """
+    Worker and account state. Only reads the pool: an account without a
+    context in this worker reports null for its per-account sections.
+    """
+    account_index = current_account_index()
+    account = client_pool.peek(account_index)
+    return jsonify(
+        {
+            "environment": LIGHTER_ENVIRONMENT,
+            "account_index": account_index,
+            "api_key_index": account.primary_key if account else None,
+            "api_keys": account.scheduler.stats() if account else None,
+            "base_url": BASE_URL,
+            "auth_required": bool(API_SECRET),
+            "retry": retry_policy.stats(),
+            "nonce": account.sequencer.stats() if account else None,
+            "submission": account.submitter.stats() if account else None,
+            "client_pool": client_pool.stats(),
+            "auth_tokens": auth_token_cache.stats(),
+            "markets": market_registry.stats(),
+            "order_books": order_book_feed.stats(),
+            "account_stream": account.state.stats() if account else None,
+            "event_stream": {
+                **(account.state.events.stats() if account else {}),
+                "slots": stream_slots.stats(),
+            },
+            "idempotency": idempotency_cache.stats(),
+            "jobs": job_manager.stats(),
+        }
+    )
+
+
+@app.route("/api/markets", methods=["GET"])
+@async_route
+async def get_markets():
+    """List market metadata (decimals, tick size, minimums) from the registry."""
+    try:
+        market_index = request.args.get("market_index", type=int)
+        if market_index is not None:
+            market = await market_registry.get(market_index)
+            if market is None:
+                return jsonify({"error": f"Unknown market_index {market_index}"}), 404
+            return jsonify(market.to_dict())
+
+        await market_registry.ensure_loaded()
+        markets = [m.to_dict() for m in market_registry.all()]
+        return jsonify({"markets": markets, "count": len(markets)})
+    except Exception as e:
+        logger.exception("Error getting markets")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/orderbook", methods=["GET"])
+@async_route
+async def get_orderbook():
+    """
+    Top of book and, with `size`, the worst price to fill it on each side.
+
+    Served from the local stream book when fresh, otherwise from REST.
+    """
+    try:
+        market_index = request.args.get("market_index", type=int)
+        if market_index is None:
+            return jsonify({"error": "market_index is required"}), 400
+        size = request.args.get("size", type=float)
+        depth = request.args.get("depth", 10, type=int)
+
+        book = order_book_feed.fresh_book(market_index) if ORDER_BOOK_STREAM else None
+        source = "stream"
+        if book is None:
+            if ORDER_BOOK_STREAM:
+                order_book_feed.subscribe(market_index)
+            orderbook = await get_order_api().order_book_orders(
+                market_id=market_index, limit=max(depth, 50 if size else 1)
+            )
+            book = OrderBook(market_index)
+            book.apply(
+                {
+                    "bids": [
+                        {"price": o.price, "size": o.remaining_base_amount}
+                        for o in orderbook.bids
+                    ],
+                    "asks": [
+                        {"price": o.price, "size": o.remaining_base_amount}
+                        for o in orderbook.asks
+                    ],
+                },
+                snapshot=True,
+            )
+            source = "rest"
+
+        result = book.to_dict(depth)
+        result.update(
+            {
+                "source": source,
+                "best_bid": book.bids.best(),
+                "best_ask": book.asks.best(),
+            }
+        )
+        if size:
+            result["sell_price"] = book.bids.walk(size)
+            result["buy_price"] = book.asks.walk(size)
+        return jsonify(result)
+    except Exception as e:
+        logger.exception("Error getting order book")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/nonce/refresh", methods=["POST"])
+@require_auth
+@async_route
+async def refresh_nonce_endpoint():
+    """Manually resync the nonce sequencer from the server (every API key)."""
+    try:
+        account = current_account()
+        nonces = {}
+        for api_key_index in account.scheduler.keys:
+            nonces[api_key_index] = await account.sequencer.resync(api_key_index)
+        return jsonify(
+            {
+                "success": True,
+                "message": "Nonce refreshed",
+                "next_nonce": nonces[account.primary_key],
+                "next_nonces": nonces,
+                "stats": account.sequencer.stats(),
+            }
+        )
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/client/reset", methods=["POST"])
+@require_auth
+def reset_client_endpoint():
+    """Reset the client entirely (re-initializes on next request)."""
+    try:
+        reset_client()
+        return jsonify({"success": True, "message": "Client reset"})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@require_auth
+def get_job(job_id: str):
+    """Status and result of an async job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found (unknown or expired)"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/debug/traces", methods=["GET", "DELETE"])
+@require_auth
+def debug_traces():
+    """Slowest sampled request traces of this worker (DELETE clears them)."""
+    if request.method == "DELETE":
+        request_profiler.clear()
+        return jsonify({"success": True, "message": "Traces cleared"})
+    return jsonify({**request_profiler.stats(), "traces": request_profiler.traces()})
+
+
+@app.route("/api/debug/profiling", methods=["POST"])
+@require_auth
+def configure_profiling():
+    """
+    Change the profiling sample rate or buffer size of this worker at runtime.
+
+    Body: {"sample_rate": 0.05, "top_n": 20}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        if "sample_rate" in data:
+            sample_rate = float(data["sample_rate"])
+            if not 0 <= sample_rate <= 1:
+                return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+            request_profiler.sample_rate = sample_rate
+        if "top_n" in data:
+            top_n = int(data["top_n"])
+            if top_n < 1:
+                return jsonify({"error": "top_n must be >= 1"}), 400
+            request_profiler.top_n = top_n
+    except (TypeError, ValueError):
+        return jsonify({"error": "sample_rate and top_n must be numbers"}), 400
+    return jsonify({"success": True, **request_profiler.stats()})
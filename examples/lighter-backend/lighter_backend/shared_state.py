@@ -0,0 +1,61 @@
+"""SQLite store the workers share jobs and idempotency keys through."""
+
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List
+
+from .config import FLASK_PORT
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH") or os.path.join(
+    tempfile.gettempdir(), f"lighter-backend-{FLASK_PORT}.sqlite3"
+)
+
+
+class SharedStore:
+    """
+    SQLite file shared by the workers of one host, for state that must not
+    depend on which worker a request lands on (async jobs, idempotency keys).
+
+    Each thread gets its own connection (and a forked worker new ones). WAL
+    lets readers run next to the single writer; busy_timeout makes writers
+    in other workers wait for the lock instead of failing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._schemas: List[str] = []
+        self._local = threading.local()
+
+    def define(self, schema: str):
+        """Register CREATE ... IF NOT EXISTS statements, run on every connection."""
+        self._schemas.append(schema)
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for schema in self._schemas:
+                conn.executescript(schema)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """A write transaction, serialized with the other workers."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+shared_store = SharedStore(SHARED_STATE_PATH)
@@ -0,0 +1,91 @@
+"""Base of the reconnecting WebSocket feeds."""
+
+import time
+import asyncio
+import logging
+
+from .config import BASE_URL
+from .http_pool import get_http_session
+
+logger = logging.getLogger(__name__)
+
+
+WS_URL = BASE_URL.replace("https://", "wss://").replace("http://", "ws://") + "/stream"
+
+
+class StreamFeed:
+    """
+    One reconnecting WebSocket connection to the Lighter `/stream` endpoint.
+
+    Subclasses send their subscriptions in `_on_connect` and consume
+    messages in `_handle`; pings are answered here. The connection runs as
+    a task on the worker loop and reconnects with exponential backoff.
+    """
+
+    name = "stream"
+
+    def __init__(self, url: str):
+        self.url = url
+        self._ws = None
+        self._task = None
+        self._last_message_at = 0.0
+        self.last_message_time = 0.0
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    def start(self):
+        """Start the connection task on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._ws = None
+            self._task = loop.create_task(self._run_forever())
+
+    def stop(self):
+        """Cancel the connection task (thread-safe)."""
+        task = self._task
+        if task is not None and not task.done():
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    async def _run_forever(self):
+        delay = 1
+        while True:
+            try:
+                session = get_http_session()
+                async with session.ws_connect(self.url, heartbeat=30) as ws:
+                    self._ws = ws
+                    delay = 1
+                    await self._on_connect(ws)
+                    async for msg in ws:
+                        self._last_message_at = time.monotonic()
+                        self.last_message_time = time.time()
+                        message = msg.json()
+                        if message.get("type") == "ping":
+                            await ws.send_json({"type": "pong"})
+                        else:
+                            await self._handle(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.name} stream error: {e}")
+            finally:
+                self._ws = None
+                self._on_disconnect()
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _on_connect(self, ws):
+        pass
+
+    def _on_disconnect(self):
+        pass
+
+    async def _handle(self, message: dict):
+        pass
+
+    def stats(self) -> dict:
+        return {"connected": self.connected, "reconnects": self.reconnects}
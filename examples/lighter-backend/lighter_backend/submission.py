@@ -0,0 +1,371 @@
+"""Per-key priority submission queues with one writer each."""
+
+import os
+import time
+import asyncio
+import itertools
+import contextvars
+import logging
+from typing import TYPE_CHECKING, Callable, Tuple, Optional, Dict, List
+
+from .metrics import (
+    Counter,
+    Histogram,
+    add_stage_spans,
+    collect_stages,
+    metrics,
+    record_stage,
+)
+from .transactions import TX_BATCH_MAX_SIZE, TxLeg, order_tx_params, sign_and_send
+
+if TYPE_CHECKING:
+    from .accounts import AccountContext
+
+logger = logging.getLogger(__name__)
+
+
+SUBMIT_QUEUE = os.getenv("SUBMIT_QUEUE", "true").lower() == "true"
+SUBMIT_QUEUE_SIZE = int(os.getenv("SUBMIT_QUEUE_SIZE", "1000"))
+SUBMIT_COALESCE_MAX = min(
+    int(os.getenv("SUBMIT_COALESCE_MAX", str(TX_BATCH_MAX_SIZE))), TX_BATCH_MAX_SIZE
+)
+
+# Error classes after which the legs of a coalesced send that did not go
+# through are resent alone: the exchange applied none of them
+RESEND_ALONE = ("nonce", "throttled", "rejected")
+
+# Lower goes first: cancels, then stop-losses and reduce-only market
+# closes, then amends, take-profits and leverage, then new entries
+PRIORITY_CANCEL, PRIORITY_PROTECT, PRIORITY_AMEND, PRIORITY_ENTRY = range(4)
+PRIORITY_NAMES = ("cancel", "protect", "amend", "entry")
+
+SUBMIT_BATCH_SIZE = metrics.register(
+    Histogram(
+        "lighter_submit_batch_size",
+        "Transactions per send of the submission writers",
+        (),
+        buckets=(1, 2, 4, 8, 16, 32, 50),
+    )
+)
+SUBMITTED = metrics.register(
+    Counter(
+        "lighter_submissions_total",
+        "Submissions queued for the writers, by priority",
+        ("priority",),
+    )
+)
+
+
+def operation_leg(operation: Callable, kwargs: dict) -> Optional[TxLeg]:
+    """
+    The sign_* leg equivalent to a SignerClient call, so it can be queued.
+    None for operations without one (they are executed directly).
+    """
+    client = getattr(operation, "__self__", None)
+    name = getattr(operation, "__name__", "")
+    if client is None:
+        return None
+    if name in (
+        "create_tp_order",
+        "create_tp_limit_order",
+        "create_sl_order",
+        "create_sl_limit_order",
+    ):
+        order_type = name[len("create_") : -len("_order")].replace("_", "-")
+        params = order_tx_params(client, order_type, **kwargs)
+        return TxLeg(order_type, "sign_create_order", params)
+    if name == "update_leverage":
+        params = {
+            "market_index": kwargs["market_index"],
+            # Same initial margin fraction SignerClient.update_leverage signs
+            "fraction": int(10_000 / kwargs["leverage"]),
+            "margin_mode": kwargs["margin_mode"],
+        }
+        return TxLeg(name, "sign_update_leverage", params)
+    if name in ("create_order", "cancel_order", "cancel_all_orders", "modify_order"):
+        return TxLeg(name, f"sign_{name}", dict(kwargs))
+    return None
+
+
+# tx_targets key of a cancel-all, which acts on every order
+ALL_ORDERS = ("all",)
+
+
+def tx_targets(leg: TxLeg) -> Tuple[tuple, ...]:
+    """
+    The orders a leg acts on, for ordering operations per order. Lighter
+    takes a client_order_index wherever an order_index is expected, so a
+    create and a later cancel/modify of it share the key. A cancel-all
+    acts on every order.
+    """
+    params = leg.params
+    if leg.sign_method == "sign_cancel_all_orders":
+        return (ALL_ORDERS,)
+    if leg.sign_method == "sign_create_order" and params.get("client_order_index"):
+        return ((params["market_index"], params["client_order_index"]),)
+    if leg.sign_method in ("sign_cancel_order", "sign_modify_order"):
+        return ((params["market_index"], params["order_index"]),)
+    return ()
+
+
+def tx_priority(client, leg: TxLeg) -> int:
+    if leg.sign_method in ("sign_cancel_order", "sign_cancel_all_orders"):
+        return PRIORITY_CANCEL
+    order_type = leg.params.get("order_type")
+    reduce_only = leg.params.get("reduce_only", False)
+    if order_type in (
+        client.ORDER_TYPE_STOP_LOSS,
+        client.ORDER_TYPE_STOP_LOSS_LIMIT,
+    ) or (reduce_only and order_type == client.ORDER_TYPE_MARKET):
+        return PRIORITY_PROTECT
+    if leg.sign_method == "sign_create_order" and not reduce_only:
+        return PRIORITY_ENTRY
+    return PRIORITY_AMEND
+
+
+def _failed(legs: List[TxLeg], error: str) -> List[dict]:
+    return [{"tx_hash": None, "error": error} for _ in legs]
+
+
+class SubmissionQueue:
+    """
+    One bounded priority queue and one writer task per API key.
+
+    Requests queue their transactions and wait; the writer takes the most
+    urgent submission plus whatever else is already waiting (up to
+    SUBMIT_COALESCE_MAX transactions), signs them with consecutive nonces
+    and sends them in one call. Only the writer uses the key's nonces, so
+    concurrent requests in a worker stop colliding on them. Within a
+    priority submissions keep their arrival order, and the legs of one
+    submission (a bracket, a batch chunk) stay together and in order.
+
+    A submission takes the priority of its least urgent leg, so riding
+    along with a stop-loss does not promote an entry. Priorities never
+    reorder operations on the same order (see `tx_targets`): a cancel or
+    modify waits until the submissions before it that touch its order
+    have been sent, on any key, and a cancel-all waits for everything
+    before it (and everything after waits for the cancel-all).
+    """
+
+    def __init__(self, account: "AccountContext"):
+        self.account = account
+        self._queues: Dict[int, asyncio.PriorityQueue] = {}
+        self._writers: Dict[int, asyncio.Task] = {}
+        self._loop = None
+        self._seq = itertools.count()
+        # Order key -> future of the last submission acting on that order
+        self._last_by_target: Dict[tuple, asyncio.Future] = {}
+        self._stopped = False
+        self.held = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.sends = 0
+        self.coalesced = 0
+        self.split = 0
+
+    def _queue(self, api_key_index: int) -> asyncio.PriorityQueue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queues = {}
+            self._writers = {}
+            self._loop = loop
+        queue = self._queues.get(api_key_index)
+        if queue is None:
+            queue = self._queues[api_key_index] = asyncio.PriorityQueue(
+                SUBMIT_QUEUE_SIZE
+            )
+            # Empty context: the writer must not hold on to the request
+            # (and Flask `g`) that happened to start it
+            self._writers[api_key_index] = contextvars.Context().run(
+                loop.create_task, self._drain(api_key_index, queue)
+            )
+        return queue
+
+    def _chain(self, legs: List[TxLeg], future: asyncio.Future) -> set:
+        """
+        Register `future` as the last submission acting on the orders of
+        `legs`; return the earlier, unsent submissions it has to wait for.
+        """
+        targets = {target for leg in legs for target in tx_targets(leg)}
+        if ALL_ORDERS in targets:
+            # After everything before it; whatever comes next waits for it
+            waits = set(self._last_by_target.values())
+            self._last_by_target = {ALL_ORDERS: future}
+        else:
+            waits = {self._last_by_target.get(t) for t in targets | {ALL_ORDERS}}
+            for target in targets:
+                self._last_by_target[target] = future
+        return {w for w in waits if w is not None and not w.done()}
+
+    def _unchain(self, future: asyncio.Future):
+        for target, last in list(self._last_by_target.items()):
+            if last is future:
+                del self._last_by_target[target]
+
+    async def submit(self, client, api_key_index: int, legs: List[TxLeg]) -> List[dict]:
+        """
+        Queue legs on a key and wait for one {"tx_hash", "error"} per leg.
+
+        The writer hands back the stage spans (nonce_acquire, sign, send) of
+        the sends that carried the legs; they join the request's, and
+        `queue` covers the rest of the wait for the result.
+        """
+        if self._stopped:
+            return _failed(legs, "Submission queue stopped")
+        queue = self._queue(api_key_index)
+        future = asyncio.get_running_loop().create_future()
+        priority = max(tx_priority(client, leg) for leg in legs)
+        enqueued = time.perf_counter()
+        try:
+            waits = self._chain(legs, future)
+            if waits:
+                # Earlier operations on the same orders go first
+                self.held += 1
+                await asyncio.wait(waits)
+            try:
+                queue.put_nowait(
+                    (priority, next(self._seq), client, legs, future, enqueued)
+                )
+            except asyncio.QueueFull:
+                self.rejected += 1
+                results = _failed(legs, "Submission queue full")
+                future.set_result((results, []))
+                return results
+            self.submitted += 1
+            SUBMITTED.inc(priority=PRIORITY_NAMES[priority])
+            results, spans = await future
+        finally:
+            if not future.done():
+                future.cancel()
+            self._unchain(future)
+        add_stage_spans(spans)
+        busy = sum(elapsed for _, _, elapsed in spans)
+        record_stage("queue", enqueued, time.perf_counter() - busy)
+        return results
+
+    def _take(self, queue: asyncio.PriorityQueue, first: tuple) -> List[tuple]:
+        """`first` plus the waiting submissions that fit in one send."""
+        batch = [first]
+        size = len(first[3])
+        while size < SUBMIT_COALESCE_MAX and not queue.empty():
+            item = queue.get_nowait()
+            if item[2] is not first[2] or size + len(item[3]) > SUBMIT_COALESCE_MAX:
+                # Another client (account reset) or too big: next round
+                queue.put_nowait(item)
+                break
+            batch.append(item)
+            size += len(item[3])
+        return [item for item in batch if not item[4].done()]
+
+    async def _drain(self, api_key_index: int, queue: asyncio.PriorityQueue):
+        batch = []
+        try:
+            while True:
+                batch = self._take(queue, await queue.get())
+                if not batch:
+                    continue
+                spans = [[] for _ in batch]
+                try:
+                    results = await self._send(api_key_index, batch, spans)
+                except Exception as e:
+                    logger.warning(f"Submission on API key {api_key_index} failed: {e}")
+                    results = [
+                        {"tx_hash": None, "error": str(e)}
+                        for item in batch
+                        for _ in item[3]
+                    ]
+                self._resolve(batch, results, spans)
+                batch = []
+        except asyncio.CancelledError:
+            # Stopped (account evicted or worker exiting): answer the
+            # submission being sent and everything still queued, or their
+            # requests would wait forever
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            error = "Submission queue stopped"
+            for item in batch:
+                self._resolve([item], _failed(item[3], error), [[]])
+            raise
+
+    @staticmethod
+    def _resolve(batch: List[tuple], results: List[dict], spans: List[list]):
+        for item, item_spans in zip(batch, spans):
+            count = len(item[3])
+            if not item[4].done():
+                item[4].set_result((results[:count], item_spans))
+            results = results[count:]
+
+    async def _send(
+        self, api_key_index: int, batch: List[tuple], spans: List[list]
+    ) -> List[dict]:
+        """
+        Send a batch; the stage spans of every send go into `spans`, one
+        list per submission, for the requests waiting on them.
+        """
+        client = batch[0][2]
+        legs = [leg for item in batch for leg in item[3]]
+        self.sends += 1
+        SUBMIT_BATCH_SIZE.observe(len(legs))
+        if len(batch) == 1:
+            with collect_stages() as sent:
+                results = await sign_and_send(client, self.account, api_key_index, legs)
+            spans[0].extend(sent)
+            return results
+
+        # One submission's failure (a nonce gap, a rejected leg, throttling)
+        # stops every leg after it in the send, so a coalesced send gets one
+        # attempt; after that each submission resends the legs that were not
+        # applied alone, and ends up as it would have without coalescing.
+        # Legs that may have been applied ("unavailable") are never resent
+        self.coalesced += len(batch) - 1
+        with collect_stages() as sent:
+            results = await sign_and_send(
+                client, self.account, api_key_index, legs, attempts=1
+            )
+        for item_spans in spans:
+            item_spans.extend(sent)
+        if not any(result.get("error_class") in RESEND_ALONE for result in results):
+            return results
+        self.split += 1
+        start = 0
+        for item, item_spans in zip(batch, spans):
+            item_results = results[start : start + len(item[3])]
+            unsent = [
+                n
+                for n, result in enumerate(item_results)
+                if result.get("error_class") in RESEND_ALONE
+            ]
+            if unsent:
+                self.sends += 1
+                SUBMIT_BATCH_SIZE.observe(len(unsent))
+                with collect_stages() as sent:
+                    resent = await sign_and_send(
+                        client,
+                        self.account,
+                        api_key_index,
+                        [item[3][n] for n in unsent],
+                    )
+                item_spans.extend(sent)
+                for n, result in zip(unsent, resent):
+                    results[start + n] = result
+            start += len(item[3])
+        return results
+
+    def stop(self):
+        self._stopped = True
+        for task in self._writers.values():
+            if not task.done():
+                task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SUBMIT_QUEUE,
+            "depth": {k: q.qsize() for k, q in self._queues.items()},
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "sends": self.sends,
+            "coalesced": self.coalesced,
+            "split": self.split,
+            "held": self.held,
+            "coalesce_max": SUBMIT_COALESCE_MAX,
+        }
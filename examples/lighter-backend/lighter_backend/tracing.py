@@ -0,0 +1,108 @@
+"""Server-Timing header and sampled cProfile request traces."""
+
+import io
+import os
+import heapq
+import random
+import pstats
+import cProfile
+import threading
+from typing import Any, Coroutine, Dict, List
+
+from flask import g
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "20"))
+
+# Stage names as they appear in Server-Timing
+SERVER_TIMING_NAMES = {
+    "orderbook": "book",
+    "nonce_acquire": "nonce",
+    "auth_token": "auth",
+}
+
+
+def server_timing_header(spans: list, total: float) -> str:
+    """Server-Timing value: summed duration per stage plus the total, in ms."""
+    durations: Dict[str, float] = {}
+    for stage, _, elapsed in spans:
+        name = SERVER_TIMING_NAMES.get(stage, stage)
+        durations[name] = durations.get(name, 0.0) + elapsed
+    parts = [f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in durations.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class RequestProfiler:
+    """
+    Samples a fraction of requests through cProfile and keeps the N slowest
+    traces (stage spans plus the hottest functions) in memory.
+
+    Route coroutines share the worker loop, so a profile also contains what
+    other requests ran on the loop meanwhile; one request is profiled at a
+    time and the others in that window are traced without a profile.
+    """
+
+    def __init__(self, sample_rate: float, top_n: int):
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.sampled = 0
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._seq = 0
+        # Min-heap of (duration, seq, trace): the fastest kept trace is evicted first
+        self._traces: list = []
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def profile(self, coro: Coroutine) -> Any:
+        """Await `coro` with cProfile enabled on the loop thread, if it is free."""
+        if not self._busy.acquire(blocking=False):
+            return await coro
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return await coro
+        finally:
+            profiler.disable()
+            self._busy.release()
+            g.profiler = profiler
+
+    def record(self, trace: dict, duration: float):
+        with self._lock:
+            self.sampled += 1
+            self._seq += 1
+            heapq.heappush(self._traces, (duration, self._seq, trace))
+            while len(self._traces) > self.top_n:
+                heapq.heappop(self._traces)
+
+    def traces(self) -> List[dict]:
+        """Kept traces, slowest first."""
+        with self._lock:
+            items = sorted(self._traces, reverse=True)
+        return [trace for _, _, trace in items]
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "top_n": self.top_n,
+            "sampled": self.sampled,
+            "kept": len(self._traces),
+        }
+
+
+def profile_summary(profiler, limit: int = 25) -> List[str]:
+    """The `limit` functions with the highest cumulative time, as text lines."""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return [line.rstrip() for line in stream.getvalue().splitlines() if line.strip()]
+
+
+request_profiler = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_TOP_N)
@@ -0,0 +1,243 @@
+"""Signing and sending transactions, one by one or in batches."""
+
+import os
+import json
+import asyncio
+import logging
+from typing import List, NamedTuple
+
+from .metrics import NONCE_RETRIES, timed
+from .retry import NONCE_RETRY_ATTEMPTS, retry_policy
+
+logger = logging.getLogger(__name__)
+
+
+TX_BATCH_MAX_SIZE = int(os.getenv("TX_BATCH_MAX_SIZE", "50"))
+
+
+class TxLeg(NamedTuple):
+    """One transaction to sign: a SignerClient sign_* method and its kwargs."""
+
+    name: str
+    sign_method: str
+    params: dict
+
+
+def order_tx_params(
+    client,
+    order_type: str,
+    market_index: int,
+    client_order_index: int,
+    base_amount: int,
+    price: int,
+    is_ask: bool,
+    reduce_only: bool = False,
+    trigger_price: int = 0,
+    post_only: bool = False,
+) -> dict:
+    """
+    Build sign_create_order kwargs for an order type.
+
+    Mirrors what SignerClient.create_order/create_tp_order/... pass, so a
+    signed leg is the same transaction the single-order routes send.
+    """
+    order_types = {
+        "limit": (client.ORDER_TYPE_LIMIT, client.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME),
+        "market": (
+            client.ORDER_TYPE_MARKET,
+            client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
+        ),
+        "tp": (
+            client.ORDER_TYPE_TAKE_PROFIT,
+            client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
+        ),
+        "tp-limit": (
+            client.ORDER_TYPE_TAKE_PROFIT_LIMIT,
+            client.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME,
+        ),
+        "sl": (
+            client.ORDER_TYPE_STOP_LOSS,
+            client.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
+        ),
+        "sl-limit": (
+            client.ORDER_TYPE_STOP_LOSS_LIMIT,
+            client.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME,
+        ),
+    }
+    if order_type not in order_types:
+        raise ValueError(f"Unknown order type: {order_type}")
+
+    sdk_type, time_in_force = order_types[order_type]
+    if order_type == "limit" and post_only:
+        time_in_force = client.ORDER_TIME_IN_FORCE_POST_ONLY
+
+    return {
+        "market_index": market_index,
+        "client_order_index": client_order_index,
+        "base_amount": base_amount,
+        "price": price,
+        "is_ask": is_ask,
+        "order_type": sdk_type,
+        "time_in_force": time_in_force,
+        "reduce_only": reduce_only,
+        "trigger_price": trigger_price,
+        "order_expiry": (
+            client.DEFAULT_IOC_EXPIRY
+            if order_type == "market"
+            else client.DEFAULT_28_DAY_ORDER_EXPIRY
+        ),
+    }
+
+
+def _sign_legs(client, legs: List[TxLeg], first_nonce: int, api_key_index: int):
+    """
+    Sign legs with consecutive nonces starting at first_nonce.
+
+    A leg that fails to sign does not take a nonce. Returns the signed
+    (index, tx_type, tx_info, tx_hash) tuples and a {index: error} dict.
+    """
+    signed = []
+    errors = {}
+    for i, leg in enumerate(legs):
+        sign = getattr(client, leg.sign_method)
+        tx_type, tx_info, tx_hash, err = sign(
+            **leg.params,
+            nonce=first_nonce + len(signed),
+            api_key_index=api_key_index,
+        )
+        if err:
+            errors[i] = str(err)
+        else:
+            signed.append((i, tx_type, tx_info, tx_hash))
+    return signed, errors
+
+
+async def sign_and_send(
+    client,
+    account,
+    api_key_index: int,
+    legs: List[TxLeg],
+    attempts: int = NONCE_RETRY_ATTEMPTS,
+) -> List[dict]:
+    """
+    Sign legs with consecutive nonces of one key and submit them: sendTx
+    for a single leg, one sendTxBatch call otherwise (up to
+    TX_BATCH_MAX_SIZE legs). Failures are retried as `retry_policy`
+    decides, up to `attempts` sends in total.
+    Returns one {"tx_hash", "error"} dict per leg, in the same order;
+    legs that failed to send also carry the "error_class" of the failure.
+
+    The exchange applies a batch in order up to the first leg it rejects.
+    After a nonce error or a rejection on a batch the key is resynced
+    while still held, the legs the new next nonce shows as applied are
+    reported as sent, and only the rest is retried (or failed).
+    """
+    nonce_sequencer = account.sequencer
+    kind = "single" if len(legs) == 1 else "batch"
+    results = [{"tx_hash": None, "error": None} for _ in legs]
+
+    blocked = retry_policy.admit()
+    if blocked:
+        for result in results:
+            result["error"] = blocked
+        return results
+
+    # Indexes (into legs) still to be sent
+    pending = list(range(len(legs)))
+    delay = 0.0
+    for attempt in range(attempts):
+        if delay:
+            await asyncio.sleep(delay)
+
+        async with nonce_sequencer.reserve(api_key_index, len(pending)) as first:
+            signed, errors = _sign_legs(
+                client, [legs[i] for i in pending], first, api_key_index
+            )
+            for i, error in errors.items():
+                results[pending[i]]["error"] = error
+            signed = [(pending[i], *rest) for i, *rest in signed]
+            if len(signed) < len(pending):
+                # Hand back the nonces of legs that failed to sign
+                nonce_sequencer.release(api_key_index, first + len(signed))
+            if not signed:
+                return results
+
+            try:
+                with timed("send"):
+                    if len(signed) == 1:
+                        _, tx_type, tx_info, _ = signed[0]
+                        response = await client.tx_api.send_tx(
+                            tx_type=tx_type, tx_info=tx_info
+                        )
+                        tx_hashes = [response.tx_hash]
+                    else:
+                        response = await client.tx_api.send_tx_batch(
+                            tx_types=json.dumps([leg[1] for leg in signed]),
+                            tx_infos=json.dumps([leg[2] for leg in signed]),
+                        )
+                        tx_hashes = getattr(response, "tx_hash", None) or []
+            except Exception as e:
+                error_class = retry_policy.record(e)
+                applied = 0
+                if error_class in ("nonce", "rejected") and len(signed) > 1:
+                    try:
+                        applied = await _applied_legs(
+                            nonce_sequencer, api_key_index, first, len(signed)
+                        )
+                    except Exception as resync_error:
+                        logger.warning(f"Nonce resync failed: {resync_error}")
+                        # Which legs went through is unknown: do not resend
+                        nonce_sequencer.invalidate(api_key_index)
+                        error_class = "unavailable"
+                elif error_class == "nonce":
+                    nonce_sequencer.report_gap(api_key_index)
+                elif error_class == "throttled" or (
+                    len(signed) == 1 and error_class == "rejected"
+                ):
+                    # Nothing was applied, so the nonces are still free
+                    nonce_sequencer.release(api_key_index, first)
+                else:
+                    # The exchange may or may not have accepted (part of) it
+                    nonce_sequencer.invalidate(api_key_index)
+
+                for i, _, _, tx_hash in signed[:applied]:
+                    results[i]["tx_hash"] = tx_hash
+                signed = signed[applied:]
+                pending = [i for i, _, _, _ in signed]
+
+                delay = retry_policy.delay(error_class, attempt, attempts)
+                if delay is not None:
+                    if error_class == "nonce":
+                        NONCE_RETRIES.inc(kind=kind)
+                    logger.warning(
+                        f"{error_class} error on {kind} attempt {attempt + 1}/{attempts}, "
+                        f"retrying {len(pending)} of {len(legs)} in {delay * 1000:.0f} ms: {e}"
+                    )
+                    continue
+
+                error = (
+                    f"Nonce error after {attempt + 1} attempts: {e}"
+                    if error_class == "nonce"
+                    else str(e)
+                )
+                for i, _, _, _ in signed:
+                    results[i]["error"] = error
+                    results[i]["error_class"] = error_class
+                return results
+
+            retry_policy.record(None)
+            for n, (i, _, _, _) in enumerate(signed):
+                results[i]["tx_hash"] = tx_hashes[n] if n < len(tx_hashes) else None
+            return results
+
+
+async def _applied_legs(nonce_sequencer, api_key_index: int, first: int, count: int):
+    """
+    How many of `count` batch legs signed from `first` the exchange applied
+    before rejecting one, from its next nonce (fetched with the key held).
+    A next nonce outside the batch means the key was used elsewhere, and
+    none of ours went through.
+    """
+    next_nonce = await nonce_sequencer.resync_held(api_key_index)
+    applied = next_nonce - first
+    return applied if 0 <= applied < count else 0
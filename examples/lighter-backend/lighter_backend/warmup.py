@@ -0,0 +1,160 @@
+"""Per-worker warm-up of clients, markets, nonces, connections and streams."""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict
+
+from .account_state import ACCOUNT_STREAM
+from .accounts import client_pool
+from .config import BASE_URL, LIGHTER_ACCOUNT_INDEX
+from .event_loop import get_event_loop
+from .http_pool import get_http_session
+from .markets import MARKET_PREFETCH, market_registry
+from .nonces import NonceSequencer
+from .order_books import ORDER_BOOK_MARKETS, ORDER_BOOK_STREAM, order_book_feed
+from .web import app
+
+logger = logging.getLogger(__name__)
+
+
+WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+WARMUP_RETRY_MAX_S = float(os.getenv("WARMUP_RETRY_MAX_S", "30"))
+
+
+class WorkerWarmup:
+    """
+    Does the first-request work when the worker boots: market registry,
+    SignerClient + check_client, nonces, HTTP connections, an auth token
+    and the streams. The worker reports ready once every step succeeded;
+    failed steps are retried in the background with backoff.
+
+    Only server processes start it: gunicorn.conf.py calls `start()` from
+    post_worker_init, `python app.py` before serving, and other servers on
+    the first request. Importing app.py (the nonce sequencer process, the
+    benchmark) does not. `start()` is keyed by pid, so every forked worker
+    warms itself up.
+    """
+
+    def __init__(self):
+        self.state = "pending"
+        self.steps: Dict[str, dict] = {}
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self._pid = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "disabled")
+
+    def start(self):
+        """Run the warm-up on the worker loop (idempotent per process)."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        loop = get_event_loop()
+        if not WARMUP:
+            self.state = "disabled"
+            # Still load market metadata and the configured order books at
+            # boot, so the first order decimals and prices locally
+            if MARKET_PREFETCH:
+                loop.call_soon_threadsafe(market_registry.start)
+            if ORDER_BOOK_STREAM:
+                for market_index in ORDER_BOOK_MARKETS:
+                    loop.call_soon_threadsafe(order_book_feed.subscribe, market_index)
+            return
+        self.state, self.steps = "running", {}
+        asyncio.run_coroutine_threadsafe(self.run(), loop)
+
+    async def _markets(self):
+        if MARKET_PREFETCH:
+            await market_registry.ensure_loaded()
+
+    async def _client(self):
+        account = client_pool.get(LIGHTER_ACCOUNT_INDEX)
+        # check_client runs inside (in the executor); paid here once
+        await account.get_client()
+
+    async def _nonces(self):
+        account = client_pool.get(LIGHTER_ACCOUNT_INDEX)
+        if isinstance(account.sequencer, NonceSequencer):
+            for api_key_index in account.scheduler.keys:
+                await account.sequencer.resync(api_key_index)
+
+    async def _connections(self):
+        # Open several keep-alive connections (TCP + TLS) at once; the
+        # response itself does not matter
+        session = get_http_session()
+
+        async def touch():
+            async with session.get(f"{BASE_URL}/") as resp:
+                await resp.read()
+
+        await asyncio.gather(*(touch() for _ in range(WARMUP_CONNECTIONS)))
+
+    async def _auth_token(self):
+        _, _, err = await client_pool.get(LIGHTER_ACCOUNT_INDEX).auth_token()
+        if err:
+            raise Exception(err)
+
+    async def _streams(self):
+        if ORDER_BOOK_STREAM:
+            for market_index in ORDER_BOOK_MARKETS:
+                order_book_feed.subscribe(market_index)
+        if ACCOUNT_STREAM:
+            client_pool.get(LIGHTER_ACCOUNT_INDEX).state.start()
+
+    async def run(self):
+        self.started_at = time.time()
+        steps = {
+            "markets": self._markets,
+            "client": self._client,
+            "nonces": self._nonces,
+            "connections": self._connections,
+            "auth_token": self._auth_token,
+            "streams": self._streams,
+        }
+        pending = list(steps)
+        delay = 1.0
+        while True:
+            for name in pending:
+                started = time.perf_counter()
+                try:
+                    await steps[name]()
+                    self.steps[name] = {"ok": True}
+                except Exception as e:
+                    self.steps[name] = {"ok": False, "error": str(e)}
+                    logger.warning(f"Warm-up step {name} failed: {e}")
+                self.steps[name]["ms"] = round(
+                    (time.perf_counter() - started) * 1000, 1
+                )
+            pending = [name for name in steps if not self.steps[name]["ok"]]
+            if not pending:
+                break
+            self.state = "retrying"
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_S)
+        self.state = "ready"
+        self.finished_at = time.time()
+        logger.info(
+            f"Worker warm-up done in {(self.finished_at - self.started_at) * 1000:.0f} ms"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "steps": self.steps,
+            "started_at": int(self.started_at * 1000),
+            "finished_at": int(self.finished_at * 1000) if self.finished_at else None,
+        }
+
+
+worker_warmup = WorkerWarmup()
+
+
+@app.before_request
+def start_worker_warmup():
+    # Servers without the gunicorn hook warm up on their first request
+    worker_warmup.start()
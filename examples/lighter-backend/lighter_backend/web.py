@@ -0,0 +1,118 @@
+"""The Flask app, request hooks and route decorators."""
+
+import time
+from functools import wraps
+
+from flask import Flask, request, jsonify, g
+
+from .config import API_SECRET, LIGHTER_ACCOUNT_INDEXES
+from .event_loop import run_async
+from .metrics import HTTP_LATENCY, HTTP_REQUESTS, timed
+from .tracing import (
+    SERVER_TIMING,
+    SERVER_TIMING_NAMES,
+    profile_summary,
+    request_profiler,
+    server_timing_header,
+)
+
+app = Flask(__name__)
+
+
+def async_route(f):
+    """Decorator for async routes (runs them on the worker event loop)."""
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        coro = f(*args, **kwargs)
+        if g.get("traced"):
+            coro = request_profiler.profile(coro)
+        return run_async(coro)
+
+    return wrapper
+
+
+def require_auth(f):
+    """Decorator to require API_SECRET authentication."""
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if API_SECRET:
+            auth_header = request.headers.get("X-API-Secret", "")
+            if auth_header != API_SECRET:
+                return jsonify({"error": "Unauthorized"}), 401
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.stage_spans = []
+    g.traced = request_profiler.should_sample()
+    if request.is_json:
+        # Parsed once here; routes and hooks reuse Flask's cached body
+        with timed("parse"):
+            request.get_json(silent=True)
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_LATENCY.observe(elapsed, route=route, method=request.method)
+        HTTP_REQUESTS.inc(
+            route=route, method=request.method, status=response.status_code
+        )
+        spans = g.get("stage_spans") or []
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = server_timing_header(spans, elapsed)
+        if g.get("traced"):
+            record_trace(route, response.status_code, started, elapsed, spans)
+    return response
+
+
+def record_trace(route: str, status: int, started: float, elapsed: float, spans: list):
+    """Keep a sampled request in the slowest-traces buffer."""
+    trace = {
+        "route": route,
+        "method": request.method,
+        "status": status,
+        "account_index": g.get("account_index"),
+        "at": int(time.time() * 1000),
+        "duration_ms": round(elapsed * 1000, 3),
+        "stages": [
+            {
+                "stage": SERVER_TIMING_NAMES.get(stage, stage),
+                "start_ms": round((stage_started - started) * 1000, 3),
+                "duration_ms": round(stage_elapsed * 1000, 3),
+            }
+            for stage, stage_started, stage_elapsed in spans
+        ],
+        "profile": profile_summary(g.profiler) if g.get("profiler") else None,
+    }
+    request_profiler.record(trace, elapsed)
+
+
+@app.before_request
+def resolve_account():
+    """Validate the optional account_index of a request (query string or JSON body)."""
+    value = request.args.get("account_index")
+    if value is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            value = body.get("account_index")
+    g.account_index = None
+    if value is None:
+        return None
+    try:
+        account_index = int(value)
+    except (TypeError, ValueError):
+        return jsonify({"error": "account_index must be an integer"}), 400
+    if LIGHTER_ACCOUNT_INDEXES and account_index not in LIGHTER_ACCOUNT_INDEXES:
+        return jsonify({"error": f"account_index {account_index} is not enabled"}), 403
+    g.account_index = account_index
+    return None
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Read at import time by lighter_backend: no warm-up, and a shared store of
+# the tests' own rather than the one a backend on this host may be using
+os.environ["WARMUP"] = "false"
+os.environ["SHARED_STATE_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="lighter-backend-tests-"), "state.sqlite3"
+)
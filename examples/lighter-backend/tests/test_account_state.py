@@ -0,0 +1,51 @@
+import time
+import asyncio
+
+from lighter_backend import account_state
+from lighter_backend.account_state import AccountStateFeed
+
+
+class Feed(AccountStateFeed):
+    """A connected feed whose REST fetch only counts calls."""
+
+    def __init__(self):
+        super().__init__("ws://unused", 1, None)
+        self.fetches = 0
+
+    def start(self):
+        pass
+
+    def fresh(self) -> bool:
+        return True
+
+    async def _fetch(self):
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        self.account = {"collateral": str(self.fetches)}
+        self.account_as_of = time.time()
+
+
+def test_stream_snapshot_refetches_stale_balances_once(monkeypatch):
+    monkeypatch.setattr(account_state, "ACCOUNT_REST_TTL_S", 60)
+    feed = Feed()
+
+    async def run():
+        await asyncio.gather(*(feed.snapshot(need_account=True) for _ in range(5)))
+        return await feed.snapshot(need_account=True)
+
+    _, source, _ = asyncio.run(run())
+    assert source == "stream"
+    assert feed.fetches == 1
+    assert feed.account == {"collateral": "1"}
+
+
+def test_stream_snapshot_refetches_balances_after_the_ttl(monkeypatch):
+    monkeypatch.setattr(account_state, "ACCOUNT_REST_TTL_S", 60)
+    feed = Feed()
+    asyncio.run(feed.snapshot(need_account=True))
+    feed.account_as_of -= 61
+    asyncio.run(feed.snapshot(need_account=True))
+    assert feed.account == {"collateral": "2"}
+    # Positions alone never wait on REST
+    asyncio.run(feed.snapshot())
+    assert feed.fetches == 2
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+from flask import g
+
+from lighter_backend.accounts import ClientPool, client_pool, current_account
+from lighter_backend.config import LIGHTER_ACCOUNT_INDEX
+from lighter_backend.routes import system  # noqa: F401 (registers the routes)
+from lighter_backend.web import app
+
+
+def test_pool_reuses_contexts():
+    pool = ClientPool(2)
+    first = pool.get(1)
+    assert pool.get(1) is first
+    assert (pool.hits, pool.misses) == (1, 1)
+
+
+def test_pool_evicts_least_recently_used():
+    pool = ClientPool(2)
+    one, two = pool.get(1), pool.get(2)
+    pool.get(1)
+    pool.get(3)
+    assert pool.peek(2) is None
+    assert pool.peek(1) is one
+    assert pool.stats()["accounts"] == [1, 3]
+    assert pool.evictions == 1
+    # An evicted account gets a fresh context (and nonces) when used again
+    assert pool.get(2) is not two
+
+
+def test_pool_only_evicts_idle_accounts():
+    pool = ClientPool(2)
+    one = pool.get(1)
+    pool.get(2)
+    with one.scheduler.use():
+        pool.get(3)
+        assert pool.peek(1) is one
+        assert pool.stats()["accounts"] == [1, 3]
+        pool.get(4)
+        assert pool.stats()["accounts"] == [1, 4]
+    pool.get(5)
+    assert pool.stats()["accounts"] == [4, 5]
+
+
+def test_pool_grows_while_every_account_is_busy():
+    pool = ClientPool(1)
+    one = pool.get(1)
+    with one.scheduler.use():
+        pool.get(2)
+        assert pool.stats()["accounts"] == [1, 2]
+    pool.get(3)
+    assert pool.stats()["accounts"] == [3]
+
+
+def test_new_context_shares_the_sequencer_of_an_evicted_one():
+    pool = ClientPool(1)
+    evicted = pool.get(1)
+    pool.get(2)
+    assert pool.peek(1) is None
+    # Still referenced (a request about to use it): same nonces
+    assert pool.get(1).sequencer is evicted.sequencer
+
+
+def test_peek_does_not_refresh_an_account():
+    pool = ClientPool(2)
+    pool.get(1)
+    pool.get(2)
+    pool.peek(1)
+    pool.get(3)
+    assert pool.peek(1) is None
+
+
+def test_context_uses_the_account_keys():
+    account = ClientPool(1).get(7)
+    assert account.account_index == 7
+    assert account.primary_key == next(iter(account.keys))
+    assert account.scheduler.keys == list(account.keys)
+    assert account.state.account_index == 7
+
+
+def test_current_account_follows_the_request():
+    with app.test_request_context("/"):
+        assert current_account().account_index == LIGHTER_ACCOUNT_INDEX
+        g.account_index = 42
+        assert current_account().account_index == 42
+    assert current_account().account_index == LIGHTER_ACCOUNT_INDEX
+
+
+def test_info_does_not_create_a_context():
+    response = app.test_client().get("/api/info?account_index=987654")
+    assert response.status_code == 200
+    assert response.get_json()["account_index"] == 987654
+    assert response.get_json()["nonce"] is None
+    assert client_pool.peek(987654) is None
+
+
+def test_client_is_built_once_off_the_loop_thread(monkeypatch):
+    account = ClientPool(1).get(8)
+    threads = []
+
+    def build():
+        threads.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(account, "_build_client", build)
+    monkeypatch.setattr(account, "_wire_client", lambda client: client)
+
+    async def run():
+        return await asyncio.gather(account.get_client(), account.get_client())
+
+    first, second = asyncio.run(run())
+    assert first is second is account.client
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
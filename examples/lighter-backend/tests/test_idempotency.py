@@ -0,0 +1,169 @@
+import os
+import sys
+import uuid
+import threading
+import subprocess
+
+from flask import Response, jsonify
+
+from lighter_backend.idempotency import ClientOrderIds, idempotency_cache, idempotent
+from lighter_backend.shared_state import SharedStore
+from lighter_backend.web import app
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def new_key() -> str:
+    return uuid.uuid4().hex
+
+
+def test_first_claim_owns_the_key():
+    key = new_key()
+    entry, owner = idempotency_cache.claim(key, "f1")
+    assert owner
+    again, owner = idempotency_cache.claim(key, "f1")
+    assert not owner
+    assert again.owner == entry.owner
+    assert not again.done
+
+
+def test_completed_response_is_replayed():
+    key = new_key()
+    entry, _ = idempotency_cache.claim(key, "f1")
+    idempotency_cache.complete(key, entry, Response('{"ok":1}', 200, mimetype="x/y"))
+    replay, owner = idempotency_cache.claim(key, "f1")
+    assert not owner
+    assert replay.response == (b'{"ok":1}', 200, "x/y")
+
+
+def test_released_key_can_be_claimed_again():
+    key = new_key()
+    entry, _ = idempotency_cache.claim(key, "f1")
+    idempotency_cache.release(key, entry)
+    _, owner = idempotency_cache.claim(key, "f1")
+    assert owner
+
+
+def test_wait_returns_the_owners_response():
+    key = new_key()
+    entry, _ = idempotency_cache.claim(key, "f1")
+    waiter, _ = idempotency_cache.claim(key, "f1")
+    timer = threading.Timer(
+        0.05,
+        idempotency_cache.complete,
+        (key, entry, Response("done", 201, mimetype="text/plain")),
+    )
+    timer.start()
+    finished = idempotency_cache.wait(key, waiter, timeout=5)
+    timer.join()
+    assert finished.response == (b"done", 201, "text/plain")
+
+
+def test_wait_times_out_or_sees_a_release():
+    key = new_key()
+    entry, _ = idempotency_cache.claim(key, "f1")
+    assert idempotency_cache.wait(key, entry, timeout=0.05) is None
+    idempotency_cache.release(key, entry)
+    released = idempotency_cache.wait(key, entry, timeout=0.05)
+    assert released is not None and released.response is None
+
+
+def test_lapsed_lease_frees_the_key():
+    key = new_key()
+    lease, idempotency_cache.lease = idempotency_cache.lease, -1
+    try:
+        idempotency_cache.claim(key, "f1")
+    finally:
+        idempotency_cache.lease = lease
+    _, owner = idempotency_cache.claim(key, "f1")
+    assert owner
+
+
+def test_claim_is_seen_by_another_process():
+    key = new_key()
+    entry, _ = idempotency_cache.claim(key, "f1")
+    idempotency_cache.complete(key, entry, Response("first", 200))
+    # A second worker: same SHARED_STATE_PATH, its own process
+    script = (
+        "from lighter_backend.idempotency import idempotency_cache\n"
+        f"entry, owner = idempotency_cache.claim({key!r}, 'f1')\n"
+        "print(owner, entry.response[0].decode())\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["False", "first"]
+
+
+def make_view(status: int = 200):
+    calls = []
+
+    @idempotent
+    def view():
+        calls.append(1)
+        return jsonify({"calls": len(calls)}), status
+
+    return view, calls
+
+
+def post(view, body: dict, key: str):
+    with app.test_request_context(
+        "/api/order/limit", method="POST", json=body, headers={"Idempotency-Key": key}
+    ):
+        return app.make_response(view())
+
+
+def test_decorator_replays_a_success():
+    view, calls = make_view()
+    key = new_key()
+    first = post(view, {"size": 1}, key)
+    second = post(view, {"size": 1}, key)
+    assert len(calls) == 1
+    assert second.get_json() == first.get_json() == {"calls": 1}
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+def test_decorator_rejects_a_reused_key_with_another_body():
+    view, calls = make_view()
+    key = new_key()
+    post(view, {"size": 1}, key)
+    response = post(view, {"size": 2}, key)
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_decorator_runs_again_after_a_failure():
+    view, calls = make_view(status=500)
+    key = new_key()
+    post(view, {"size": 1}, key)
+    post(view, {"size": 1}, key)
+    assert len(calls) == 2
+
+
+def test_client_order_ids_increase_and_differ_per_slot(tmp_path):
+    store = SharedStore(str(tmp_path / "ids.sqlite3"))
+    ids = ClientOrderIds(store, slots=100)
+    taken = ids.take(3) + [ids.next()]
+    assert taken == sorted(set(taken))
+    assert {i % 100 for i in taken} == {ids.slot}
+    other = ClientOrderIds(store, slots=100)
+    assert not set(taken) & set(other.take(3))
+    assert other.slot != ids.slot
+
+
+def test_dead_worker_slot_is_reused(tmp_path):
+    store = SharedStore(str(tmp_path / "ids.sqlite3"))
+    ids = ClientOrderIds(store, slots=2)
+    worker = subprocess.Popen([sys.executable, "-c", "pass"])
+    worker.wait()
+    with store.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO order_id_slots (slot, pid) VALUES (?, ?)",
+            [(0, worker.pid), (1, os.getpid())],
+        )
+    ids.next()
+    assert ids.slot == 0
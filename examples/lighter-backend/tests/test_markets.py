@@ -0,0 +1,70 @@
+import asyncio
+
+from lighter_backend import markets
+from lighter_backend.markets import MarketRegistry
+
+
+class Response:
+    def __init__(self, order_books):
+        self.order_books = order_books
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return {"order_books": self.order_books}
+
+
+class Session:
+    """Serves /orderBooks with the markets listed in `market_ids`."""
+
+    def __init__(self, *market_ids):
+        self.market_ids = list(market_ids)
+        self.downloads = 0
+
+    def get(self, url):
+        self.downloads += 1
+        return Response([{"market_id": m, "symbol": f"M{m}"} for m in self.market_ids])
+
+
+def make_registry(monkeypatch, session: Session) -> MarketRegistry:
+    monkeypatch.setattr(markets, "get_http_session", lambda: session)
+    markets_registry = MarketRegistry(refresh_interval=3600, miss_ttl=60)
+    # No background refresh: each download here comes from a lookup
+    monkeypatch.setattr(markets_registry, "start", lambda: None)
+    return markets_registry
+
+
+def test_alternating_unknown_markets_download_once_each(monkeypatch):
+    session = Session(0)
+    registry = make_registry(monkeypatch, session)
+
+    async def run():
+        for market_index in (7, 8, 7, 8, 7, 8):
+            assert await registry.get(market_index) is None
+
+    asyncio.run(run())
+    assert session.downloads == 2
+    assert registry.stats()["negative_cache"] == 2
+
+
+def test_reload_drops_the_misses_it_resolves(monkeypatch):
+    session = Session(0)
+    registry = make_registry(monkeypatch, session)
+
+    async def run():
+        assert await registry.get(7) is None
+        session.market_ids.append(7)
+        # Another market's miss reloads; the new data has market 7
+        assert await registry.get(8) is None
+        return await registry.get(7)
+
+    market = asyncio.run(run())
+    assert market.symbol == "M7"
+    assert session.downloads == 2
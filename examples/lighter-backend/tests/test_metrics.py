@@ -0,0 +1,46 @@
+import os
+import json
+import time
+
+from lighter_backend.metrics import Counter, MetricsRegistry, mark_process_dead
+
+
+def registry_with_counter():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("requests_total", "Requests", ("route",)))
+    return registry, counter
+
+
+def test_samples_carry_the_worker():
+    registry, counter = registry_with_counter()
+    counter.inc(route="/a")
+    assert f'requests_total{{worker="{os.getpid()}",route="/a"}} 1' in registry.render()
+
+
+def test_render_includes_the_other_workers(tmp_path):
+    registry, counter = registry_with_counter()
+    registry.directory = str(tmp_path)
+    counter.inc(route="/a")
+    other = {"requests_total": [["requests_total", '{worker="1",route="/a"}', 7]]}
+    (tmp_path / "1.json").write_text(json.dumps(other))
+    lines = registry.render().splitlines()
+    assert lines[:2] == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+    ]
+    assert lines[2:] == [
+        f'requests_total{{worker="{os.getpid()}",route="/a"}} 1',
+        'requests_total{worker="1",route="/a"} 7',
+    ]
+
+
+def test_dead_and_stale_workers_are_left_out(tmp_path):
+    registry, _ = registry_with_counter()
+    registry.directory = str(tmp_path)
+    other = {"requests_total": [["requests_total", '{worker="1"}', 7]]}
+    for pid in (1, 2):
+        (tmp_path / f"{pid}.json").write_text(json.dumps(other))
+    stale = time.time() - 3600
+    os.utime(tmp_path / "2.json", (stale, stale))
+    mark_process_dead(str(tmp_path), 1)
+    assert 'worker="1"' not in registry.render()
@@ -0,0 +1,237 @@
+import os
+import asyncio
+
+from lighter_backend.nonces import (
+    KeyScheduler,
+    NonceSequencer,
+    RemoteNonceSequencer,
+    serve_nonce_sequencer,
+)
+
+
+class ServerNonces(NonceSequencer):
+    """NonceSequencer whose /nextNonce answers come from `server_next`."""
+
+    def __init__(self, server_next: int = 100):
+        super().__init__(account_index=0)
+        self.server_next = server_next
+        self.fetches = 0
+
+    async def _fetch(self, api_key_index: int) -> int:
+        self.fetches += 1
+        return self.server_next
+
+
+def test_first_reserve_fetches_then_counts_locally():
+    sequencer = ServerNonces(100)
+
+    async def run():
+        nonces = []
+        for _ in range(3):
+            async with sequencer.reserve(3) as nonce:
+                nonces.append(nonce)
+        return nonces
+
+    assert asyncio.run(run()) == [100, 101, 102]
+    assert sequencer.fetches == 1
+    assert sequencer.stats()["issued"] == 3
+
+
+def test_reserve_count_hands_out_consecutive_block():
+    sequencer = ServerNonces(10)
+
+    async def run():
+        async with sequencer.reserve(3, count=4) as first:
+            pass
+        async with sequencer.reserve(3) as after:
+            pass
+        return first, after
+
+    assert asyncio.run(run()) == (10, 14)
+
+
+def test_keys_have_separate_streams():
+    sequencer = ServerNonces(50)
+
+    async def run():
+        async with sequencer.reserve(3) as a:
+            pass
+        async with sequencer.reserve(4) as b:
+            pass
+        async with sequencer.reserve(3) as c:
+            pass
+        return a, b, c
+
+    assert asyncio.run(run()) == (50, 50, 51)
+    assert sequencer.fetches == 2
+
+
+def test_release_gives_the_nonce_back():
+    sequencer = ServerNonces(7)
+
+    async def run():
+        async with sequencer.reserve(3) as nonce:
+            sequencer.release(3, nonce)
+        async with sequencer.reserve(3) as again:
+            return nonce, again
+
+    assert asyncio.run(run()) == (7, 7)
+    assert sequencer.fetches == 1
+
+
+def test_gap_resyncs_from_server_on_next_reserve():
+    sequencer = ServerNonces(7)
+
+    async def run():
+        async with sequencer.reserve(3):
+            sequencer.report_gap(3)
+        sequencer.server_next = 20
+        async with sequencer.reserve(3) as nonce:
+            return nonce
+
+    assert asyncio.run(run()) == 20
+    assert sequencer.fetches == 2
+    assert sequencer.gaps == 1
+
+
+def test_invalidate_drops_one_or_all_keys():
+    sequencer = ServerNonces(1)
+
+    async def run():
+        for key in (3, 4):
+            async with sequencer.reserve(key):
+                pass
+        sequencer.invalidate(3)
+        assert set(sequencer.stats()["next"]) == {4}
+        sequencer.invalidate()
+        assert sequencer.stats()["next"] == {}
+
+    asyncio.run(run())
+
+
+def test_reserve_holds_the_key_until_sent():
+    sequencer = ServerNonces(0)
+    events = []
+
+    async def send(name: str, delay: float):
+        async with sequencer.reserve(3) as nonce:
+            events.append(("start", name, nonce))
+            await asyncio.sleep(delay)
+            events.append(("end", name, nonce))
+
+    async def run():
+        # The slow first send must finish before the second one starts
+        await asyncio.gather(send("a", 0.02), send("b", 0))
+
+    asyncio.run(run())
+    assert events == [
+        ("start", "a", 0),
+        ("end", "a", 0),
+        ("start", "b", 1),
+        ("end", "b", 1),
+    ]
+
+
+def test_new_event_loop_starts_from_server_again():
+    sequencer = ServerNonces(5)
+
+    async def take():
+        async with sequencer.reserve(3) as nonce:
+            return nonce
+
+    assert asyncio.run(take()) == 5
+    sequencer.server_next = 9
+    # Locks (and nonces) belong to a loop; a forked worker starts over
+    assert asyncio.run(take()) == 9
+
+
+def test_shared_sequencer_serializes_workers(tmp_path, monkeypatch):
+    async def fetch(self, api_key_index):
+        return 100
+
+    monkeypatch.setattr(NonceSequencer, "_fetch", fetch)
+    socket_path = str(tmp_path / "sequencer.sock")
+
+    async def run():
+        server = asyncio.get_running_loop().create_task(
+            serve_nonce_sequencer(socket_path, lease_timeout=5)
+        )
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        # Two workers sharing account 0, key 3
+        workers = [RemoteNonceSequencer(socket_path, 0) for _ in range(2)]
+        taken = []
+
+        async def send(worker: RemoteNonceSequencer, reject: bool):
+            async with worker.reserve(3) as nonce:
+                taken.append(nonce)
+                if reject:
+                    worker.release(3, nonce)
+
+        await send(workers[0], reject=False)
+        await asyncio.gather(send(workers[0], False), send(workers[1], False))
+        # A rejected send gives its nonce back to the next worker
+        await send(workers[1], reject=True)
+        await send(workers[0], reject=False)
+        server.cancel()
+        return taken
+
+    taken = asyncio.run(run())
+    assert taken[0] == 100
+    assert sorted(taken[1:3]) == [101, 102]
+    assert taken[3:] == [103, 103]
+
+
+def test_least_loaded_key_is_picked():
+    scheduler = KeyScheduler([3, 4, 5])
+    with scheduler.use() as first, scheduler.use() as second:
+        assert first != second
+        third = scheduler.pick()
+        assert third not in (first, second)
+    assert scheduler.in_flight == {3: 0, 4: 0, 5: 0}
+    assert sum(scheduler.picks.values()) == 2
+
+
+def test_idle_keys_take_turns():
+    scheduler = KeyScheduler([3, 4])
+    picks = []
+    for _ in range(4):
+        with scheduler.use() as api_key_index:
+            picks.append(api_key_index)
+    assert sorted(picks) == [3, 3, 4, 4]
+
+
+def test_sticky_pins_a_market_to_one_key():
+    scheduler = KeyScheduler([3, 4], mode="sticky")
+    with scheduler.use(market_index=1) as busy:
+        assert scheduler.pick(1) == busy
+        assert scheduler.pick(2) != busy
+    assert KeyScheduler([7]).pick(5) == 7
+
+
+def test_resync_under_a_shared_sequencer_lease(tmp_path, monkeypatch):
+    server_next = {"nonce": 100}
+
+    async def fetch(self, api_key_index):
+        return server_next["nonce"]
+
+    monkeypatch.setattr(NonceSequencer, "_fetch", fetch)
+    socket_path = str(tmp_path / "sequencer.sock")
+
+    async def run():
+        server = asyncio.get_running_loop().create_task(
+            serve_nonce_sequencer(socket_path, lease_timeout=5)
+        )
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        worker = RemoteNonceSequencer(socket_path, 0)
+        async with worker.reserve(3, count=4) as first:
+            # Two of the four legs went through before a rejection
+            server_next["nonce"] = first + 2
+            resynced = await worker.resync_held(3)
+        async with worker.reserve(3) as after:
+            pass
+        server.cancel()
+        return first, resynced, after
+
+    assert asyncio.run(run()) == (100, 102, 102)
@@ -0,0 +1,119 @@
+import time
+import asyncio
+
+import pytest
+from lighter.exceptions import ApiException
+
+from lighter_backend import retry
+from lighter_backend.retry import RetryPolicy, classify_error, error_code
+
+NONCE_ERROR = ApiException(
+    status=400, reason="Bad Request", body='{"code":21104,"message":"invalid nonce"}'
+)
+THROTTLED = ApiException(status=429, reason="Too Many Requests")
+UNAVAILABLE = ApiException(status=503, reason="Service Unavailable")
+
+
+@pytest.mark.parametrize(
+    "error, error_class",
+    [
+        (None, None),
+        (NONCE_ERROR, "nonce"),
+        # The SDK's own error strings carry the model repr
+        ("code=21104 message='invalid nonce'", "nonce"),
+        (THROTTLED, "throttled"),
+        (ConnectionRefusedError(), "throttled"),
+        (UNAVAILABLE, "unavailable"),
+        (asyncio.TimeoutError(), "unavailable"),
+        ("(502)\nReason: Bad Gateway\n", "unavailable"),
+        (ApiException(status=400, body='{"code":21120}'), "rejected"),
+        ("order price flagged", "rejected"),
+    ],
+)
+def test_classify_error(error, error_class):
+    assert classify_error(error) == error_class
+
+
+def test_error_code_from_body_or_message():
+    assert error_code(NONCE_ERROR) == 21104
+    assert error_code('{"code": 429}') == 429
+    assert error_code("no code here") is None
+
+
+def test_first_nonce_retry_is_immediate_and_free():
+    policy = RetryPolicy()
+    policy.tokens = 0
+    assert policy.delay("nonce", 0, 3) == 0.0
+    # Later retries need the budget
+    assert policy.delay("nonce", 1, 3) is None
+
+
+def test_retries_back_off_within_the_cap():
+    policy = RetryPolicy()
+    for attempt in range(1, 4):
+        cap = min(retry.RETRY_MAX_DELAY_MS, retry.NONCE_RETRY_DELAY_MS * 2**attempt)
+        delay = policy.delay("throttled", attempt, 10)
+        assert 0 <= delay <= cap / 1000
+
+
+def test_unsafe_and_exhausted_errors_are_not_retried():
+    policy = RetryPolicy()
+    assert policy.delay("unavailable", 0, 3) is None
+    assert policy.delay("rejected", 0, 3) is None
+    assert policy.delay("throttled", 2, 3) is None
+
+
+def test_retry_budget_is_spent_and_earned_back():
+    policy = RetryPolicy()
+    policy.tokens = 1
+    assert policy.delay("throttled", 0, 3) is not None
+    assert policy.delay("throttled", 0, 3) is None
+    earn = int(1 / retry.RETRY_BUDGET_RATIO) + 1
+    for _ in range(earn):
+        assert policy.admit() is None
+    assert policy.delay("throttled", 0, 3) is not None
+
+
+def test_breaker_opens_after_consecutive_failures():
+    policy = RetryPolicy()
+    for _ in range(retry.BREAKER_FAILURES - 1):
+        policy.record(UNAVAILABLE)
+    assert policy.state == "closed"
+    policy.record(THROTTLED)
+    assert policy.state == "open"
+    assert policy.trips == 1
+    assert policy.admit() is not None
+    # No retries while open, even with budget left
+    assert policy.delay("throttled", 0, 3) is None
+
+
+def test_an_answer_resets_the_failure_count():
+    policy = RetryPolicy()
+    for _ in range(retry.BREAKER_FAILURES - 1):
+        policy.record(UNAVAILABLE)
+    policy.record(NONCE_ERROR)
+    policy.record(UNAVAILABLE)
+    assert policy.state == "closed"
+
+
+def test_half_open_probe_closes_or_reopens():
+    policy = RetryPolicy()
+    for _ in range(retry.BREAKER_FAILURES):
+        policy.record(UNAVAILABLE)
+
+    # Cooldown over: one probe is let through, the next send is not
+    policy.opened_until = time.monotonic() - 1
+    assert policy.admit() is None
+    assert policy.state == "half-open"
+    assert policy.admit() is not None
+
+    # A failed probe re-opens right away
+    policy.record(UNAVAILABLE)
+    assert policy.state == "open"
+    assert policy.trips == 1
+
+    policy.opened_until = time.monotonic() - 1
+    assert policy.admit() is None
+    policy.record(None)
+    assert policy.state == "closed"
+    assert policy.admit() is None
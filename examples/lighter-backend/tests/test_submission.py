@@ -0,0 +1,318 @@
+import time
+import asyncio
+
+import pytest
+from flask import g
+from lighter import SignerClient
+
+from lighter_backend import submission
+from lighter_backend.metrics import record_stage
+from lighter_backend.submission import (
+    PRIORITY_AMEND,
+    PRIORITY_CANCEL,
+    PRIORITY_ENTRY,
+    PRIORITY_PROTECT,
+    SubmissionQueue,
+    operation_leg,
+    tx_priority,
+)
+from lighter_backend.transactions import TxLeg
+from lighter_backend.web import app
+
+NONCE_ERROR = ("code=21104 message='invalid nonce'", "nonce")
+REJECTED = ("code=21706 message='invalid order base or quote amount'", "rejected")
+UNAVAILABLE = ("(503) Service Unavailable", "unavailable")
+
+
+def create(name: str, client_order_index: int, market_index: int = 0, **params):
+    params = {
+        "market_index": market_index,
+        "client_order_index": client_order_index,
+        "order_type": SignerClient.ORDER_TYPE_LIMIT,
+        "reduce_only": False,
+        **params,
+    }
+    return TxLeg(name, "sign_create_order", params)
+
+
+def cancel(name: str, order_index: int, market_index: int = 0):
+    params = {"market_index": market_index, "order_index": order_index}
+    return TxLeg(name, "sign_cancel_order", params)
+
+
+def stop_loss(name: str, client_order_index: int):
+    return create(
+        name,
+        client_order_index,
+        order_type=SignerClient.ORDER_TYPE_STOP_LOSS,
+        reduce_only=True,
+    )
+
+
+class Exchange:
+    """Stands in for sign_and_send: records sends, held open until released."""
+
+    def __init__(self):
+        self.sends = []
+        self.gate = asyncio.Event()
+        self.errors = []
+
+    async def sign_and_send(self, client, account, api_key_index, legs, attempts=3):
+        self.sends.append((api_key_index, [leg.name for leg in legs]))
+        await self.gate.wait()
+        record_stage("send", time.perf_counter())
+        error, error_class = self.errors.pop(0) if self.errors else (None, None)
+        if error is None:
+            return [{"tx_hash": leg.name, "error": None} for leg in legs]
+        return [
+            {"tx_hash": None, "error": error, "error_class": error_class}
+            for leg in legs
+        ]
+
+    def sent(self):
+        return [name for _, names in self.sends for name in names]
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    exchange = Exchange()
+    monkeypatch.setattr(submission, "sign_and_send", exchange.sign_and_send)
+    return exchange
+
+
+def submit(queue: SubmissionQueue, legs: list, key: int = 3) -> asyncio.Future:
+    return asyncio.ensure_future(queue.submit(SignerClient, key, legs))
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_tx_priority():
+    assert tx_priority(SignerClient, cancel("c", 1)) == PRIORITY_CANCEL
+    assert tx_priority(SignerClient, stop_loss("sl", 1)) == PRIORITY_PROTECT
+    close = create(
+        "close", 1, order_type=SignerClient.ORDER_TYPE_MARKET, reduce_only=True
+    )
+    assert tx_priority(SignerClient, close) == PRIORITY_PROTECT
+    take_profit = create(
+        "tp", 1, order_type=SignerClient.ORDER_TYPE_TAKE_PROFIT, reduce_only=True
+    )
+    assert tx_priority(SignerClient, take_profit) == PRIORITY_AMEND
+    assert tx_priority(SignerClient, create("entry", 1)) == PRIORITY_ENTRY
+
+
+def test_urgent_submissions_overtake_waiting_ones(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        busy = submit(queue, [create("busy", 1)])
+        await settle()
+        waiting = [
+            submit(queue, [create("entry", 2)]),
+            submit(queue, [stop_loss("sl", 3)]),
+            submit(queue, [cancel("cancel", 99)]),
+        ]
+        await settle()
+        exchange.gate.set()
+        await asyncio.gather(busy, *waiting)
+        queue.stop()
+
+    asyncio.run(run())
+    assert exchange.sent() == ["busy", "cancel", "sl", "entry"]
+
+
+def test_bracket_keeps_its_entry_priority(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        busy = submit(queue, [create("busy", 1)])
+        await settle()
+        bracket = submit(queue, [create("entry", 2), stop_loss("entry-sl", 3)])
+        amend = submit(
+            queue,
+            [
+                TxLeg(
+                    "amend",
+                    "sign_modify_order",
+                    {"market_index": 0, "order_index": 7},
+                )
+            ],
+        )
+        await settle()
+        exchange.gate.set()
+        await asyncio.gather(busy, bracket, amend)
+        queue.stop()
+
+    asyncio.run(run())
+    assert exchange.sent() == ["busy", "amend", "entry", "entry-sl"]
+
+
+def test_cancel_waits_for_its_order_on_another_key(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        busy = submit(queue, [create("busy", 1)], key=3)
+        await settle()
+        # The create waits behind `busy` on key 3; its cancel goes to key 4
+        created = submit(queue, [create("create", 7)], key=3)
+        cancelled = submit(queue, [cancel("cancel", 7)], key=4)
+        other = submit(queue, [cancel("other", 8)], key=4)
+        await settle()
+        assert exchange.sent() == ["busy", "other"]
+        exchange.gate.set()
+        await asyncio.gather(busy, created, cancelled, other)
+        assert queue.held == 1
+        assert queue._last_by_target == {}
+        queue.stop()
+
+    asyncio.run(run())
+    sent = exchange.sent()
+    assert sent.index("create") < sent.index("cancel")
+
+
+def test_cancel_all_is_a_barrier(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        before = submit(queue, [create("before", 1)], key=3)
+        await settle()
+        cancel_all = submit(
+            queue, [TxLeg("cancel-all", "sign_cancel_all_orders", {})], key=4
+        )
+        after = submit(queue, [create("after", 2)], key=5)
+        await settle()
+        assert exchange.sent() == ["before"]
+        exchange.gate.set()
+        await asyncio.gather(before, cancel_all, after)
+        queue.stop()
+
+    asyncio.run(run())
+    assert exchange.sent() == ["before", "cancel-all", "after"]
+
+
+def test_waiting_submissions_are_coalesced_and_split_on_nonce_error(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        busy = submit(queue, [create("busy", 1)])
+        await settle()
+        a = submit(queue, [create("a", 2)])
+        b = submit(queue, [create("b", 3), create("b2", 4)])
+        await settle()
+        # busy succeeds, the coalesced send hits a nonce error
+        exchange.errors = [(None, None), NONCE_ERROR]
+        exchange.gate.set()
+        results = await asyncio.gather(busy, a, b)
+        queue.stop()
+        return queue, results
+
+    queue, (_, a, b) = asyncio.run(run())
+    assert exchange.sends == [
+        (3, ["busy"]),
+        (3, ["a", "b", "b2"]),
+        (3, ["a"]),
+        (3, ["b", "b2"]),
+    ]
+    assert [r["tx_hash"] for r in a + b] == ["a", "b", "b2"]
+    assert queue.coalesced == 1 and queue.split == 1
+
+
+def coalesce_after_busy(exchange, errors):
+    """Send "busy", then coalesce a and b behind it; `errors` per send."""
+
+    async def run():
+        queue = SubmissionQueue(None)
+        busy = submit(queue, [create("busy", 1)])
+        await settle()
+        a = submit(queue, [create("a", 2)])
+        b = submit(queue, [create("b", 3)])
+        await settle()
+        exchange.errors = [(None, None), *errors]
+        exchange.gate.set()
+        results = await asyncio.gather(busy, a, b)
+        queue.stop()
+        return queue, results
+
+    return asyncio.run(run())
+
+
+def test_coalesced_send_is_split_on_a_rejection(exchange):
+    # The first resend is a's rejection again; b goes through alone
+    queue, (_, a, b) = coalesce_after_busy(exchange, [REJECTED, REJECTED])
+    assert exchange.sends[1:] == [(3, ["a", "b"]), (3, ["a"]), (3, ["b"])]
+    assert a[0]["error"] == REJECTED[0]
+    assert b[0]["tx_hash"] == "b"
+    assert queue.split == 1
+
+
+def test_coalesced_send_is_not_resent_when_it_may_have_been_applied(exchange):
+    queue, (_, a, b) = coalesce_after_busy(exchange, [UNAVAILABLE])
+    assert exchange.sends[1:] == [(3, ["a", "b"])]
+    assert a[0]["error"] == b[0]["error"] == UNAVAILABLE[0]
+    assert queue.split == 0
+
+
+def test_writer_stages_reach_the_request(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        exchange.gate.set()
+        await queue.submit(SignerClient, 3, [create("entry", 1)])
+        queue.stop()
+
+    with app.test_request_context("/"):
+        g.stage_spans = []
+        asyncio.run(run())
+        stages = [stage for stage, _, _ in g.stage_spans]
+    assert stages == ["send", "queue"]
+
+
+def test_full_queue_refuses_submissions(exchange, monkeypatch):
+    monkeypatch.setattr(submission, "SUBMIT_QUEUE_SIZE", 1)
+
+    async def run():
+        queue = SubmissionQueue(None)
+        busy = submit(queue, [create("busy", 1)])
+        await settle()
+        queued = submit(queue, [create("queued", 2)])
+        await settle()
+        refused = await submit(queue, [create("refused", 3)])
+        exchange.gate.set()
+        await asyncio.gather(busy, queued)
+        queue.stop()
+        return queue, refused
+
+    queue, refused = asyncio.run(run())
+    assert refused == [{"tx_hash": None, "error": "Submission queue full"}]
+    assert queue.rejected == 1
+    assert "refused" not in exchange.sent()
+
+
+def test_stopping_fails_sending_and_queued_submissions(exchange):
+    async def run():
+        queue = SubmissionQueue(None)
+        sending = submit(queue, [create("sending", 1)])
+        await settle()
+        queued = submit(queue, [create("queued", 2)])
+        await settle()
+        queue.stop()
+        results = await asyncio.wait_for(asyncio.gather(sending, queued), 1)
+        late = await submit(queue, [create("late", 3)])
+        return results, late
+
+    (sending, queued), late = asyncio.run(run())
+    stopped = [{"tx_hash": None, "error": "Submission queue stopped"}]
+    assert sending == queued == late == stopped
+    assert exchange.sent() == ["sending"]
+
+
+def test_update_leverage_leg_signs_the_margin_fraction():
+    class Client:
+        async def update_leverage(self, market_index, margin_mode, leverage):
+            pass
+
+    leg = operation_leg(
+        Client().update_leverage,
+        {"market_index": 1, "margin_mode": 0, "leverage": 20},
+    )
+    assert leg == TxLeg(
+        "update_leverage",
+        "sign_update_leverage",
+        {"market_index": 1, "fraction": 500, "margin_mode": 0},
+    )
@@ -0,0 +1,102 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+from lighter.exceptions import ApiException
+
+from lighter_backend.nonces import NonceSequencer
+from lighter_backend.retry import RetryPolicy
+from lighter_backend.transactions import TxLeg, sign_and_send
+from lighter_backend import transactions
+
+NONCE_ERROR_BODY = '{"code":21104,"message":"invalid nonce"}'
+REJECTED_BODY = '{"code":21706,"message":"invalid order base or quote amount"}'
+
+
+class Exchange:
+    """Applies batches in order up to the first leg it rejects, like Lighter."""
+
+    def __init__(self, reject_nonces=(), refuse=()):
+        self.next = 0
+        self.applied = []
+        self.reject_nonces = set(reject_nonces)
+        self.refuse = set(refuse)
+
+    async def send_tx_batch(self, tx_types, tx_infos):
+        for info in json.loads(tx_infos):
+            info = json.loads(info)
+            if info["nonce"] != self.next or info["nonce"] in self.reject_nonces:
+                self.reject_nonces.discard(info["nonce"])
+                raise ApiException(status=400, body=NONCE_ERROR_BODY)
+            if info["name"] in self.refuse:
+                raise ApiException(status=400, body=REJECTED_BODY)
+            self.applied.append(info["name"])
+            self.next += 1
+        return SimpleNamespace(tx_hash=[f"h{n}" for n in range(len(tx_infos))])
+
+
+class Client:
+    def __init__(self, exchange: Exchange):
+        self.tx_api = exchange
+
+    def sign_create_order(self, name, nonce, api_key_index):
+        info = json.dumps({"name": name, "nonce": nonce})
+        return 14, info, f"signed-{name}", None
+
+
+class ExchangeNonces(NonceSequencer):
+    def __init__(self, exchange: Exchange):
+        super().__init__(account_index=0)
+        self.exchange = exchange
+
+    async def _fetch(self, api_key_index: int) -> int:
+        return self.exchange.next
+
+
+def legs(*names):
+    return [TxLeg(name, "sign_create_order", {"name": name}) for name in names]
+
+
+def send(exchange: Exchange, monkeypatch, *names):
+    monkeypatch.setattr(transactions, "retry_policy", RetryPolicy())
+    account = SimpleNamespace(sequencer=ExchangeNonces(exchange))
+    return asyncio.run(sign_and_send(Client(exchange), account, 3, legs(*names)))
+
+
+def test_batch_retry_resends_only_unapplied_legs(monkeypatch):
+    # The third leg is rejected once: the first two are already live
+    exchange = Exchange(reject_nonces={2})
+    results = send(exchange, monkeypatch, "entry", "sl", "tp1", "tp2")
+    assert exchange.applied == ["entry", "sl", "tp1", "tp2"]
+    assert [r["error"] for r in results] == [None] * 4
+    assert [r["tx_hash"] for r in results[:2]] == ["signed-entry", "signed-sl"]
+
+
+def test_batch_rejected_on_first_leg_is_resent_whole(monkeypatch):
+    exchange = Exchange(reject_nonces={0})
+    results = send(exchange, monkeypatch, "entry", "sl")
+    assert exchange.applied == ["entry", "sl"]
+    assert all(r["tx_hash"] for r in results)
+
+
+def test_applied_legs_are_reported_when_retries_run_out(monkeypatch):
+    # Three attempts (the default), each rejected one leg further on
+    exchange = Exchange(reject_nonces={1, 2, 3})
+    results = send(exchange, monkeypatch, "entry", "sl", "tp1", "tp2")
+    assert exchange.applied == ["entry", "sl", "tp1"]
+    assert [r["tx_hash"] for r in results[:3]] == [
+        "signed-entry",
+        "signed-sl",
+        "signed-tp1",
+    ]
+    assert results[3]["tx_hash"] is None
+    assert results[3]["error"].startswith("Nonce error after 3 attempts")
+
+
+def test_rejected_batch_reports_the_legs_applied_before_it(monkeypatch):
+    exchange = Exchange(refuse={"bad"})
+    results = send(exchange, monkeypatch, "entry", "bad", "tp")
+    assert exchange.applied == ["entry"]
+    assert results[0] == {"tx_hash": "signed-entry", "error": None}
+    assert [r["error_class"] for r in results[1:]] == ["rejected", "rejected"]
+    assert all(r["tx_hash"] is None for r in results[1:])